@@ -1,61 +1,55 @@
-import psutil
 import time
-import csv
-import os
-
-try:
-    from pynvml import (
-        nvmlInit, nvmlDeviceGetHandleByIndex, nvmlDeviceGetUtilizationRates,
-        nvmlDeviceGetMemoryInfo, nvmlDeviceGetCount
-    )
-    nvmlInit()
-    gpu_count = nvmlDeviceGetCount()
-    gpu_available = gpu_count > 0
-except Exception as e:
-    gpu_available = False
-    gpu_error_msg = str(e)
-
-# Create CSV file for data collection
+from metric_writer import MetricWriter
+from segments import SegmentStore
+from scheduler import AdaptiveRate, Scheduler
+from collectors import CollectorSet
+import instrument
+from instrument import SelfMonitor
+
+# CSV file for data collection (kept open, rows are written in batches). It is rotated
+# at 16 MB or daily; closed files are compacted into performance_data.segments/
+# Sample_Interval is the number of seconds each row covers (it varies with MONITOR_ADAPTIVE=1)
 filename = "performance_data.csv"
-if not os.path.exists(filename):
-    with open(filename, "w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(["Timestamp", "CPU_Usage", "CPU_Memory_Usage", "GPU_Usage", "GPU_Memory_Usage"])
-
-def get_cpu_info():
-    """Fetch CPU usage and memory usage."""
-    cpu_usage = psutil.cpu_percent(interval=1)
-    memory_info = psutil.virtual_memory()
-    cpu_memory_usage = memory_info.percent  # System memory usage
-    return cpu_usage, cpu_memory_usage
-
-def get_gpu_info():
-    """Fetch GPU usage and memory usage if GPU is available."""
-    if not gpu_available:
-        return "N/A", "N/A"
-
-    nvml_handle = nvmlDeviceGetHandleByIndex(0)
-    gpu_usage = nvmlDeviceGetUtilizationRates(nvml_handle).gpu
-    gpu_mem = nvmlDeviceGetMemoryInfo(nvml_handle)
-
-    return gpu_usage, gpu_mem.used / gpu_mem.total * 100
-
-# Data collection loop
-for _ in range(100):  # Collect data for 100 cycles (~200 seconds)
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    cpu_usage, cpu_memory_usage = get_cpu_info()
-
-    if gpu_available:
-        gpu_usage, gpu_mem_usage = get_gpu_info()
-    else:
-        gpu_usage, gpu_mem_usage = "N/A", "N/A"
+segment_store = SegmentStore(filename)
+segment_store.compact_pending()
+csv_writer = MetricWriter(filename, ["Timestamp", "CPU_Usage", "CPU_Memory_Usage", "GPU_Usage", "GPU_Memory_Usage",
+                                     "Sample_Interval"],
+                          batch_size=10, flush_interval=10.0, max_bytes=16 << 20, max_age=24 * 3600,
+                          on_rotate=segment_store.compact_in_background)
+
+# This script's own CPU/RSS and stage timings (sensor read, NVML call, CSV write) go to monitor_self.csv
+self_monitor = SelfMonitor("Analysis")
+
+# Take one sample at the scheduled tick time and save it
+def collect(tick_time):
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(tick_time))
+    interval = collect_job.period  # Seconds since the previous tick, i.e. what this reading covers
+    record = sensors.collect(tick_time)  # CPU, memory and all GPUs in one pass
+    cpu_usage, cpu_memory_usage = record.cpu, record.memory
+    gpu_usage, gpu_mem_usage = ("N/A", "N/A") if record.gpu is None else (record.gpu, record.gpu_memory)
 
     # Save data to CSV
-    with open(filename, "a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow([timestamp, cpu_usage, cpu_memory_usage, gpu_usage, gpu_mem_usage])
+    csv_writer.write([timestamp, cpu_usage, cpu_memory_usage, gpu_usage, gpu_mem_usage, interval])
+    if adaptive_rate is not None:
+        adaptive_rate.observe({"cpu": cpu_usage, "memory": cpu_memory_usage, "gpu": gpu_usage, "gpu_memory": gpu_mem_usage})
 
-    print(f"{timestamp} | CPU: {cpu_usage}% | CPU Memory: {cpu_memory_usage}% | GPU: {gpu_usage}% | GPU Memory: {gpu_mem_usage}%")
+    overhead = self_monitor.read()
+    print(f"{timestamp} | CPU: {cpu_usage}% | CPU Memory: {cpu_memory_usage}% | GPU: {gpu_usage}% | GPU Memory: {gpu_mem_usage}%"
+          f" | Interval: {interval:g}s | Monitor CPU: {overhead['Monitor CPU (%)']:.1f}%")
     print("-" * 50)
 
-    time.sleep(2)  # Collect data every 2 seconds
+# Data collection loop: 100 samples on a fixed 2 second grid (200 seconds). With MONITOR_ADAPTIVE=1
+# the grid is 1 second while readings move or are above 70%, backing off to 10 seconds when steady
+sensors = CollectorSet(["cpu", "memory", "gpu"])  # First readings (and NVML setup), so the first sample covers a full period
+adaptive_rate = AdaptiveRate.from_env({"cpu": 80, "memory": 80, "gpu": 80, "gpu_memory": 80})
+period = 2.0 if adaptive_rate is None else adaptive_rate.interval
+scheduler = Scheduler()
+collect_job = scheduler.every(period, collect, count=100, start_after=period, rate=adaptive_rate)
+scheduler.run()
+
+csv_writer.close()  # Write any rows still pending
+segment_store.compact_pending()  # Don't leave a rotated file behind when the run ends
+self_monitor.export()
+print(f"Late ticks: {collect_job.late_ticks} | Missed ticks: {collect_job.missed_ticks}")
+for stage, stats in instrument.summary().items():
+    print(f"{stage}: p50 {stats['p50_ms']:.3f} ms | p99 {stats['p99_ms']:.3f} ms | {stats['count']} calls")
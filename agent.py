@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import json
+import random
+import socket
+import struct
+import time
+import zlib
+
+# Wire format: zlib-compressed JSON {"host", "boot", "seq", "samples": [[timestamp, {metric: value}], ...]}.
+# Over TCP each batch is prefixed with its length (4 bytes, big-endian); over UDP one datagram is one batch.
+HEADER = struct.Struct("!I")
+MAX_DATAGRAM = 60000
+
+
+def encode_batch(host, boot, seq, samples):
+    return zlib.compress(json.dumps({"host": host, "boot": boot, "seq": seq, "samples": samples},
+                                    separators=(",", ":")).encode())
+
+
+def decode_batch(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+def local_collector(names=None):
+    """Sample source for this machine: one pass over the collectors.py plugins (all by default) per sample.
+
+    Missing readings are left out of the sample (e.g. no "gpu" on a machine without a GPU).
+    """
+    from collectors import CollectorSet
+
+    sensors = CollectorSet(names)  # Takes the first readings, so the first sample covers one interval
+
+    def collect():
+        record = sensors.collect()
+        return {name: value for name, value in zip(sensors.fields[1:], record[1:]) if value is not None}
+    return collect
+
+
+def fake_collector():
+    """Synthetic sample source for load-testing many agents on one machine."""
+    base = random.uniform(5, 60)
+
+    def collect():
+        return {"cpu": min(100.0, max(0.0, random.gauss(base, 10))),
+                "memory": random.uniform(30, 70),
+                "cpu_temp": random.uniform(40, 80)}
+    return collect
+
+
+class Agent:
+    """Sample on a fixed schedule and push batched, compressed, sequence-numbered samples to a collector.
+
+    Unsent batches are kept (up to ``backlog``) and retried after reconnecting over TCP;
+    over UDP a batch that can't be sent is dropped and shows up as a gap in ``seq``.
+    """
+
+    def __init__(self, host, server, collect, transport="tcp", interval=1.0, batch_size=10, backlog=100):
+        self.host = host
+        self.server = server  # (address, port)
+        self.collect = collect
+        self.transport = transport
+        self.interval = interval
+        self.batch_size = batch_size
+        self.backlog = backlog
+        self.boot = time.time()  # Lets the collector tell a restarted agent from lost batches
+        self.seq = 0
+        self.pending = []
+        self._writer = None
+        self._udp = None
+
+    async def run(self, count=None):
+        """Sample ``count`` times (forever if None), flushing the last partial batch at the end."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.interval
+        taken = 0
+        while count is None or taken < count:
+            samples = []
+            while len(samples) < self.batch_size and (count is None or taken < count):
+                # Fixed-rate deadlines on the loop's monotonic clock
+                await asyncio.sleep(max(0.0, deadline - loop.time()))
+                deadline += self.interval
+                samples.append([round(time.time(), 3), self.collect()])
+                taken += 1
+            await self.send(samples)
+        await self.close()
+
+    async def send(self, samples):
+        self.pending.append(encode_batch(self.host, self.boot, self.seq, samples))
+        self.seq += 1
+        self.pending = self.pending[-self.backlog:]
+        try:
+            if self.transport == "udp":
+                await self._send_udp()
+            else:
+                await self._send_tcp()
+        except OSError as e:
+            print(f"{self.host}: send failed ({e}); {len(self.pending)} batches pending")
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    async def _send_tcp(self):
+        if self._writer is None:
+            _, self._writer = await asyncio.open_connection(*self.server)
+        while self.pending:
+            payload = self.pending[0]
+            self._writer.write(HEADER.pack(len(payload)) + payload)
+            await self._writer.drain()
+            self.pending.pop(0)
+
+    async def _send_udp(self):
+        if self._udp is None:
+            loop = asyncio.get_running_loop()
+            self._udp, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=self.server)
+        for payload in self.pending:
+            if len(payload) <= MAX_DATAGRAM:
+                self._udp.sendto(payload)
+        self.pending = []
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+        if self._udp is not None:
+            self._udp.close()
+            self._udp = None
+
+
+async def simulate(n, server, transport, interval, batch_size, count):
+    """Run ``n`` agents with synthetic data against one collector (for load tests on localhost)."""
+    agents = [Agent(f"sim-{i:05d}", server, fake_collector(), transport, interval, batch_size) for i in range(n)]
+    await asyncio.gather(*(agent.run(count) for agent in agents))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Push this machine's metrics to a collector.")
+    parser.add_argument("--server", default="127.0.0.1:9100", help="collector address (host:port)")
+    parser.add_argument("--udp", action="store_true", help="send over UDP instead of TCP")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between samples")
+    parser.add_argument("--batch", type=int, default=10, help="samples per batch")
+    parser.add_argument("--count", type=int, default=None, help="stop after this many samples")
+    parser.add_argument("--simulate", type=int, default=0, help="run N synthetic agents instead")
+    parser.add_argument("--collectors", help="comma separated plugins to sample (default: all, see collectors.py)")
+    args = parser.parse_args()
+
+    address, port = args.server.rsplit(":", 1)
+    server = (address, int(port))
+    transport = "udp" if args.udp else "tcp"
+    if args.simulate:
+        asyncio.run(simulate(args.simulate, server, transport, args.interval, args.batch, args.count))
+    else:
+        collect = local_collector(args.collectors.split(",") if args.collectors else None)
+        agent = Agent(socket.gethostname(), server, collect, transport, args.interval, args.batch)
+        asyncio.run(agent.run(args.count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import json
+import time
+import urllib.request
+
+import numpy as np
+
+
+class Rule:
+    """Declarative alert rule over one metric.
+
+    - Threshold: ``value > threshold`` (or ``<`` with ``op="<"``).
+    - Sustained: with ``duration`` set, every sample of the last ``duration`` seconds must match.
+    - Rate of change: with ``rate`` set, fires when the metric changes faster than ``rate``
+      units per minute over the last ``duration`` seconds (default 60).
+    - Hysteresis: once firing, a threshold rule only resolves when the value crosses ``clear``
+      (defaults to ``threshold``).
+    - Cooldown: at most one notification per ``cooldown`` seconds per rule and host.
+    """
+
+    def __init__(self, name, metric, threshold=None, op=">", duration=0.0, rate=None,
+                 clear=None, cooldown=60.0, message=None):
+        if op not in (">", "<"):
+            raise ValueError(f"Unsupported operator: {op}")
+        if threshold is None and rate is None:
+            raise ValueError(f"Rule {name} needs a threshold or a rate")
+        self.name = name
+        self.metric = metric
+        self.threshold = threshold
+        self.op = op
+        self.rate = rate
+        self.duration = duration if rate is None else (duration or 60.0)
+        self.clear = threshold if clear is None else clear
+        self.cooldown = cooldown
+        self.message = message or "{rule} on {host}: {metric} = {value:.1f}"
+
+
+class StdoutSink:
+    """Print alerts; resolved alerts are printed too unless ``resolved=False``."""
+
+    def __init__(self, resolved=True):
+        self.resolved = resolved
+
+    def send(self, alert):
+        if alert["state"] == "firing":
+            print(alert["message"])
+        elif self.resolved:
+            print(f"✅ RESOLVED: {alert['rule']} on {alert['host']} ({alert['value']:.1f})")
+
+
+class FileSink:
+    """Append alerts to a file as JSON lines."""
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def send(self, alert):
+        with open(self.filename, "a") as f:
+            f.write(json.dumps(alert) + "\n")
+
+
+class WebhookSink:
+    """POST alerts as JSON to ``url``. Without a url, alerts are kept in ``sent`` (stand-in for testing)."""
+
+    def __init__(self, url=None, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+        self.sent = []
+
+    def send(self, alert):
+        if self.url is None:
+            self.sent.append(alert)
+            return
+        request = urllib.request.Request(self.url, data=json.dumps(alert).encode(),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError as e:
+            print("Webhook error:", e)
+
+
+class AlertEngine:
+    """Evaluate many rules over many hosts in one vectorized pass.
+
+    Samples go into per-(host, metric) rolling windows held in preallocated NumPy
+    arrays; evaluate() gathers the window of every (rule, host) pair into one matrix
+    and computes thresholds, sustained windows, rates, hysteresis and cooldowns for
+    all of them at once.
+    """
+
+    def __init__(self, rules, sinks=None, capacity=64):
+        self.rules = list(rules)
+        self.sinks = list(sinks) if sinks is not None else [StdoutSink()]
+        self.capacity = capacity  # Samples kept per series; must cover the longest rule window
+        self.series = {}  # (host, metric) -> row in the value/time arrays
+        self.values = np.full((0, capacity), np.nan)
+        self.times = np.full((0, capacity), np.nan)
+        self.positions = np.zeros(0, dtype=np.int64)
+
+        # One row per (rule, host) pair, built as hosts appear
+        self.pairs = []
+        self.pair_series = np.zeros(0, dtype=np.int64)
+        self.firing = np.zeros(0, dtype=bool)
+        self.last_sent = np.zeros(0)
+        self._rule_params = None
+
+    def observe(self, host, sample, timestamp=None):
+        """Record one sample (dict of metric -> value) for ``host``. None/"N/A" values are skipped."""
+        timestamp = time.time() if timestamp is None else timestamp
+        for metric, value in sample.items():
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            row = self.series.get((host, metric))
+            if row is None:
+                row = self._add_series(host, metric)
+            position = self.positions[row] % self.capacity
+            self.values[row, position] = value
+            self.times[row, position] = timestamp
+            self.positions[row] += 1
+
+    def evaluate(self, now=None):
+        """Check every rule on every host. Sends and returns the alerts that changed state."""
+        if not self.pairs:
+            return []
+        now = time.time() if now is None else now
+        threshold, sign, duration, rate, clear, cooldown, is_rate = self._rule_params_for_pairs()
+
+        values = self.values[self.pair_series]  # (pairs, capacity)
+        times = self.times[self.pair_series]
+        has_data = ~np.isnan(times)
+        latest_time = np.where(has_data, times, -np.inf).max(axis=1)
+        latest_index = np.where(has_data, times, -np.inf).argmax(axis=1)
+        rows = np.arange(len(self.pairs))
+        latest = values[rows, latest_index]
+
+        # Samples inside each pair's window
+        in_window = has_data & (times >= (latest_time - duration)[:, None])
+        oldest_time = np.where(has_data, times, np.inf).min(axis=1)
+        covered = oldest_time <= latest_time - duration  # Enough history for the full window
+
+        # Threshold / sustained: every windowed sample beyond the threshold
+        beyond = sign[:, None] * (values - threshold[:, None]) > 0
+        sustained = np.all(beyond | ~in_window, axis=1) & (covered | (duration == 0))
+
+        # Rate of change per minute between the oldest windowed sample and the latest
+        first_index = np.where(in_window, times, np.inf).argmin(axis=1)
+        elapsed = latest_time - times[rows, first_index]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(elapsed > 0, (latest - values[rows, first_index]) / elapsed * 60.0, 0.0)
+        rate_exceeded = (sign * (slope - rate) > 0) & covered
+
+        triggered = np.where(is_rate, rate_exceeded, sustained)
+        # Hysteresis: a firing threshold rule stays on until the value is back past ``clear``
+        still_on = np.where(is_rate, rate_exceeded, sign * (latest - clear) > 0)
+        firing = np.where(self.firing, still_on, triggered) & np.isfinite(latest_time)
+
+        started = firing & ~self.firing & (now - self.last_sent >= cooldown)
+        resolved = ~firing & self.firing
+        # A rule that started firing during its cooldown stays silent (and not firing) until it's over
+        self.firing = np.where(firing & ~self.firing & ~started, False, firing)
+
+        alerts = []
+        for i in np.flatnonzero(started | resolved):
+            rule, host = self.pairs[i]
+            value = float(slope[i] if rule.rate is not None else latest[i])
+            state = "firing" if started[i] else "resolved"
+            alert = {"rule": rule.name, "host": host, "metric": rule.metric, "value": value,
+                     "state": state, "time": now}
+            alert["message"] = rule.message.format(rule=rule.name, host=host, metric=rule.metric, value=value)
+            if started[i]:
+                self.last_sent[i] = now
+            alerts.append(alert)
+            for sink in self.sinks:
+                sink.send(alert)
+        return alerts
+
+    def _add_series(self, host, metric):
+        row = len(self.series)
+        self.series[(host, metric)] = row
+        self.values = np.vstack([self.values, np.full((1, self.capacity), np.nan)])
+        self.times = np.vstack([self.times, np.full((1, self.capacity), np.nan)])
+        self.positions = np.append(self.positions, 0)
+        # Every rule on this metric gets a (rule, host) pair
+        new_pairs = [(rule, host) for rule in self.rules if rule.metric == metric]
+        if new_pairs:
+            self.pairs.extend(new_pairs)
+            self.pair_series = np.append(self.pair_series, [row] * len(new_pairs))
+            self.firing = np.append(self.firing, [False] * len(new_pairs))
+            self.last_sent = np.append(self.last_sent, [-np.inf] * len(new_pairs))
+            self._rule_params = None
+        return row
+
+    def _rule_params_for_pairs(self):
+        if self._rule_params is None:
+            rules = [rule for rule, host in self.pairs]
+            self._rule_params = (
+                np.array([rule.threshold if rule.threshold is not None else np.nan for rule in rules]),
+                np.array([1.0 if rule.op == ">" else -1.0 for rule in rules]),
+                np.array([rule.duration for rule in rules]),
+                np.array([rule.rate if rule.rate is not None else np.nan for rule in rules]),
+                np.array([rule.clear if rule.clear is not None else np.nan for rule in rules]),
+                np.array([rule.cooldown for rule in rules]),
+                np.array([rule.rate is not None for rule in rules]),
+            )
+        return self._rule_params
@@ -0,0 +1,395 @@
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import json
+import math
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+from instrument import GROWTH, MIN_VALUE, Histogram
+from segments import MISSING, SegmentStore, read_segment
+
+# Each script writes its own schema; every known column name maps to one canonical metric.
+# (dd.py: "CPU Usage (%)", Analysis.py: "CPU_Usage", another.py: "CPU Usage" with a time-only "Time")
+ALIASES = {
+    "cpu": ["CPU Usage (%)", "CPU_Usage", "CPU Usage"],
+    "cpu_temp": ["CPU Temperature (°C)", "CPU Temperature (C)"],
+    "cpu_mem": ["CPU_Memory_Usage"],
+    "gpu": ["GPU Usage (%)", "GPU_Usage", "GPU Usage"],
+    "gpu_temp": ["GPU Temperature (°C)", "GPU Temperature (C)"],
+    "gpu_mem": ["GPU_Memory_Usage"],
+    "interval": ["Sample Interval (s)", "Sample_Interval"],  # Seconds each row covers: the weight of its values
+}
+TIME_COLUMNS = ["Timestamp", "Time"]
+GROUPS = {"none": None, "minute": "m", "hour": "h", "day": "D", "month": "M"}
+
+CHUNK_BYTES = 8 << 20     # CSV bytes parsed at a time by a worker (bounds its memory)
+SPLIT_BYTES = 64 << 20    # Large CSV files are split into byte ranges of this size, one task each
+_LOG_GROWTH = math.log(GROWTH)
+
+
+def sketch(values):
+    """Build an instrument.Histogram (mergeable log-bucket sketch) from an array in one vectorized pass."""
+    histogram = Histogram()
+    if len(values):
+        index = np.floor(np.log(np.maximum(values, MIN_VALUE)) / _LOG_GROWTH).astype(np.int64)
+        keys, counts = np.unique(index, return_counts=True)
+        histogram.buckets = dict(zip(keys.tolist(), counts.tolist()))
+        histogram.count = len(values)
+        histogram.total = float(values.sum())
+        histogram.min, histogram.max = float(values.min()), float(values.max())
+    return histogram
+
+
+class Summary:
+    """Mergeable statistics of one metric (overall or for one time group).
+
+    The mean is weighted by the seconds each row covers, so rows sampled faster while
+    the machine was busy (adaptive sampling) don't pull it up; percentiles are per row.
+    """
+
+    __slots__ = ("sketch", "bins", "above", "missing", "weighted", "seconds")
+
+    def __init__(self):
+        self.sketch = Histogram()
+        self.bins = {}    # Fixed-width bin start -> count
+        self.above = 0    # Values above the --above threshold
+        self.missing = 0  # N/A readings
+        self.weighted = 0.0  # Sum of value * seconds covered
+        self.seconds = 0.0
+
+    def add(self, values, bin_width=None, above=None, weights=None):
+        mask = ~np.isnan(values)
+        valid = values[mask]
+        weights = np.ones(len(valid)) if weights is None else weights[mask]
+        self.weighted += float(np.dot(valid, weights))
+        self.seconds += float(weights.sum())
+        self.missing += len(values) - len(valid)
+        self.sketch.merge(sketch(valid))
+        if bin_width:
+            keys, counts = np.unique(np.floor(valid / bin_width) * bin_width, return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                self.bins[key] = self.bins.get(key, 0) + count
+        if above is not None:
+            self.above += int(np.count_nonzero(valid > above))
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.above += other.above
+        self.missing += other.missing
+        self.weighted += other.weighted
+        self.seconds += other.seconds
+        return self
+
+
+# Reading (runs in the worker processes)
+
+def resolve_columns(header):
+    """Map a CSV header to ``(time column index, {metric: column index})``; None if the schema is unknown."""
+    header = [name.strip() for name in header]
+    time_index = next((header.index(name) for name in TIME_COLUMNS if name in header), None)
+    columns = {}
+    for metric, names in ALIASES.items():
+        for name in names:
+            if name in header:
+                columns[metric] = header.index(name)
+                break
+    if time_index is None or not columns:
+        return None
+    return time_index, columns
+
+
+def parse_times(strings, date=None, latest=None):
+    """Wall-clock timestamps as datetime64[ms] (NaT if unparseable).
+
+    Time-only values ("15:35:04", another.py) get ``date``; those later in the day than
+    ``latest`` (the file's modification time) are taken to be from the day before.
+    """
+    if date is not None:
+        strings = [f"{date}T{value}" for value in strings]
+    try:
+        times = np.array(strings, dtype="datetime64[ms]")
+    except ValueError:
+        times = np.empty(len(strings), dtype="datetime64[ms]")
+        for i, value in enumerate(strings):
+            try:
+                times[i] = np.datetime64(value, "ms")
+            except ValueError:
+                times[i] = np.datetime64("NaT")
+    if date is not None and latest is not None:
+        times[times > latest] -= np.timedelta64(1, "D")
+    return times
+
+
+def csv_chunks(task):
+    """Yield ``(times, {metric: values})`` for the rows starting in the task's byte range, ``chunk_bytes`` at a time."""
+    date = latest = None
+    if task["time_only"]:
+        modified = datetime.datetime.fromtimestamp(task["mtime"])
+        date, latest = modified.date().isoformat(), np.datetime64(modified, "ms")
+
+    with open(task["path"], "rb") as f:
+        position = task["start"]
+        if position:
+            f.seek(position - 1)
+            position += len(f.readline()) - 1  # The line crossing ``start`` belongs to the previous range
+        else:
+            position = len(f.readline())  # Header
+        carry = b""
+        while position < task["end"]:
+            block = f.read(min(task["chunk_bytes"], task["end"] - position))
+            if not block:
+                break
+            position += len(block)
+            if position >= task["end"] and not block.endswith(b"\n"):
+                block += f.readline()  # Finish the last line that starts in this range
+            data = carry + block
+            cut = data.rfind(b"\n") + 1  # A partial last line is still being written
+            carry = data[cut:]
+            if cut:
+                yield parse_block(data[:cut], task["columns"], date, latest)
+
+
+def parse_block(data, columns, date=None, latest=None):
+    """Parse complete CSV lines with pandas' C parser into wall-clock times and float arrays."""
+    import io
+    import pandas as pd
+
+    time_index, metrics = columns
+    frame = pd.read_csv(io.BytesIO(data), header=None, usecols=[time_index, *metrics.values()], dtype={time_index: str},
+                        na_values=sorted(MISSING), keep_default_na=False, on_bad_lines="skip", encoding_errors="replace")
+    times = parse_times(frame[time_index].fillna("").tolist(), date, latest)
+    values = {}
+    for metric, index in metrics.items():
+        column = frame[index]
+        if column.dtype != float:
+            column = pd.to_numeric(column, errors="coerce")  # Stray text in a numeric column
+        values[metric] = column.to_numpy(dtype=float)
+    return times, values
+
+
+def segment_chunks(task):
+    """Yield one ``(times, {metric: values})`` chunk for a compacted segment file."""
+    time_index, columns = task["columns"]
+    data = read_segment(task["path"], [task["header"][index] for index in columns.values()])
+    stamps = data["Timestamp"]
+    if not len(stamps):
+        return
+    # Segments store epoch seconds; shift to local wall-clock time like the CSV timestamps
+    offset = time.localtime(float(stamps[0])).tm_gmtoff
+    times = ((stamps + offset) * 1000).astype("datetime64[ms]")
+    values = {}
+    for metric, index in columns.items():
+        column = data.get(task["header"][index])
+        if isinstance(column, np.ndarray):
+            values[metric] = column
+    yield times, values
+
+
+def run_task(task):
+    """Aggregate one task's rows: ``(rows, {metric: {"all": Summary, "groups": {key: Summary}}})``."""
+    options = task["options"]
+    unit, start, end = options["unit"], options["start"], options["end"]
+    results, total = {}, 0
+    chunks = segment_chunks(task) if task["kind"] == "segment" else csv_chunks(task)
+    for times, values in chunks:
+        keep = ~np.isnat(times)
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times < end
+        times = times[keep]
+        if not len(times):
+            continue
+        total += len(times)
+        order = None
+        if unit is not None:
+            keys = times.astype(f"datetime64[{unit}]").astype(np.int64)
+            order = np.argsort(keys, kind="stable")  # Already time-ordered in practice, so this is cheap
+            keys = keys[order]
+            bounds = np.flatnonzero(np.diff(keys)) + 1
+            starts, stops = np.r_[0, bounds], np.r_[bounds, len(keys)]
+
+        # Rows without a recorded interval (older files, another.py) weigh one second
+        weights = values.pop("interval", None)
+        weights = np.ones(len(times)) if weights is None else weights[keep]
+        weights = np.where(weights > 0, weights, 1.0)
+        for metric, column in values.items():
+            if options["metrics"] and metric not in options["metrics"]:
+                continue
+            column = column[keep]
+            result = results.setdefault(metric, {"all": Summary(), "groups": {}})
+            result["all"].add(column, options["bins"], options["above"], weights)
+            if unit is None:
+                continue
+            column, ordered = column[order], weights[order]
+            for lo, hi in zip(starts.tolist(), stops.tolist()):
+                group = result["groups"].setdefault(int(keys[lo]), Summary())
+                group.add(column[lo:hi], options["bins"], options["above"], ordered[lo:hi])
+    return total, results
+
+
+# Planning and merging (main process)
+
+def plan(paths, chunk_bytes=CHUNK_BYTES, split_bytes=SPLIT_BYTES, with_segments=True):
+    """Turn CSV files (and their rotated files and compacted segments) into independent tasks."""
+    tasks, skipped = [], []
+    for path in paths:
+        sources = [("csv", path)]
+        if with_segments and not path.endswith(".rotated"):
+            store = SegmentStore(path)
+            sources += [("csv", rotated) for rotated in store.pending()]
+            sources += [("segment", os.path.join(store.directory, entry["file"]), entry.get("columns", store.columns))
+                        for entry in store.entries()]
+
+        for source in sources:
+            kind, file = source[0], source[1]
+            if not os.path.exists(file):
+                continue
+            if kind == "segment":
+                header = source[2]
+            else:
+                with open(file, newline="", encoding="utf-8-sig", errors="replace") as f:
+                    header = next(csv.reader(f), None)
+            columns = resolve_columns(header) if header else None
+            if columns is None:
+                skipped.append(file)
+                continue
+            base = {"kind": kind, "path": file, "header": header, "columns": columns, "chunk_bytes": chunk_bytes,
+                    "time_only": header[columns[0]].strip() == "Time", "mtime": os.path.getmtime(file)}
+            if kind == "segment":
+                tasks.append(base)
+                continue
+            size = os.path.getsize(file)
+            for start in range(0, max(size, 1), split_bytes):
+                tasks.append(dict(base, start=start, end=min(start + split_bytes, size)))
+    return tasks, skipped
+
+
+def analyze(paths, metrics=None, group="hour", bins=None, above=None, start=None, end=None,
+            workers=None, chunk_bytes=CHUNK_BYTES, split_bytes=SPLIT_BYTES, with_segments=True):
+    """Aggregate ``paths`` across a process pool. Returns ``(rows, {metric: {"all": Summary, "groups": {...}}}, skipped)``."""
+    unit = GROUPS[group]
+    options = {"metrics": metrics, "unit": unit, "bins": bins, "above": above,
+               "start": np.datetime64(start, "ms") if start else None,
+               "end": np.datetime64(end, "ms") if end else None}
+    tasks, skipped = plan(paths, chunk_bytes, split_bytes, with_segments)
+    for task in tasks:
+        task["options"] = options
+
+    total, merged = 0, {}
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        for rows, results in map(run_task, tasks):
+            total += rows
+            merge_results(merged, results)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(min(workers, len(tasks)), mp_context=mp.get_context("spawn")) as pool:
+            futures = [pool.submit(run_task, task) for task in tasks]
+            for future in concurrent.futures.as_completed(futures):  # Merged as they arrive
+                rows, results = future.result()
+                total += rows
+                merge_results(merged, results)
+    return total, merged, skipped
+
+
+def merge_results(merged, results):
+    for metric, result in results.items():
+        target = merged.setdefault(metric, {"all": Summary(), "groups": {}})
+        target["all"].merge(result["all"])
+        for key, summary in result["groups"].items():
+            if key in target["groups"]:
+                target["groups"][key].merge(summary)
+            else:
+                target["groups"][key] = summary
+
+
+def describe(summary, percentiles, above=None):
+    histogram = summary.sketch
+    mean = summary.weighted / summary.seconds if summary.seconds else None
+    stats = {"count": histogram.count, "missing": summary.missing, "seconds": summary.seconds, "mean": mean,
+             "min": histogram.min if histogram.count else None, "max": histogram.max if histogram.count else None}
+    for p in percentiles:
+        stats[f"p{p:g}"] = histogram.quantile(p / 100)
+    if above is not None:
+        stats[f"above_{above:g}"] = summary.above
+        stats[f"above_{above:g}_pct"] = 100 * summary.above / histogram.count if histogram.count else None
+    if summary.bins:
+        stats["bins"] = {f"{key:g}": count for key, count in sorted(summary.bins.items())}
+    return stats
+
+
+def report(merged, group, percentiles, above=None):
+    """JSON-friendly results: overall and per-group statistics for each metric."""
+    unit = GROUPS[group]
+    output = {}
+    for metric, result in sorted(merged.items()):
+        output[metric] = {"all": describe(result["all"], percentiles, above)}
+        if unit is not None:
+            output[metric]["groups"] = {str(np.datetime64(key, unit)): describe(summary, percentiles, above)
+                                        for key, summary in sorted(result["groups"].items())}
+    return output
+
+
+def print_report(output, percentiles, above=None, bin_width=None):
+    def fmt(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    columns = ["count", "mean"] + [f"p{p:g}" for p in percentiles] + ["max"]
+    counts = {"count"}
+    if above is not None:
+        columns.append(f"above_{above:g}")
+        counts.add(f"above_{above:g}")
+    for metric, result in output.items():
+        print(f"\n{metric}")
+        print(f"  {'group':<20}" + "".join(f"{column:>12}" for column in columns))
+        rows = list(result.get("groups", {}).items()) + [("all", result["all"])]
+        for label, stats in rows:
+            cells = [str(stats[column]) if column in counts else fmt(stats[column]) for column in columns]
+            print(f"  {label:<20}" + "".join(f"{cell:>12}" for cell in cells))
+        for label, count in result["all"].get("bins", {}).items():
+            print(f"  [{label}, {float(label) + bin_width:g})".ljust(22) + f"{count:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Percentiles, histograms and per-period aggregates over recorded metric files.")
+    parser.add_argument("files", nargs="*", default=["system_monitor.csv", "performance_data.csv", "system_usage.csv"],
+                        help="metric CSV files (their rotated files and compacted segments are included)")
+    parser.add_argument("--metrics", help=f"comma separated, any of {', '.join(name for name in ALIASES if name != 'interval')} (default: all found)")
+    parser.add_argument("--group", choices=GROUPS, default="hour", help="aggregate per time period")
+    parser.add_argument("--percentiles", default="50,95,99")
+    parser.add_argument("--above", type=float, help="also count values above this threshold (e.g. --metrics gpu_temp --above 80)")
+    parser.add_argument("--bins", type=float, help="fixed-width histogram with this bin width")
+    parser.add_argument("--from", dest="start", help="only rows at or after this local time (e.g. 2025-01-01)")
+    parser.add_argument("--to", dest="end", help="only rows before this local time")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / (1 << 20), help="CSV megabytes parsed at a time per worker")
+    parser.add_argument("--no-segments", action="store_true", help="only read the CSV files themselves")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of tables")
+    args = parser.parse_args()
+
+    metrics = args.metrics.split(",") if args.metrics else None
+    percentiles = [float(p) for p in args.percentiles.split(",")]
+    files = [path for path in args.files if os.path.exists(path) or os.path.isdir(os.path.splitext(path)[0] + ".segments")]
+    started = time.perf_counter()
+    total, merged, skipped = analyze(files, metrics, args.group, args.bins, args.above, args.start, args.end,
+                                     args.workers, int(args.chunk_mb * (1 << 20)), with_segments=not args.no_segments)
+    output = report(merged, args.group, percentiles, args.above)
+    for path in skipped:
+        print(f"Skipped {path}: unrecognised columns", file=sys.stderr)
+    if args.json:
+        print(json.dumps(output, indent=1))
+    else:
+        print(f"{total} rows from {len(files)} file(s) in {time.perf_counter() - started:.2f}s")
+        print_report(output, percentiles, args.above, args.bins)
+
+
+if __name__ == "__main__":
+    main()
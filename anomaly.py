@@ -0,0 +1,183 @@
+import time
+
+import numpy as np
+
+
+class AnomalyDetector:
+    """Streaming anomaly detection for many series at once, in constant time and memory per sample.
+
+    Each series (e.g. one (host, metric) pair) keeps three baselines, all updated in one
+    vectorized pass per call:
+
+    - EWMA mean and variance (``alpha``), which follow slow drift.
+    - A rolling window of the last ``window`` samples, kept as running sums.
+    - A seasonal EWMA per time-of-day slot (``season`` seconds split into ``slots``),
+      so load that is normal for this time of day isn't flagged.
+
+    A sample's score is its smallest absolute z-score against the baselines that are
+    warmed up. It is flagged when that score exceeds ``threshold``, so it has to be
+    unusual against every baseline. Samples are scored before the baselines learn from them.
+    """
+
+    def __init__(self, alpha=0.05, window=60, threshold=4.0, warmup=30, season=24 * 3600,
+                 slots=24, season_alpha=0.1, season_warmup=5, min_std=0.5):
+        self.alpha = alpha
+        self.window = window
+        self.threshold = threshold
+        self.warmup = warmup
+        self.season = season
+        self.slots = slots
+        self.season_alpha = season_alpha
+        self.season_warmup = season_warmup
+        self.min_std = min_std  # Floor for the deviation, so flat series don't flag tiny changes
+
+        self.series = {}  # key -> row in the state arrays
+        self.keys = []
+        self._size = 0
+        # Per-series state, preallocated and doubled as series appear
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.var = np.zeros(0)
+        self.ring = np.zeros((0, window))
+        self.sum = np.zeros(0)
+        self.sumsq = np.zeros(0)
+        self.season_count = np.zeros((0, slots), dtype=np.int64)
+        self.season_mean = np.zeros((0, slots))
+        self.season_var = np.zeros((0, slots))
+        self._allocate(64)
+
+    def _allocate(self, capacity):
+        def grow(array, fill):
+            new = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            new[:len(array)] = array
+            return new
+
+        self.count = grow(self.count, 0)
+        self.mean = grow(self.mean, 0.0)
+        self.var = grow(self.var, 0.0)
+        self.ring = grow(self.ring, 0.0)
+        self.sum = grow(self.sum, 0.0)
+        self.sumsq = grow(self.sumsq, 0.0)
+        self.season_count = grow(self.season_count, 0)
+        self.season_mean = grow(self.season_mean, 0.0)
+        self.season_var = grow(self.season_var, 0.0)
+
+    def rows(self, keys):
+        """Row indices for ``keys``, registering new series. Cache the result for a fixed set of series."""
+        rows = []
+        for key in keys:
+            row = self.series.get(key)
+            if row is None:
+                row = self.series[key] = self._size
+                self.keys.append(key)
+                self._size += 1
+                if self._size > len(self.count):
+                    self._allocate(2 * len(self.count))
+            rows.append(row)
+        return np.array(rows, dtype=np.int64)
+
+    def update(self, rows, values, timestamps=None):
+        """Score and learn one sample per row. ``rows`` must not repeat within a call.
+
+        ``values`` may contain NaN for missing readings (not scored, not learned).
+        Returns ``(scores, anomalous, expected)`` arrays aligned with ``rows``, where
+        ``expected`` is the EWMA baseline.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        timestamps = np.broadcast_to(time.time() if timestamps is None else np.asarray(timestamps, dtype=float), values.shape)
+        valid = ~np.isnan(values)
+        rows, x, timestamps = rows[valid], values[valid], timestamps[valid]
+        scores = np.full(len(values), np.nan)
+        anomalous = np.zeros(len(values), dtype=bool)
+        expected = np.full(len(values), np.nan)
+        if not len(rows):
+            return scores, anomalous, expected
+
+        count = self.count[rows]
+        slot = (timestamps % self.season // (self.season / self.slots)).astype(np.int64)
+
+        # Score against each baseline; a baseline that isn't warmed up can't clear a sample
+        z = np.full((3, len(rows)), np.inf)
+        mean, var = self.mean[rows], self.var[rows]
+        z[0] = np.abs(x - mean) / np.maximum(np.sqrt(var), self.min_std)
+        n = np.minimum(count, self.window)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rolling_mean = self.sum[rows] / n
+            rolling_var = np.maximum(self.sumsq[rows] / n - rolling_mean ** 2, 0.0)
+            z[1] = np.where(n > 1, np.abs(x - rolling_mean) / np.maximum(np.sqrt(rolling_var), self.min_std), np.inf)
+        season_count = self.season_count[rows, slot]
+        season_mean, season_var = self.season_mean[rows, slot], self.season_var[rows, slot]
+        z[2] = np.where(season_count >= self.season_warmup,
+                        np.abs(x - season_mean) / np.maximum(np.sqrt(season_var), self.min_std), np.inf)
+        score = z.min(axis=0)
+        warm = count >= self.warmup
+        scores[valid] = np.where(warm, score, 0.0)
+        anomalous[valid] = warm & (score > self.threshold)
+        expected[valid] = np.where(count > 0, mean, x)
+
+        # EWMA mean/variance (the first sample initialises the mean)
+        diff = np.where(count > 0, x - mean, 0.0)
+        increment = self.alpha * diff
+        self.mean[rows] = np.where(count > 0, mean + increment, x)
+        self.var[rows] = (1 - self.alpha) * (var + diff * increment)
+
+        # Rolling window: replace the oldest value in the ring and adjust the running sums
+        position = count % self.window
+        old = np.where(count >= self.window, self.ring[rows, position], 0.0)
+        self.ring[rows, position] = x
+        self.sum[rows] += x - old
+        self.sumsq[rows] += x * x - old * old
+        # Recompute the sums now and then so floating-point drift can't build up
+        resync = rows[(count + 1) % (self.window * 1000) == 0]
+        if len(resync):
+            self.sum[resync] = self.ring[resync].sum(axis=1)
+            self.sumsq[resync] = (self.ring[resync] ** 2).sum(axis=1)
+
+        # Seasonal EWMA for this time-of-day slot
+        season_diff = np.where(season_count > 0, x - season_mean, 0.0)
+        season_increment = self.season_alpha * season_diff
+        self.season_mean[rows, slot] = np.where(season_count > 0, season_mean + season_increment, x)
+        self.season_var[rows, slot] = (1 - self.season_alpha) * (season_var + season_diff * season_increment)
+        self.season_count[rows, slot] = season_count + 1
+
+        self.count[rows] = count + 1
+        return scores, anomalous, expected
+
+    def observe(self, host, sample, timestamp=None):
+        """Score one sample (dict of metric -> value) for ``host``. Returns ``{metric: anomaly dict}``."""
+        return {anomaly["metric"]: anomaly for anomaly in self.observe_many([(host, timestamp, sample)])}
+
+    def observe_many(self, records):
+        """Score many ``(host, timestamp, sample)`` records in as few vectorized passes as possible.
+
+        Records for the same series are applied in order (one pass per repeat).
+        Returns a list of anomaly dicts (host, metric, value, score, expected, time).
+        """
+        rounds = []  # The k-th sample of every series goes into round k
+        seen = {}
+        for host, timestamp, sample in records:
+            timestamp = time.time() if timestamp is None else timestamp
+            for metric, value in sample.items():
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    continue  # None / "N/A"
+                key = (host, metric)
+                k = seen.get(key, 0)
+                seen[key] = k + 1
+                if k == len(rounds):
+                    rounds.append(([], [], []))
+                keys, values, timestamps = rounds[k]
+                keys.append(key)
+                values.append(value)
+                timestamps.append(timestamp)
+
+        anomalies = []
+        for keys, values, timestamps in rounds:
+            scores, anomalous, expected = self.update(self.rows(keys), values, timestamps)
+            for i in np.flatnonzero(anomalous):
+                host, metric = keys[i]
+                anomalies.append({"host": host, "metric": metric, "value": values[i], "score": float(scores[i]),
+                                  "expected": float(expected[i]), "time": timestamps[i]})
+        return anomalies
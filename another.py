@@ -2,73 +2,93 @@ import streamlit as st
 import pandas as pd
 import psutil
 import time
-import os
-from statsmodels.tsa.arima.model import ARIMA  # ARIMA for time-series prediction
+from metric_writer import MetricWriter
+from forecaster import Forecaster  # ARIMA for time-series prediction, fitted in a worker process
+from sampler import RingBuffer, Sampler, start_once
+from csv_tail import CsvTail
+from rollup import to_float
+from instrument import SelfMonitor, timed
 
 st.set_page_config(layout="wide")  # Full-width layout
 st.title("📊 Real-Time CPU & GPU Monitor with ML Predictions")
 
 # CSV File to Store Data
 CSV_FILE = "system_usage.csv"
+FIELDS = ["Time", "CPU Usage", "GPU Usage"]
+MAX_POINTS = 50
 
-# Check if the CSV file exists, if not, create it
-if not os.path.exists(CSV_FILE):
-    pd.DataFrame(columns=["Time", "CPU Usage", "GPU Usage"]).to_csv(CSV_FILE, index=False)
+# One sampler, CSV writer and forecaster per server process, shared by every browser session
+# (Streamlit re-runs this script for each session and each refresh; cache_resource runs this once).
+# Each tick takes one sample, writes exactly one CSV row, feeds the forecaster and caches its
+# latest prediction; sessions only read that snapshot, so ten viewers cost the same as one.
+@st.cache_resource
+def get_monitor():
+    csv_writer = MetricWriter(CSV_FILE, FIELDS, batch_size=10, flush_interval=5.0)
+    csv_writer.flush()  # Make sure a new file has its header before reading it back
 
-#
-# Load existing data
-df = pd.read_csv(CSV_FILE)
+    # Start the graph from the last rows already in the file
+    history = RingBuffer(FIELDS, capacity=MAX_POINTS)
+    recent = CsvTail(CSV_FILE, window=MAX_POINTS)
+    for row in recent.poll():
+        history.append({"Time": row.get("Time"), "CPU Usage": to_float(row.get("CPU Usage")),
+                        "GPU Usage": to_float(row.get("GPU Usage"))})
+    recent.close()
 
-#
-# Initialize session state for real-time graph
-if "data" not in st.session_state:
-    st.session_state.data = df.tail(50)  
+    # Background forecaster: new samples are appended to the fitted model, with a full
+    # (warm-started) refit every 60 seconds or when its one-step error gets too large
+    forecaster = Forecaster(order=(2,1,2), steps=5, refit_every=60.0).start()
+    self_monitor = SelfMonitor("another")  # The app's own CPU/RSS and stage timings, in monitor_self.csv
+    shared = {"prediction": None, "overhead": None}
+
+    def collect():
+        # **Get system usage data**
+        with timed("sensor read"):
+            cpu_usage = psutil.cpu_percent()
+        gpu_usage = 0  # Default if no GPU available
+        timestamp = time.strftime("%H:%M:%S")
+
+        # Save to CSV (batched append, header is only written for an empty file)
+        csv_writer.write([timestamp, cpu_usage, gpu_usage])
+
+        # **Send the window (including this sample) to the forecaster and cache its latest prediction**
+        window = history.snapshot(MAX_POINTS - 1)["CPU Usage"] + [cpu_usage]
+        forecaster.submit([value for value in window if value is not None], history.count + 1)
+        shared["prediction"] = forecaster.latest()
+        shared["overhead"] = self_monitor.read()
+        return {"Time": timestamp, "CPU Usage": cpu_usage, "GPU Usage": gpu_usage}
+
+    psutil.cpu_percent()  # Prime the counter so the first non-blocking reading is meaningful
+    sampler = start_once(Sampler(collect, history, interval=1.0))  # Update every second
+    return history, shared, sampler
+
+history, shared, sampler = get_monitor()
 
 #
-# **Graph and Number placeholders**
-col1, col2 = st.columns(2)
-cpu_placeholder = col1.metric("🖥️ CPU Usage", "0%")
-gpu_placeholder = col2.metric("🎮 GPU Usage", "0%")
-chart_placeholder = st.empty()
-prediction_placeholder = st.empty()  # Placeholder for ML prediction
-
-def predict_future_cpu(data):
-    """ Train ARIMA model and predict next CPU usage """
-    if len(data) < 10:  
-
-        return None
-    model = ARIMA(data, order=(2,1,2))  # ARIMA model (adjust order based on performance)
-    model_fit = model.fit()
-    prediction = model_fit.forecast(steps=5)  # Predict next 5 seconds
-    return prediction
-
-while True:
-    # **Get system usage data**
-    cpu_usage = psutil.cpu_percent()
-    gpu_usage = 0  # Default if no GPU available
-    timestamp = time.strftime("%H:%M:%S")
-
-    # **Append new data and update CSV**
-    new_data = pd.DataFrame({"Time": [timestamp], "CPU Usage": [cpu_usage], "GPU Usage": [gpu_usage]})
-    st.session_state.data = pd.concat([st.session_state.data, new_data]).tail(50)
-
-    # Save to CSV (append mode)
-    with open(CSV_FILE, "a") as f:
-        new_data.to_csv(f, header=f.tell()==0, index=False)  # Only add header if file is empty
+# **Graph and Number placeholders** (re-rendered every second from the shared snapshot)
+@st.fragment(run_every=1)
+def live_view():
+    data = history.snapshot()
+    if not data["Time"]:
+        st.write("Waiting for the first sample...")
+        return
+    cpu_usage, gpu_usage = data["CPU Usage"][-1], data["GPU Usage"][-1]
 
     # **Update metrics**
-    cpu_placeholder.metric("🖥️ CPU Usage", f"{cpu_usage}%")
-    gpu_placeholder.metric("🎮 GPU Usage", f"{gpu_usage}%")
+    col1, col2 = st.columns(2)
+    col1.metric("🖥️ CPU Usage", f"{cpu_usage}%")
+    col2.metric("🎮 GPU Usage", f"{gpu_usage}%")
 
-    # **Train and Predict CPU Usage**
-    cpu_predictions = predict_future_cpu(st.session_state.data["CPU Usage"])
-    
     # **Update the graph**
-    with chart_placeholder:
-        st.line_chart(st.session_state.data.set_index("Time"))
+    with timed("figure build"):
+        st.line_chart(pd.DataFrame(data).set_index("Time"))
 
     # **Show Predictions**
-    if cpu_predictions is not None:
-        prediction_placeholder.write(f"📈 **Predicted CPU Usage (Next 5s):** {list(cpu_predictions)}")
+    if shared["prediction"] is not None:
+        prediction, age = shared["prediction"]
+        st.write(f"📈 **Predicted CPU Usage (Next 5s):** {[round(p, 2) for p in prediction]} (updated {age:.0f}s ago)")
+
+    overhead = shared["overhead"]
+    if overhead is not None:
+        st.caption(f"Monitor overhead: {overhead['Monitor CPU (%)']:.1f}% CPU, {overhead['Monitor RSS (MB)']:.0f} MB RSS")
 
-    time.sleep(1)  # Update every second
\ No newline at end of file
+live_view()
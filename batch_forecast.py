@@ -0,0 +1,394 @@
+import argparse
+import collections
+import concurrent.futures
+import csv
+import json
+import multiprocessing as mp
+import os
+import signal
+import threading
+import time
+import warnings
+
+import numpy as np
+
+import instrument
+from instrument import timed
+from rollup import to_epoch
+from segments import INTERVAL_COLUMNS
+
+
+def holt_forecast(values, steps=5, alpha=0.5, beta=0.1, season=None, gamma=0.1):
+    """Holt's linear exponential smoothing (additive Holt-Winters with ``season``) for many series at once.
+
+    ``values`` is a series x time array; series shorter than the rest are padded with NaN
+    on the left (see ``align``) and missing readings are NaN too, which leave the state as
+    it is. The recursion steps through time once, updating every series in one NumPy
+    operation. Returns a series x ``steps`` array (NaN for series without any data).
+    """
+    values = np.asarray(values, dtype=float)
+    count, length = values.shape
+    level = np.full(count, np.nan)
+    trend = np.zeros(count)
+    seasonal = _initial_seasons(values, season) if season else None
+    for t in range(length):
+        x = values[:, t]
+        valid = ~np.isnan(x)
+        s = seasonal[:, t % season] if season else 0.0
+        first = valid & np.isnan(level)
+        level[first] = (x - s)[first]  # The first reading starts the level
+        update = valid & ~first
+        new_level = alpha * (x - s) + (1 - alpha) * (level + trend)
+        trend = np.where(update, beta * (new_level - level) + (1 - beta) * trend, trend)
+        if season:
+            seasonal[:, t % season] = np.where(update, gamma * (x - new_level) + (1 - gamma) * s, s)
+        level = np.where(update, new_level, level)
+
+    horizon = np.arange(1, steps + 1)
+    forecast = level[:, None] + trend[:, None] * horizon
+    if season:
+        forecast += seasonal[:, (length - 1 + horizon) % season]
+    return forecast
+
+
+def _initial_seasons(values, season):
+    """Seasonal components from each series' first season (deviations from its mean), by position in the season.
+
+    Series with fewer than two seasons of data start with no seasonality.
+    """
+    count, length = values.shape
+    seasonal = np.zeros((count, season))
+    start = np.argmax(~np.isnan(values), axis=1)  # First reading of each (left-padded) series
+    rows = np.flatnonzero(length - start >= 2 * season)
+    if len(rows):
+        columns = start[rows, None] + np.arange(season)
+        first = values[rows[:, None], columns]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN season
+            deviations = np.nan_to_num(first - np.nanmean(first, axis=1, keepdims=True))
+        seasonal[rows[:, None], columns % season] = deviations
+    return seasonal
+
+
+def align(series, length=None):
+    """Stack sequences of different lengths into one array, right-aligned (newest last) and NaN-padded."""
+    length = length or max((len(values) for values in series), default=0)
+    matrix = np.full((len(series), length), np.nan)
+    for row, values in zip(matrix, series):
+        values = np.asarray(values, dtype=float)[-length:]
+        if len(values):
+            row[-len(values):] = values
+    return matrix
+
+
+def median_interval(timestamps):
+    """Median time between successive readings (seconds), or None with fewer than two distinct times."""
+    gaps = np.diff(np.unique(np.asarray(timestamps, dtype=float)))
+    return float(np.median(gaps)) if len(gaps) else None
+
+
+def resample(timestamps, values, step=None, length=None):
+    """Put readings taken at ``timestamps`` (epoch seconds) on a grid of ``step`` seconds.
+
+    The grid ends at the newest timestamp and ``step`` defaults to the median interval.
+    Readings in the same slot are averaged and slots without one (offline hosts, sensor
+    dropouts, slower adaptive sampling) are NaN, so one forecast step is always ``step``
+    seconds. Returns ``(step, values)`` with at most ``length`` of the newest slots; without
+    a usable step the readings are returned as they are.
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    values = np.asarray(values, dtype=float)
+    step = step or median_interval(timestamps)
+    if not step:
+        return None, values[-length:] if length else values
+    slots = np.round((timestamps - timestamps.max()) / step).astype(int)  # 0 for the newest, negative before
+    if length:
+        keep = slots > -length
+        slots, values = slots[keep], values[keep]
+    slots -= slots.min()
+    valid = ~np.isnan(values)
+    sums = np.bincount(slots[valid], weights=values[valid], minlength=slots.max() + 1)
+    counts = np.bincount(slots[valid], minlength=slots.max() + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return step, np.where(counts > 0, sums / counts, np.nan)
+
+
+def _timed_out(signum, frame):
+    raise TimeoutError("ARIMA fit timed out")
+
+
+def _fit_task(values, order, steps, start_params, timeout=None):
+    """Worker process: fit ARIMA to one series and forecast it, giving up after ``timeout`` seconds.
+
+    The limit uses SIGALRM (the pool runs tasks on each worker's main thread); where there is
+    no SIGALRM (Windows) it isn't enforced and only the caller's ``max_fit_seconds`` applies.
+    """
+    from forecaster import fit_arima
+    import statsmodels.tsa.arima.model  # noqa: F401  Before the filter below: the import adds an "always" filter
+
+    alarm = bool(timeout) and hasattr(signal, "setitimer")
+    if alarm:
+        signal.signal(signal.SIGALRM, _timed_out)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    started = time.perf_counter()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # statsmodels convergence chatter
+            model_fit = fit_arima(values, order, start_params)
+            forecast = [float(value) for value in model_fit.forecast(steps=steps)]
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    # Fit timings travel with the result and are merged into the parent's histograms
+    return {"forecast": forecast, "params": np.asarray(model_fit.params), "seconds": time.perf_counter() - started,
+            "timings": instrument.drain()}
+
+
+class BatchForecaster:
+    """Forecast many series (e.g. every metric of every host) without ever blocking the caller.
+
+    ``submit({key: (version, values, step)})`` takes the current window of each series
+    (evenly spaced ``step`` seconds apart, NaN for gaps; see ``resample``; ``step`` is None
+    if unknown) and a data version that changes whenever the series gets new samples. For every new
+    version a Holt forecast is computed right away, all series in one vectorized pass,
+    and an ARIMA fit (forecaster.fit_arima, warm-started from the series' previous
+    parameters) is queued on a process pool. Results are cached by series and version:
+    submitting an unchanged version costs nothing.
+
+    Series with fewer than ``min_points`` readings, whose last fit took longer than
+    ``max_fit_seconds`` or failed (both for ``backoff`` seconds), or that find ``max_pending``
+    fits already queued get the Holt forecast only. A fit still running after ``fit_timeout``
+    seconds is interrupted in its worker and counts as failed (not on Windows, see _fit_task).
+    ``results()`` only reads the cache.
+    """
+
+    def __init__(self, steps=5, order=(2, 1, 2), workers=None, min_points=30, max_points=500,
+                 max_fit_seconds=5.0, fit_timeout=60.0, backoff=600.0, max_pending=None, season=None):
+        self.steps = steps
+        self.order = order
+        self.min_points = min_points
+        self.max_points = max_points  # ARIMA fits use at most this many of the newest points
+        self.max_fit_seconds = max_fit_seconds
+        self.fit_timeout = fit_timeout
+        self.backoff = backoff
+        self.season = season
+        workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * workers
+        self._pool = concurrent.futures.ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"))
+        self._cache = {}  # key -> {"version", "holt", "arima", "params", "pending", "skip_until", "error"}
+        self._pending = 0
+        self._lock = threading.RLock()  # A fit that is already done calls back while submit() holds it
+
+    def submit(self, series):
+        """Update the forecasts of ``series`` ({key: (version, values, step)}). Returns the keys that had a new version."""
+        with self._lock:
+            changed = {key: data for key, data in series.items()
+                       if key not in self._cache or self._cache[key]["version"] != data[0]}
+            for key, (version, values, step) in changed.items():
+                entry = self._cache.setdefault(key, {"holt": None, "arima": None, "params": None, "pending": None,
+                                                     "skip_until": 0.0, "error": None})
+                entry["version"] = version
+        if not changed:
+            return []
+
+        keys = list(changed)
+        with timed("holt forecast"):
+            forecasts = holt_forecast(align([changed[key][1] for key in keys], self.max_points), self.steps,
+                                      season=self.season)
+        now = time.time()
+        with self._lock:
+            for key, forecast in zip(keys, forecasts.tolist()):
+                version, values, step = changed[key]
+                entry = self._cache[key]
+                if entry["version"] == version:
+                    entry["holt"] = {"forecast": forecast, "version": version, "step": step, "fitted_at": now}
+            self._queue_fits(changed, now)
+        return keys
+
+    def _queue_fits(self, changed, now):
+        # Oldest ARIMA forecasts first, so every series gets a turn when the pool can't keep up
+        def age(key):
+            arima = self._cache[key]["arima"]
+            return 0.0 if arima is None else arima["fitted_at"]
+
+        for key in sorted(changed, key=age):
+            version, values, step = changed[key]
+            entry = self._cache[key]
+            window = np.asarray(values, dtype=float)[-self.max_points:]
+            valid = np.flatnonzero(~np.isnan(window))
+            if (self._pending >= self.max_pending or entry["pending"] is not None or len(valid) < max(self.min_points, 1)
+                    or now < entry["skip_until"]):
+                continue
+            window = window[valid[0]:].tolist()  # Gaps inside the window stay NaN (missing observations)
+            future = self._pool.submit(_fit_task, window, self.order, self.steps, entry["params"], self.fit_timeout)
+            entry["pending"] = version
+            self._pending += 1
+            future.add_done_callback(lambda done, key=key, version=version, step=step: self._fitted(key, version, step, done))
+
+    def _fitted(self, key, version, step, future):
+        try:
+            result = future.result()
+        except Exception as e:  # Fit failed, or the pool was shut down
+            result = None
+            error = str(e) or type(e).__name__
+        with self._lock:
+            self._pending -= 1
+            entry = self._cache[key]
+            entry["pending"] = None
+            if result is None:
+                entry["error"] = error
+                entry["params"] = None  # Next time start from scratch
+                entry["skip_until"] = time.time() + self.backoff
+                return
+            instrument.merge(result["timings"])
+            entry["arima"] = {"forecast": result["forecast"], "version": version, "step": step,
+                              "fitted_at": time.time(), "fit_seconds": result["seconds"]}
+            entry["params"] = result["params"]
+            entry["error"] = None
+            if result["seconds"] > self.max_fit_seconds:
+                entry["skip_until"] = time.time() + self.backoff
+
+    def result(self, key):
+        """Freshest forecast of one series with its metadata, or None if it was never submitted.
+
+        ``model`` is "arima" when the ARIMA fit is at least as new as the Holt forecast,
+        otherwise "holt". ``version`` is the data version the forecast was made from and
+        ``stale`` whether newer data has been submitted since; ``age`` is in seconds and
+        ``pending`` tells whether an ARIMA fit of the series is running. Forecast values are
+        ``step`` seconds apart and cover ``horizon`` seconds (None if the spacing is unknown).
+        """
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            holt, arima = entry["holt"], entry["arima"]
+            best = arima if arima is not None and (holt is None or arima["version"] == holt["version"]) else holt
+            if best is None:
+                return None
+            step = best["step"]
+            return {"forecast": best["forecast"], "model": "arima" if best is arima else "holt",
+                    "step": step, "horizon": step * self.steps if step else None, "version": best["version"], "latest_version": entry["version"],
+                    "stale": best["version"] != entry["version"], "fitted_at": best["fitted_at"],
+                    "age": time.time() - best["fitted_at"], "pending": entry["pending"] is not None,
+                    "error": entry["error"]}
+
+    def results(self, keys=None):
+        """``{key: result(key)}`` for ``keys`` (default: every series submitted so far)."""
+        with self._lock:
+            keys = list(self._cache) if keys is None else keys
+        return {key: self.result(key) for key in keys}
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def wait(self, timeout=None):
+        """Block until no ARIMA fit is running (for batch jobs; dashboards should just read results())."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._pending and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.05)
+        return not self._pending
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def read_series(path, points=600):
+    """The last ``points`` grid slots of every series in a CSV: ``{key: (version, values, step)}``.
+
+    collector.py's long format (Timestamp, Host, Metric, Value) gives one series per host and
+    metric; the scripts' wide CSVs give one per numeric column, keyed by the file name. Each
+    series is resampled onto its median interval (N/A readings and gaps become NaN); files
+    whose timestamps have no date are used as they are. The version of a series is the number
+    of readings it has in the file.
+    """
+    series = collections.defaultdict(lambda: collections.deque(maxlen=points))
+    counts = collections.Counter()
+    source = os.path.basename(path)
+    dated = True
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return {}
+        long_format = header[1:4] == ["Host", "Metric", "Value"]
+        for row in reader:
+            if not row:
+                continue
+            try:
+                timestamp = to_epoch(row[0]) if dated else None
+            except ValueError:
+                dated, timestamp = False, None  # e.g. "%H:%M:%S" only
+            if long_format:
+                if len(row) < 4:
+                    continue
+                items = [((row[1], row[2]), row[3])]
+            else:
+                items = [((source, name), value) for name, value in zip(header[1:], row[1:])
+                         if name not in INTERVAL_COLUMNS]  # The sampling interval isn't a metric
+            for key, value in items:
+                try:
+                    value = float(value)
+                except ValueError:
+                    value = np.nan  # N/A or text
+                else:
+                    counts[key] += 1
+                series[key].append((timestamp, value))
+
+    result = {}
+    for key, readings in series.items():
+        if not counts[key]:
+            continue  # Text column
+        timestamps, values = zip(*readings)
+        if dated:
+            step, values = resample(timestamps, values, length=points)
+        else:
+            step, values = None, [value for value in values if value == value]
+        result[key] = (counts[key], list(values), step)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast every series in recorded metric files (capacity planning).")
+    parser.add_argument("files", nargs="+", help="collector.py --csv output or the scripts' CSV files")
+    parser.add_argument("--steps", type=int, default=30, help="steps (of each series' median interval) to forecast ahead")
+    parser.add_argument("--points", type=int, default=600, help="newest grid slots used per series")
+    parser.add_argument("--metrics", help="comma separated metric/column names to forecast (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="fitting processes (default: one per CPU)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for ARIMA fits before reporting")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    series = {}
+    for path in args.files:
+        series.update(read_series(path, args.points))
+    if args.metrics:
+        wanted = set(args.metrics.split(","))
+        series = {key: value for key, value in series.items() if key[1] in wanted}
+
+    started = time.perf_counter()
+    forecaster = BatchForecaster(steps=args.steps, workers=args.workers, max_points=args.points,
+                                 max_pending=len(series) or None)
+    forecaster.submit(series)
+    forecaster.wait(args.timeout)
+    results = forecaster.results()
+    forecaster.close()
+
+    if args.json:
+        print(json.dumps([dict(result, host=host, metric=metric) for (host, metric), result in sorted(results.items())]))
+        return
+    models = collections.Counter(result["model"] for result in results.values())
+    print(f"{len(results)} series in {time.perf_counter() - started:.1f}s "
+          f"({models['arima']} ARIMA, {models['holt']} Holt)")
+    print(f"{'host':<20}{'metric':<28}{'model':>6}{'last':>10}{'next':>10}{f'+{args.steps}':>10}{'horizon':>10}")
+    for (host, metric), result in sorted(results.items()):
+        values = series[(host, metric)][1]
+        last = next((value for value in reversed(values) if value == value), float("nan"))
+        forecast = result["forecast"]
+        horizon = "-" if result["horizon"] is None else f"{result['horizon']:.0f}s"
+        print(f"{host:<20}{metric:<28}{result['model']:>6}{last:>10.1f}{forecast[0]:>10.1f}{forecast[-1]:>10.1f}"
+              f"{horizon:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+import argparse
+import collections
+import datetime
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import types
+from queue import Empty
+
+# Benchmarks for the monitor's hot paths. Each benchmark runs in its own process (so peak
+# RSS is per benchmark) inside a scratch directory, with psutil and NVML replaced by fast
+# deterministic fakes unless --real-sensors is given. Results are saved as JSON and can be
+# compared against a previous run with --compare.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [10_000, 1_000_000]  # Add 10_000_000 with --sizes for the long-history case
+CSV_HEADER = "Timestamp,CPU Usage (%),CPU Temperature (°C),GPU Usage (%),GPU Temperature (°C)\n"
+
+# Cold import time, measured in fresh interpreters: what each entry point imports, and the
+# budget (ms) for the CLI collector path that is launched from cron and containers
+IMPORT_TARGETS = {
+    "agent": "agent, collectors",
+    "analysis": "metric_writer, scheduler, collectors, instrument, segments",  # Analysis.py's imports
+    "collector": "collector",
+    "dd": "dd",
+}
+IMPORT_BUDGET_MS = {"agent": 100, "analysis": 100, "collector": 100}
+HEAVY_MODULES = ["numpy", "pandas", "dash", "plotly", "matplotlib", "statsmodels", "pynvml"]
+
+
+# Mocked sensor backends
+
+def install_mocks():
+    """Replace NVML with a fake single-GPU module and psutil's sensor calls with cheap fakes."""
+    import psutil
+
+    rng = random.Random(0)
+    nvml = types.ModuleType("pynvml")
+    nvml.NVML_TEMPERATURE_GPU = 0
+    nvml.nvmlInit = nvml.nvmlShutdown = lambda: None
+    nvml.nvmlDeviceGetCount = lambda: 1
+    nvml.nvmlDeviceGetHandleByIndex = lambda index: index
+    nvml.nvmlDeviceGetUtilizationRates = lambda handle: types.SimpleNamespace(gpu=rng.randint(0, 100), memory=rng.randint(0, 100))
+    nvml.nvmlDeviceGetMemoryInfo = lambda handle: types.SimpleNamespace(used=rng.randint(0, 8 << 30), total=8 << 30, free=0)
+    nvml.nvmlDeviceGetTemperature = lambda handle, sensor: rng.randint(40, 80)
+    sys.modules["pynvml"] = nvml
+
+    import procfs
+    procfs.ENABLED = False  # collectors.py goes through the mocked psutil calls below
+
+    psutil.cpu_percent = lambda interval=None, percpu=False: rng.uniform(0, 100)
+    psutil.virtual_memory = lambda: types.SimpleNamespace(percent=rng.uniform(20, 80))
+    psutil.sensors_temperatures = lambda fahrenheit=False: {"coretemp": [types.SimpleNamespace(current=rng.uniform(40, 90))]}
+    psutil.getloadavg = lambda: (rng.uniform(0, 8), rng.uniform(0, 8), rng.uniform(0, 8))
+
+    # Cumulative counters (8 cores, one disk total, one NIC total) that grow by a random amount per call
+    cpu_times = collections.namedtuple("scputimes", "user system idle iowait")
+    cores = [[0.0] * 4 for _ in range(8)]
+
+    def fake_cpu_times(percpu=False):
+        for core in cores:
+            busy = rng.uniform(0, 1)
+            core[0] += busy * 0.8
+            core[1] += busy * 0.2
+            core[2] += 1 - busy
+        return [cpu_times(*core) for core in cores] if percpu else cpu_times(*map(sum, zip(*cores)))
+
+    def counters(**fields):
+        totals = dict.fromkeys(fields, 0)
+
+        def read(*args, **kwargs):
+            for name, step in fields.items():
+                totals[name] += rng.randint(0, step)
+            return types.SimpleNamespace(**totals)
+        return read
+
+    psutil.cpu_times = fake_cpu_times
+    psutil.swap_memory = counters(sin=1 << 16, sout=1 << 16, percent=0)
+    psutil.disk_io_counters = counters(read_bytes=1 << 20, write_bytes=1 << 20, read_count=100, write_count=100)
+    psutil.net_io_counters = counters(bytes_sent=1 << 20, bytes_recv=1 << 20, packets_sent=1000, packets_recv=1000)
+
+
+def procfs_fixture(root, cores=128, chips=64):
+    """Build a /proc and /sys stand-in for a dense node: ``cores`` CPUs and ``chips`` hwmon chips (coretemp last)."""
+    os.makedirs(os.path.join(root, "proc"), exist_ok=True)
+    with open(os.path.join(root, "proc", "stat"), "w") as f:
+        f.write("cpu  %d 0 %d %d 0 0 0 0 0 0\n" % (cores * 1000, cores * 200, cores * 5000))
+        f.writelines(f"cpu{i} 1000 0 200 5000 30 0 12 0 0 0\n" for i in range(cores))
+        f.write("intr 123456 0 0 0\nctxt 987654\nbtime 1700000000\nprocesses 4242\n")
+    with open(os.path.join(root, "proc", "meminfo"), "w") as f:
+        f.write("MemTotal:       263842344 kB\nMemFree:        12345678 kB\nMemAvailable:   198765432 kB\n")
+    for chip in range(chips):
+        directory = os.path.join(root, "sys", "class", "hwmon", f"hwmon{chip}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "name"), "w") as f:
+            f.write("coretemp\n" if chip == chips - 1 else "nvme\n")
+        for sensor in range(1, 9):
+            with open(os.path.join(directory, f"temp{sensor}_input"), "w") as f:
+                f.write(f"{40000 + sensor * 1000}\n")
+    return root
+
+
+def synthetic_csv(path, rows):
+    """Write a system_monitor.csv-style file with ``rows`` rows at a 2 s period."""
+    rng = random.Random(rows)
+    start = datetime.datetime(2025, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(CSV_HEADER)
+        chunk = []
+        for i in range(rows):
+            stamp = start + datetime.timedelta(seconds=2 * i)
+            chunk.append(f"{stamp},{rng.uniform(0, 100):.1f},{rng.uniform(40, 90):.1f},{rng.randint(0, 100)},N/A\n")
+            if len(chunk) == 10_000:
+                f.writelines(chunk)
+                chunk = []
+        f.writelines(chunk)
+
+
+def dataset(data_dir, rows):
+    path = os.path.join(data_dir, f"system_monitor_{rows}.csv")
+    if not os.path.exists(path):
+        synthetic_csv(path + ".tmp", rows)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+# Timing helpers
+
+def measure(func, repeat, warmup=2):
+    """Call ``func`` ``repeat`` times and return latency statistics in milliseconds."""
+    for _ in range(warmup):
+        func()
+    times = []
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    wall = time.perf_counter() - wall_start
+    return summarize(times, wall, time.process_time() - cpu_start)
+
+
+def summarize(times, wall, cpu):
+    times = sorted(times)
+    return {
+        "n": len(times),
+        "p50_ms": times[len(times) // 2],
+        "p99_ms": times[min(len(times) - 1, int(len(times) * 0.99))],
+        "mean_ms": sum(times) / len(times),
+        "ops_per_s": len(times) / wall if wall else None,
+        "cpu_ms_per_op": cpu * 1000 / len(times),
+    }
+
+
+# Benchmarks (each returns a dict of named results)
+
+def bench_dashboard(args):
+    """dd.py: background sample cost, full and incremental update_dashboard, history redraw."""
+    import dd
+
+    dd.RING_NAME = f"bench_dd_{os.getpid()}"  # Don't replace the ring of a dashboard that is running
+    results = {"dd.collect_sample": measure(dd.collect_sample, args.repeat * 10)}
+    for _ in range(dd.MAX_POINTS):
+        dd.history.append(dd.collect_sample())
+    results["dd.update_dashboard.full"] = measure(lambda: dd.update_dashboard(0, {"seq": 0}), args.repeat)
+    results["dd.update_dashboard.incremental"] = measure(
+        lambda: dd.update_dashboard(0, {"seq": dd.history.count - 1}), args.repeat)
+    results["dd.update_history"] = measure(lambda: dd.update_history(3600, 0), args.repeat)
+    return results
+
+
+def bench_csv_read(args):
+    """ddd.py-style reads: full pandas re-parse vs. incremental CsvTail, per CSV size."""
+    import pandas as pd
+    from csv_tail import CsvTail
+
+    results = {}
+    for rows in args.sizes:
+        path = dataset(args.data_dir, rows)
+        repeat = max(3, min(args.repeat, 2_000_000 // rows))
+
+        def full_read():
+            df = pd.read_csv(path, encoding="utf-8-sig")
+            df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+            return df.tail(50)
+        results[f"csv.full_read.{rows}"] = measure(full_read, repeat, warmup=1)
+
+        results[f"csv.tail_first_poll.{rows}"] = measure(lambda: CsvTail(path, window=50).poll(), args.repeat)
+
+        # Steady state: one new row appended per frame
+        copy = os.path.join(args.data_dir, "tail_append.csv")
+        with open(path, "rb") as src, open(copy, "wb") as dst:
+            dst.write(src.read())
+        tail = CsvTail(copy, window=50)
+        tail.poll()
+        appender = open(copy, "a")
+
+        def append_and_poll():
+            appender.write("2030-01-01 00:00:00,50.0,60.0,10,N/A\n")
+            appender.flush()
+            tail.poll()
+            tail.frame()
+        results[f"csv.tail_incremental.{rows}"] = measure(append_and_poll, args.repeat)
+        appender.close()
+        tail.close()
+        os.remove(copy)
+
+    # dd.py -> viewer through the shared-memory ring instead: one new sample per frame
+    from shm_ring import SharedRing
+    fields = ["Timestamp", "CPU Usage (%)", "CPU Temperature (°C)", "GPU Usage (%)", "GPU Temperature (°C)"]
+    ring = SharedRing.create(f"bench_ring_{os.getpid()}", fields)
+    reader = SharedRing.attach(ring.name)
+    state = {"seq": 0}
+
+    def append_and_read():
+        ring.append({"Timestamp": time.time(), "CPU Usage (%)": 50.0, "CPU Temperature (°C)": 60.0, "GPU Usage (%)": 10})
+        state["seq"], data = reader.since(state["seq"])
+    results["ring.incremental"] = measure(append_and_read, args.repeat)
+    results["ring.window_3599"] = measure(lambda: reader.window(), args.repeat)
+    reader.close()
+    ring.close()
+    return results
+
+
+def bench_forecast(args):
+    """another.py's forecast: cold ARIMA fit vs. warm start and appending one observation."""
+    from forecaster import fit_arima, predict_future_cpu
+    import warnings
+
+    warnings.simplefilter("ignore")
+    rng = random.Random(1)
+    data = [50 + 10 * rng.random() for _ in range(50)]
+    repeat = max(5, args.repeat // 10)
+    results = {"forecast.cold_fit": measure(lambda: predict_future_cpu(data), repeat, warmup=1)}
+    previous = fit_arima(data)
+    results["forecast.warm_fit"] = measure(lambda: fit_arima(data, start_params=previous.params), repeat, warmup=1)
+    results["forecast.append"] = measure(lambda: previous.append([55.0]).forecast(5), repeat, warmup=1)
+    return results
+
+
+def bench_collectors(args):
+    """CPU burned by one sample of each collector's sensor functions, writing its row, and ingesting agent batches."""
+    from metrics import get_cpu_info, get_gpu_info, get_cpu_temperature
+    from collectors import CollectorSet
+    from metric_writer import MetricWriter
+    from agent import encode_batch, fake_collector
+    from collector import Collector
+
+    sensors = CollectorSet()  # Every plugin: per-core CPU, memory, swap, load, disk, net, temperature, all GPUs
+    results = {
+        "metrics.get_cpu_info": measure(get_cpu_info, args.repeat * 10),
+        "metrics.get_gpu_info": measure(get_gpu_info, args.repeat * 10),
+        "metrics.get_cpu_temperature": measure(get_cpu_temperature, args.repeat * 10),
+        "collectors.all_plugins": measure(sensors.collect, args.repeat * 10),
+    }
+    writer = MetricWriter(os.path.join(args.data_dir, "writer.csv"), ["a", "b", "c"], batch_size=50)
+    results["metric_writer.write"] = measure(lambda: writer.write([time.time(), 1.0, 2.0]), args.repeat * 10)
+    writer.close()
+    os.remove(os.path.join(args.data_dir, "writer.csv"))
+
+    # collector.py: one 10-sample batch from each of 100 agents per call
+    collect = fake_collector()
+    collector = Collector()
+    seqs = [0]
+
+    def ingest_round():
+        seq = seqs[0]
+        for host in range(100):
+            collector.ingest(encode_batch(f"host-{host}", 1.0, seq, [[time.time(), collect()] for _ in range(10)]))
+        seqs[0] += 1
+    results["collector.ingest_100_batches"] = measure(ingest_round, args.repeat)
+
+    # procfs.py's held-open files on a fixture standing in for a dense node (128 cores, 64 hwmon chips)
+    import procfs
+    fast = procfs.ProcFS(procfs_fixture(os.path.join(args.data_dir, "fs")))
+    results["procfs.discover_64_chips"] = measure(lambda: procfs.find_cpu_temperature(os.path.join(args.data_dir, "fs", "sys")), args.repeat)
+    results["procfs.cpu_times_128_cores"] = measure(fast.cpu_times, args.repeat * 10)
+    results["procfs.memory_percent"] = measure(fast.memory_percent, args.repeat * 10)
+    results["procfs.cpu_temperature"] = measure(fast.cpu_temperature, args.repeat * 10)
+    fast.close()
+    return results
+
+
+def bench_viewers(args):
+    """ddd.py-style frames on the Agg backend: clear-and-replot vs. the blitting renderer (one new sample per frame)."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from live_plot import BlitRenderer, LivePanel
+    from rollup import MetricHistory
+
+    columns = ["CPU Usage (%)", "GPU Usage (%)"]
+    history = MetricHistory(columns)
+    rng = random.Random(2)
+    now = [time.time() - 3600]
+
+    def add_sample():
+        now[0] += 1
+        history.add_row({"Timestamp": datetime.datetime.fromtimestamp(now[0]), "CPU Usage (%)": rng.uniform(0, 100),
+                         "GPU Usage (%)": rng.uniform(0, 100)})
+    for _ in range(3600):
+        add_sample()
+
+    fig, axes = plt.subplots(1, 2, figsize=(12, 5))
+
+    def replot():
+        add_sample()
+        for ax, column in zip(axes, columns):
+            times, values = history.query(column, 3600, max_points=int(ax.get_window_extent().width))
+            ax.clear()
+            ax.plot([datetime.datetime.fromtimestamp(t) for t in times], values, label=column)
+            ax.set_title(column)
+            ax.legend()
+            ax.tick_params(axis="x", rotation=45)
+        fig.canvas.draw()
+    results = {"viewer.replot_frame": measure(replot, max(10, args.repeat // 10), warmup=2)}
+    plt.close(fig)
+
+    fig, axes = plt.subplots(1, 2, figsize=(12, 5))
+    renderer = BlitRenderer(fig, [LivePanel(ax, column, column, [(column, column, "blue")], 3600)
+                                  for ax, column in zip(axes, columns)])
+
+    def blit():
+        add_sample()
+        renderer.frame(history)
+    results["viewer.blit_frame"] = measure(blit, args.repeat, warmup=2)
+    results["viewer.blit_frame"]["full_draws"] = renderer.full_draws
+    plt.close(fig)
+    return results
+
+
+def bench_imports(args):
+    """Cold import time of each entry point, the heavy modules it pulled in, and the budget check."""
+    code = ("import sys, time; sys.path.insert(0, {repo!r}); start = time.perf_counter(); import {modules}; "
+            "elapsed = time.perf_counter() - start; print(elapsed * 1000, ','.join(m for m in {heavy!r} if m in sys.modules))")
+    repeat = max(3, min(10, args.repeat // 20))
+    results = {}
+    for name, modules in IMPORT_TARGETS.items():
+        times, heavy = [], ""
+        for _ in range(repeat):
+            process = subprocess.run([sys.executable, "-c", code.format(repo=REPO_DIR, modules=modules, heavy=HEAVY_MODULES)],
+                                     capture_output=True, text=True)
+            if process.returncode != 0:
+                break
+            elapsed, _, heavy = process.stdout.strip().splitlines()[-1].partition(" ")
+            times.append(float(elapsed))
+        if not times:
+            print(f"import {name}: failed ({process.stderr.strip().splitlines()[-1]})")
+            continue
+        result = summarize(times, sum(times) / 1000, 0.0)
+        result["heavy_modules"] = heavy.split(",") if heavy else []
+        if name in IMPORT_BUDGET_MS:
+            result["budget_ms"] = IMPORT_BUDGET_MS[name]
+            result["over_budget"] = result["p50_ms"] > IMPORT_BUDGET_MS[name]
+        results[f"import.{name}"] = result
+    return results
+
+
+BENCHMARKS = {
+    "dashboard": bench_dashboard,
+    "csv_read": bench_csv_read,
+    "forecast": bench_forecast,
+    "collectors": bench_collectors,
+    "viewers": bench_viewers,
+    "imports": bench_imports,
+}
+
+
+def _run_one(name, args, queue):
+    """Child process: run one benchmark in a scratch directory and report results and peak RSS."""
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(tempfile.mkdtemp(prefix=f"bench-{name}-"))
+    if not args.real_sensors:
+        install_mocks()
+    try:
+        results = BENCHMARKS[name](args)
+    except ImportError as e:
+        queue.put({"skipped": f"missing dependency: {e}"})
+        return
+    except Exception:
+        queue.put({"error": traceback.format_exc()})
+        return
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    for result in results.values():
+        result["peak_rss_mb"] = round(peak_rss_mb, 1)
+    queue.put(results)
+
+
+def _outcome(process, queue):
+    """Wait for the child's results; an ``{"error": ...}`` outcome if it dies without reporting."""
+    while True:
+        try:
+            return queue.get(timeout=1.0)
+        except Empty:
+            if not process.is_alive():
+                break
+    try:
+        return queue.get(timeout=1.0)  # Results put just before it exited
+    except Empty:
+        return {"error": f"benchmark process exited with code {process.exitcode} without results"}
+
+
+def run(names, args):
+    """Run each benchmark in its own process; returns ``(results, names of failed benchmarks)``."""
+    ctx = mp.get_context("spawn")
+    results, failed = {}, []
+    for name in names:
+        queue = ctx.Queue()
+        process = ctx.Process(target=_run_one, args=(name, args, queue))
+        process.start()
+        outcome = _outcome(process, queue)
+        process.join()
+        if "skipped" in outcome:
+            print(f"{name}: skipped ({outcome['skipped']})")
+            continue
+        if "error" in outcome:
+            print(f"{name}: FAILED\n{outcome['error'].rstrip()}")
+            failed.append(name)
+            continue
+        results.update(outcome)
+        for key, result in outcome.items():
+            print(f"{key:40s} p50 {result['p50_ms']:10.3f} ms  p99 {result['p99_ms']:10.3f} ms  "
+                  f"{result['ops_per_s'] or 0:12.1f} ops/s  peak RSS {result['peak_rss_mb']:8.1f} MB")
+            if "budget_ms" in result:
+                status = "OVER BUDGET" if result["over_budget"] else "within budget"
+                print(f"{'':40s} {status} ({result['budget_ms']} ms); heavy modules: {', '.join(result['heavy_modules']) or 'none'}")
+    return results, failed
+
+
+def compare(old_file, new_results, tolerance):
+    """Print p50 changes against a previous run; returns the keys that regressed beyond ``tolerance``."""
+    with open(old_file) as f:
+        old = json.load(f)["results"]
+    regressions = []
+    for key, result in new_results.items():
+        if key not in old:
+            continue
+        before, after = old[key]["p50_ms"], result["p50_ms"]
+        change = (after - before) / before if before else 0.0
+        flag = "REGRESSION" if change > tolerance else ""
+        print(f"{key:40s} {before:10.3f} -> {after:10.3f} ms ({change:+.0%}) {flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the monitor's hot paths.")
+    parser.add_argument("benchmarks", nargs="*", default=list(BENCHMARKS), help=f"any of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=DEFAULT_SIZES,
+                        help="CSV sizes in rows, comma separated (e.g. 10000,1000000,10000000)")
+    parser.add_argument("--repeat", type=int, default=200, help="timed calls per case")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "capstone-bench"),
+                        help="where synthetic CSVs are generated and cached")
+    parser.add_argument("--real-sensors", action="store_true", help="use the real psutil/NVML instead of mocks")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--compare", default=None, help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="p50 slowdown treated as a regression")
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    results, failed = run(args.benchmarks, args)
+    report = {
+        "commit": git_commit(),
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "mocked_sensors": not args.real_sensors,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(results)} results to {args.output}")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+
+    regressed = args.compare and compare(args.compare, results, args.tolerance)
+    if failed or regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
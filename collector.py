@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import collections
+import datetime
+import time
+
+from agent import HEADER, decode_batch
+from metric_writer import MetricWriter
+from instrument import SelfMonitor, timed
+
+# Largest TCP frame accepted; a bigger length prefix closes the connection (agents send a few kB)
+MAX_FRAME = 4 << 20
+
+
+class HostState:
+    """What the collector knows about one agent: sequence tracking and its recent samples."""
+
+    def __init__(self, history):
+        self.boot = None
+        self.last_seq = -1
+        self.lost_batches = 0
+        self.duplicate_batches = 0
+        self.last_seen = None
+        self.received = 0  # Samples received so far (the data version of this host's series)
+        self.samples = collections.deque(maxlen=history)  # (timestamp, {metric: value})
+
+
+class Collector:
+    """Ingest batches from many agents (TCP and UDP) on one asyncio loop.
+
+    Every series is tagged by host. Sequence numbers detect lost and duplicated
+    batches per agent; a new ``boot`` value means the agent restarted. Samples can be
+    forwarded to ``on_samples(host, samples)`` and/or written to a long-format CSV.
+    With a ``detector`` (anomaly.AnomalyDetector), all samples received in each
+    ``detect_every`` interval are scored in one vectorized pass. With a ``forecaster``
+    (batch_forecast.BatchForecaster), every host's series are submitted each
+    ``forecast_every`` seconds and forecasts() returns the latest results.
+    """
+
+    def __init__(self, history=600, csv_file=None, on_samples=None, detector=None, forecaster=None):
+        self.history = history
+        self.hosts = {}
+        self.on_samples = on_samples
+        self.batches = 0
+        self.samples = 0
+        self.bad_batches = 0
+        self.writer = None
+        self.self_monitor = None
+        self.detector = detector
+        self.forecaster = forecaster
+        self._pending = []  # (host, timestamp, sample) waiting for anomaly detection
+        if csv_file:
+            self.writer = MetricWriter(csv_file, ["Timestamp", "Host", "Metric", "Value"],
+                                       batch_size=5000, flush_interval=5.0)
+
+    @timed("collector ingest")
+    def ingest(self, payload):
+        """Decode and store one batch. Returns False for undecodable, malformed or duplicate batches."""
+        try:
+            batch = decode_batch(payload)
+            host, boot, seq, samples = batch["host"], batch["boot"], batch["seq"], batch["samples"]
+            # Check the whole batch before any state changes: [[timestamp, {metric: value}], ...]
+            if not isinstance(host, str) or not isinstance(seq, int) or not isinstance(samples, list):
+                raise ValueError("bad batch header")
+            samples = [(float(timestamp), sample) for timestamp, sample in samples]
+            if not all(isinstance(sample, dict) for timestamp, sample in samples):
+                raise ValueError("bad sample")
+        except Exception:
+            self.bad_batches += 1
+            return False
+
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.history)
+        if boot != state.boot:  # New or restarted agent: restart sequence tracking
+            state.boot, state.last_seq = boot, seq - 1
+        if seq <= state.last_seq:
+            state.duplicate_batches += 1
+            return False
+        state.lost_batches += seq - state.last_seq - 1
+        state.last_seq = seq
+        state.last_seen = time.time()
+
+        state.samples.extend((timestamp, sample) for timestamp, sample in samples)
+        state.received += len(samples)
+        self.batches += 1
+        self.samples += len(samples)
+        if self.writer is not None:
+            for timestamp, sample in samples:
+                stamp = datetime.datetime.fromtimestamp(timestamp)
+                for metric, value in sample.items():
+                    self.writer.write([stamp, host, metric, "N/A" if value is None else value])
+        if self.detector is not None:
+            self._pending.extend((host, timestamp, sample) for timestamp, sample in samples)
+        if self.on_samples is not None:
+            self.on_samples(host, samples)
+        return True
+
+    def detect(self):
+        """Score the samples received since the last call; returns the anomalies."""
+        records, self._pending = self._pending, []
+        return self.detector.observe_many(records) if records else []
+
+    async def _detect_loop(self, detect_every):
+        while True:
+            await asyncio.sleep(detect_every)
+            for anomaly in self.detect():
+                print(f"Anomaly on {anomaly['host']}: {anomaly['metric']} = {anomaly['value']:.1f} "
+                      f"(expected {anomaly['expected']:.1f}, score {anomaly['score']:.1f})")
+
+    async def _forecast_loop(self, forecast_every):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(forecast_every)
+            # Copy the windows on the loop (ingest appends to them); build and submit off it
+            snapshots = {host: (state.received, list(state.samples)) for host, state in self.hosts.items()}
+            series = lambda: host_series(snapshots, self.forecaster.max_points)
+            await loop.run_in_executor(None, lambda: self.forecaster.submit(series()))
+
+    def forecasts(self):
+        """``{(host, metric): forecast with staleness metadata}`` (see BatchForecaster.result); never waits on a fit."""
+        return self.forecaster.results() if self.forecaster is not None else {}
+
+    async def handle_tcp(self, reader, writer):
+        try:
+            while True:
+                (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+                if length > MAX_FRAME:
+                    self.bad_batches += 1
+                    break  # Not an agent (or a corrupt stream): don't allocate, drop the connection
+                self.ingest(await reader.readexactly(length))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="0.0.0.0", tcp_port=9100, udp_port=9100, report_every=5.0, detect_every=1.0,
+                    forecast_every=60.0):
+        loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self.handle_tcp, host, tcp_port)
+        udp, _ = await loop.create_datagram_endpoint(lambda: _UdpProtocol(self), local_addr=(host, udp_port))
+        print(f"Collector listening on {host} (TCP {tcp_port}, UDP {udp_port})")
+        self.self_monitor = SelfMonitor("collector")
+        detect_task = asyncio.create_task(self._detect_loop(detect_every)) if self.detector is not None else None
+        forecast_task = asyncio.create_task(self._forecast_loop(forecast_every)) if self.forecaster is not None else None
+        try:
+            async with server:
+                while True:
+                    await asyncio.sleep(report_every)
+                    self.report(report_every)
+        finally:
+            if detect_task is not None:
+                detect_task.cancel()
+            if forecast_task is not None:
+                forecast_task.cancel()
+                self.forecaster.close()
+            udp.close()
+            if self.writer is not None:
+                self.writer.close()
+
+    def report(self, period):
+        lost = sum(state.lost_batches for state in self.hosts.values())
+        overhead = self.self_monitor.read() if self.self_monitor is not None else {}
+        print(f"hosts: {len(self.hosts)} | batches: {self.batches} | samples: {self.samples} "
+              f"({self.samples / period:.0f}/s) | lost batches: {lost} | bad: {self.bad_batches} "
+              f"| CPU: {overhead.get('Monitor CPU (%)', 0):.1f}% | RSS: {overhead.get('Monitor RSS (MB)', 0):.0f} MB")
+        if self.forecaster is not None:
+            results = [result for result in self.forecasts().values() if result is not None]
+            arima = sum(result["model"] == "arima" for result in results)
+            stale = sum(result["stale"] for result in results)
+            print(f"forecasts: {len(results)} series | ARIMA: {arima} | Holt: {len(results) - arima} "
+                  f"| stale: {stale} | fits running: {self.forecaster.pending}")
+        self.batches = self.samples = 0
+
+
+def host_series(snapshots, length=None):
+    """``{(host, metric): (version, values, step)}`` from ``{host: (received, [(timestamp, sample), ...])}``.
+
+    Each host's readings are resampled onto its median sample interval (batch_forecast.resample),
+    with NaN where a reading is missing, so a forecast step has the same length for every metric.
+    """
+    from batch_forecast import median_interval, resample
+
+    series = {}
+    for host, (version, samples) in snapshots.items():
+        if not samples:
+            continue
+        timestamps = [timestamp for timestamp, sample in samples]
+        step = median_interval(timestamps)
+        metrics = {metric for timestamp, sample in samples for metric in sample}
+        for metric in metrics:
+            values = [sample.get(metric) for timestamp, sample in samples]
+            if all(value is None for value in values):
+                continue
+            values = [float("nan") if value is None else value for value in values]
+            metric_step, grid = resample(timestamps, values, step, length)
+            series[(host, metric)] = (version, grid, metric_step)
+    return series
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, collector):
+        self.collector = collector
+
+    def datagram_received(self, data, addr):
+        self.collector.ingest(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect metrics pushed by agent.py from many hosts.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9100, help="TCP and UDP port")
+    parser.add_argument("--csv", default=None, help="also write samples to this CSV (Timestamp, Host, Metric, Value)")
+    parser.add_argument("--anomalies", action="store_true", help="flag anomalous readings (EWMA / rolling / seasonal z-scores)")
+    parser.add_argument("--forecast", type=float, default=0, metavar="SECONDS",
+                        help="forecast every host's series this often (batch_forecast.py; 0 = off)")
+    parser.add_argument("--forecast-steps", type=int, default=30,
+                        help="steps (of each host's median sample interval) to forecast ahead")
+    args = parser.parse_args()
+    detector = forecaster = None
+    if args.anomalies:
+        from anomaly import AnomalyDetector
+        detector = AnomalyDetector()
+    if args.forecast:
+        from batch_forecast import BatchForecaster
+        forecaster = BatchForecaster(steps=args.forecast_steps)
+    try:
+        collector = Collector(csv_file=args.csv, detector=detector, forecaster=forecaster)
+        asyncio.run(collector.serve(args.host, args.port, args.port, forecast_every=args.forecast or 60.0))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
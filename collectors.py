@@ -0,0 +1,332 @@
+import atexit
+import collections
+import sys
+import time
+
+import psutil
+import procfs
+from instrument import timed
+
+# Collector plugins: each one reads its source once per tick and returns a dict of its fields.
+# A CollectorSet runs the chosen plugins in one pass and returns one Record, a namedtuple of
+# the timestamp and every plugin's fields (None where a reading is missing). Plugins register
+# under a name with @register, so a script picks what it needs: CollectorSet(["cpu", "gpu"]).
+# On Linux the CPU, memory and temperature plugins read procfs/sysfs directly (procfs.py).
+# (Not to be confused with collector.py, the server agents push their samples to.)
+REGISTRY = {}
+
+
+def register(cls):
+    REGISTRY[cls.name] = cls
+    return cls
+
+
+class Collector:
+    """Base class of a plugin.
+
+    ``setup()`` takes the first reading and returns the plugin's field names (they may
+    depend on the machine, e.g. the number of cores or GPUs); ``collect()`` returns a
+    dict of those fields for the current tick. ``fields`` are the ones every machine
+    has. Reads are timed under ``stage``.
+    """
+
+    name = None
+    stage = "sensor read"
+    fields = []
+
+    def setup(self):
+        return list(self.fields)
+
+    def collect(self):
+        return {}
+
+
+class Counters:
+    """Per-second rates of cumulative counters (bytes, packets, ...) between successive reads."""
+
+    def __init__(self, counters=None):
+        self.previous = counters
+        self.time = time.monotonic()
+
+    def rates(self, counters):
+        """``{name: rate}`` since the previous read; None for a counter that went backwards (reset or wrap)."""
+        now = time.monotonic()
+        previous, elapsed = self.previous, now - self.time
+        self.previous, self.time = counters, now
+        if previous is None or elapsed <= 0:
+            return dict.fromkeys(counters)
+        return {name: (value - previous[name]) / elapsed if value >= previous[name] else None
+                for name, value in counters.items()}
+
+
+def _total_time(times):
+    total = sum(times)
+    # On Linux guest time is already counted in user/nice
+    return total - getattr(times, "guest", 0) - getattr(times, "guest_nice", 0)
+
+
+def _psutil_cpu_times():
+    """``[(busy, total), ...]`` per core from psutil, like procfs.ProcFS.cpu_times()."""
+    cores = []
+    for times in psutil.cpu_times(percpu=True):
+        total = _total_time(times)
+        cores.append((total - times.idle - getattr(times, "iowait", 0), total))
+    return cores
+
+
+def _percent(part, whole):
+    return round(min(max(100 * part / whole, 0.0), 100.0), 1) if whole > 0 else 0.0
+
+
+@register
+class CpuCollector(Collector):
+    """Total and per-core CPU usage (%) since the previous tick, from one read of the per-core times."""
+
+    name = "cpu"
+    fields = ["cpu"]
+
+    def setup(self):
+        backend = procfs.backend()
+        self.read = _psutil_cpu_times if backend is None else backend.cpu_times
+        self.previous = self.read()
+        return self.fields + [f"cpu{i}" for i in range(len(self.previous))]
+
+    def collect(self):
+        current = self.read()
+        values, busy, total = {}, 0, 0
+        for i, ((busy_before, total_before), (busy_after, total_after)) in enumerate(zip(self.previous, current)):
+            core_busy = busy_after - busy_before
+            core_total = total_after - total_before
+            values[f"cpu{i}"] = _percent(core_busy, core_total)
+            busy += core_busy
+            total += core_total
+        values["cpu"] = _percent(busy, total)
+        self.previous = current
+        return values
+
+
+@register
+class MemoryCollector(Collector):
+    """System memory usage (%)."""
+
+    name = "memory"
+    fields = ["memory"]
+
+    def setup(self):
+        self.backend = procfs.backend()
+        return list(self.fields)
+
+    def collect(self):
+        percent = None if self.backend is None else self.backend.memory_percent()
+        return {"memory": psutil.virtual_memory().percent if percent is None else percent}
+
+
+@register
+class SwapCollector(Collector):
+    """Swap usage (%) and swap-in/out traffic (bytes/s)."""
+
+    name = "swap"
+    fields = ["swap", "swap_in_bps", "swap_out_bps"]
+
+    def setup(self):
+        swap = psutil.swap_memory()
+        self.counters = Counters({"swap_in_bps": swap.sin, "swap_out_bps": swap.sout})
+        return list(self.fields)
+
+    def collect(self):
+        swap = psutil.swap_memory()
+        values = self.counters.rates({"swap_in_bps": swap.sin, "swap_out_bps": swap.sout})
+        values["swap"] = swap.percent
+        return values
+
+
+@register
+class LoadCollector(Collector):
+    """1, 5 and 15 minute load averages (emulated by psutil on Windows)."""
+
+    name = "load"
+    fields = ["load1", "load5", "load15"]
+
+    def collect(self):
+        return dict(zip(["load1", "load5", "load15"], psutil.getloadavg()))
+
+
+class _RateCollector(Collector):
+    """Rates of the system-wide counters returned by the subclass's ``read()`` (psutil.disk_io_counters / net_io_counters)."""
+
+    counters = {}  # Field name -> psutil counter name
+
+    def _sample(self):
+        raw = self.read()
+        return None if raw is None else {field: getattr(raw, counter) for field, counter in self.counters.items()}
+
+    def setup(self):
+        self.rates = Counters(self._sample())
+        return list(self.fields)
+
+    def collect(self):
+        sample = self._sample()
+        if sample is None:
+            return {}  # No disks / interfaces
+        return self.rates.rates(sample)
+
+
+@register
+class DiskCollector(_RateCollector):
+    """Disk throughput (bytes/s) and operations per second, summed over all disks."""
+
+    name = "disk"
+    fields = ["disk_read_bps", "disk_write_bps", "disk_read_iops", "disk_write_iops"]
+    counters = {"disk_read_bps": "read_bytes", "disk_write_bps": "write_bytes",
+                "disk_read_iops": "read_count", "disk_write_iops": "write_count"}
+
+    def read(self):
+        return psutil.disk_io_counters()
+
+
+@register
+class NetCollector(_RateCollector):
+    """Network throughput (bytes/s) and packets per second, summed over all interfaces."""
+
+    name = "net"
+    fields = ["net_sent_bps", "net_recv_bps", "net_sent_pps", "net_recv_pps"]
+    counters = {"net_sent_bps": "bytes_sent", "net_recv_bps": "bytes_recv",
+                "net_sent_pps": "packets_sent", "net_recv_pps": "packets_recv"}
+
+    def read(self):
+        return psutil.net_io_counters()
+
+
+@register
+class TemperatureCollector(Collector):
+    """CPU temperature in °C (Intel coretemp, AMD k10temp or Raspberry Pi sensor), None if there is no known sensor.
+
+    With the procfs backend the sensor file is found once at setup; otherwise psutil walks
+    every sensor on each read.
+    """
+
+    name = "temperature"
+    fields = ["cpu_temp"]
+
+    def setup(self):
+        self.backend = procfs.backend()
+        return list(self.fields)
+
+    def collect(self):
+        if self.backend is not None:
+            return {"cpu_temp": self.backend.cpu_temperature()}
+        temps = psutil.sensors_temperatures()
+        for sensor in ("coretemp", "k10temp", "cpu-thermal"):
+            if temps.get(sensor):
+                return {"cpu_temp": temps[sensor][0].current}
+        return {}
+
+
+# NVML is imported and initialised on first use (not at import, so CLI collectors start with
+# only psutil loaded), device handles are looked up once, and NVML is shut down at exit.
+nvml_error = None
+_nvml = None
+_nvml_handles = None
+
+
+def nvml_devices():
+    """Return ``(pynvml, [device handles])``, initialising NVML once; ``(None, [])`` if no GPU can be used."""
+    global _nvml, _nvml_handles, nvml_error
+    if _nvml_handles is None:
+        _nvml_handles = []
+        try:
+            import pynvml
+            pynvml.nvmlInit()
+            atexit.register(pynvml.nvmlShutdown)
+            _nvml_handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
+            _nvml = pynvml
+        except Exception as e:
+            nvml_error = str(e) or type(e).__name__
+    return (_nvml, _nvml_handles) if _nvml_handles else (None, [])
+
+
+@register
+class GpuCollector(Collector):
+    """Usage (%), memory used (%) and temperature (°C) of every GPU, plus machine-wide figures.
+
+    ``gpu`` is the mean usage over all GPUs, ``gpu_memory`` the share of all GPU memory in
+    use and ``gpu_temp`` the hottest GPU; per device they are ``gpu<i>_usage`` and so on.
+    A device whose read fails reports None for that tick.
+    """
+
+    name = "gpu"
+    stage = "nvml call"
+    fields = ["gpu", "gpu_memory", "gpu_temp"]
+
+    def setup(self):
+        self.nvml, self.handles = nvml_devices()
+        fields = list(self.fields)
+        for i in range(len(self.handles)):
+            fields += [f"gpu{i}_usage", f"gpu{i}_memory", f"gpu{i}_temp"]
+        return fields
+
+    def collect(self):
+        nvml = self.nvml
+        values, usages, temps, used, total = {}, [], [], 0, 0
+        for i, handle in enumerate(self.handles):
+            try:
+                usage = nvml.nvmlDeviceGetUtilizationRates(handle).gpu
+                memory = nvml.nvmlDeviceGetMemoryInfo(handle)
+                temp = nvml.nvmlDeviceGetTemperature(handle, nvml.NVML_TEMPERATURE_GPU)
+            except Exception:
+                continue
+            values[f"gpu{i}_usage"], values[f"gpu{i}_memory"], values[f"gpu{i}_temp"] = (
+                usage, memory.used / memory.total * 100, temp)
+            usages.append(usage)
+            temps.append(temp)
+            used += memory.used
+            total += memory.total
+        if usages:
+            values["gpu"] = sum(usages) / len(usages)
+            values["gpu_memory"] = used / total * 100
+            values["gpu_temp"] = max(temps)
+        return values
+
+
+class CollectorSet:
+    """Run the chosen plugins (default: every registered one) in one pass per tick.
+
+    ``collect()`` returns a ``Record`` namedtuple: ``timestamp`` followed by the fields of
+    each plugin in order. Rates and CPU usage cover the time since the previous collect()
+    (or since the set was created). A plugin whose read fails leaves its fields None;
+    its latest error is kept in ``errors`` (by plugin name) and the first one is printed.
+    A plugin whose setup fails is dropped; its common ``fields`` stay in the Record as None,
+    so callers reading e.g. ``record.cpu`` keep working.
+    """
+
+    def __init__(self, names=None):
+        self.plugins = []
+        self.errors = {}
+        fields = ["timestamp"]
+        for name in (REGISTRY if names is None else names):
+            plugin = REGISTRY[name]()
+            try:
+                plugin_fields = plugin.setup()
+            except Exception as e:
+                self._failed(plugin, e)
+                fields += plugin.fields
+                continue
+            self.plugins.append(plugin)
+            fields += plugin_fields
+        self.Record = collections.namedtuple("Record", fields)
+        self.fields = self.Record._fields
+
+    def collect(self, timestamp=None):
+        values = {"timestamp": time.time() if timestamp is None else timestamp}
+        for plugin in self.plugins:
+            with timed(plugin.stage):
+                try:
+                    values.update(plugin.collect())
+                except Exception as e:
+                    self._failed(plugin, e)
+        return self.Record(*[values.get(field) for field in self.fields])
+
+    def _failed(self, plugin, error):
+        if plugin.name not in self.errors:
+            print(f"Collector {plugin.name!r} failed, its fields will be empty: {error!r}", file=sys.stderr)
+        self.errors[plugin.name] = str(error) or type(error).__name__
@@ -1,48 +1,42 @@
-import psutil
-import time
-import os
+import socket
+from scheduler import AdaptiveRate, Scheduler
+from metrics import get_cpu_info, get_gpu_info, gpu_status
+from alerts import AlertEngine, Rule, StdoutSink
+import instrument
+from instrument import SelfMonitor, timed
 
-try:
-    from pynvml import (
-        nvmlInit, nvmlDeviceGetHandleByIndex, nvmlDeviceGetUtilizationRates,
-        nvmlDeviceGetMemoryInfo, nvmlDeviceGetCount
-    )
-    nvmlInit()
-    gpu_count = nvmlDeviceGetCount()
-    gpu_available = gpu_count > 0
-except Exception as e:
-    gpu_available = False
-    gpu_error_msg = str(e)
-
-def get_cpu_info():
-    """Fetch CPU usage and memory usage."""
-    cpu_usage = psutil.cpu_percent(interval=1)
-    memory_info = psutil.virtual_memory()
-    cpu_memory_usage = memory_info.percent  # Total system memory usage
-    return cpu_usage, cpu_memory_usage
-
-def get_gpu_info():
-    """Fetch GPU usage and memory usage if GPU is available."""
-    if not gpu_available:
-        return "No GPU detected", "N/A"
-
-    nvml_handle = nvmlDeviceGetHandleByIndex(0)
-    gpu_usage = nvmlDeviceGetUtilizationRates(nvml_handle).gpu
-    gpu_mem = nvmlDeviceGetMemoryInfo(nvml_handle)
-
-    return gpu_usage, gpu_mem.used / gpu_mem.total * 100
-
-while True:
+# Alert rules, evaluated together each tick. Threshold alerts resolve only once usage
+# drops 5% below the threshold (no flapping) and repeat at most once a minute.
+alert_engine = AlertEngine([
+    Rule("High CPU Usage", "cpu", 80, clear=75, message="⚠️ ALERT: High CPU Usage! ({value}%) ⚠️"),
+    Rule("Sustained CPU Usage", "cpu", 90, duration=30, clear=85, message="⚠️ ALERT: CPU above 90% for 30s! ({value}%) ⚠️"),
+    Rule("High CPU Memory Usage", "memory", 80, clear=75, message="⚠️ ALERT: High CPU Memory Usage! ({value}%) ⚠️"),
+    Rule("CPU Memory Growth", "memory", rate=5, duration=60, message="⚠️ ALERT: CPU Memory growing {value:.1f}%/min! ⚠️"),
+], [StdoutSink()])
+host = socket.gethostname()
+
+# This script's own CPU/RSS and stage timings go to monitor_self.csv
+self_monitor = SelfMonitor("cpugpu")
+
+# Latest GPU reading, refreshed by its own (slower) job
+latest_gpu = {"usage": "N/A", "memory": "N/A"}
+
+def read_gpu(tick_time):
+    latest_gpu["usage"], latest_gpu["memory"] = get_gpu_info()
+
+def report(tick_time):
     cpu_usage, cpu_memory_usage = get_cpu_info()
+    if adaptive_rate is not None:
+        adaptive_rate.observe({"cpu": cpu_usage, "memory": cpu_memory_usage})
 
-    if cpu_usage > 80:
-        print(f"⚠️ ALERT: High CPU Usage! ({cpu_usage}%) ⚠️")
-    
-    if cpu_memory_usage > 80:
-        print(f"⚠️ ALERT: High CPU Memory Usage! ({cpu_memory_usage}%) ⚠️")
+    with timed("alert evaluate"):
+        alert_engine.observe(host, {"cpu": cpu_usage, "memory": cpu_memory_usage}, tick_time)
+        alert_engine.evaluate(tick_time)
+    overhead = self_monitor.read()
 
+    gpu_available, gpu_error_msg = gpu_status()
     if gpu_available:
-        gpu_usage, gpu_mem_usage = get_gpu_info()
+        gpu_usage, gpu_mem_usage = latest_gpu["usage"], latest_gpu["memory"]
         print(f"CPU Usage: {cpu_usage}%")
         print(f"CPU Memory Usage: {cpu_memory_usage}%")
         print(f"GPU Usage: {gpu_usage}%, GPU Memory Usage: {gpu_mem_usage:.2f}%")
@@ -51,5 +45,25 @@ while True:
         print(f"CPU Memory Usage: {cpu_memory_usage}%")
         print(f"GPU Not Found: {gpu_error_msg}")
 
+    print(f"Monitor: {overhead['Monitor CPU (%)']:.1f}% CPU, {overhead['Monitor RSS (MB)']:.0f} MB RSS"
+          f" | Next report in {report_job.period if adaptive_rate is None else adaptive_rate.interval:g}s")
     print("-" * 40)
-    time.sleep(2)
+
+# One loop, fixed-rate deadlines: CPU/memory report every 2 seconds, GPU read every 5 seconds
+# (the first GPU read initialises NVML; without a GPU it just returns "N/A"). With MONITOR_ADAPTIVE=1
+# reports come every second while usage moves or nears the 80% alert thresholds, and back off to
+# every 10 seconds while it is steady.
+get_cpu_info()  # Take the first CPU reading so the first report covers a full period
+adaptive_rate = AdaptiveRate.from_env({"cpu": 80, "memory": 80})
+period = 2.0 if adaptive_rate is None else adaptive_rate.interval
+scheduler = Scheduler()
+scheduler.every(5.0, read_gpu)
+report_job = scheduler.every(period, report, start_after=period, rate=adaptive_rate)
+try:
+    scheduler.run()
+except KeyboardInterrupt:
+    print(f"Late ticks: {report_job.late_ticks} | Missed ticks: {report_job.missed_ticks}")
+    for stage, stats in instrument.summary().items():
+        print(f"{stage}: p50 {stats['p50_ms']:.3f} ms | p99 {stats['p99_ms']:.3f} ms | {stats['count']} calls")
+finally:
+    self_monitor.export()  # Self-metrics of the run so far (after the summary: exporting drains the timings)
@@ -0,0 +1,131 @@
+import collections
+import csv
+import os
+
+
+def detect_encoding(file, sample_size=10000):
+    """Guess the encoding from the first bytes of ``file`` (chardet if installed, else UTF-8)."""
+    try:
+        import chardet
+    except ImportError:
+        return "utf-8-sig"
+    with open(file, "rb") as f:
+        encoding = chardet.detect(f.read(sample_size))["encoding"]
+    # A UTF-8 BOM is stripped by utf-8-sig; plain ASCII is a subset of UTF-8
+    if encoding is None or encoding.lower() in ("ascii", "utf-8", "utf-8-sig"):
+        return "utf-8-sig"
+    return encoding
+
+
+class CsvTail:
+    """Follow a growing CSV file, parsing only complete lines appended since the last poll.
+
+    The newest ``window`` rows are kept in a rolling window. The encoding is detected
+    once per file, and truncation or rotation (the path now points at a different
+    file) restarts reading from the new file's header.
+    """
+
+    def __init__(self, filename, window=50, encoding=None, clean=None, from_start=False, read_size=1 << 22):
+        self.filename = filename
+        self.window = collections.deque(maxlen=window)
+        self.columns = None
+        self.encoding = encoding
+        self.clean = clean  # Optional function applied once to every header cell and value
+        self.from_start = from_start  # Parse the whole file on first open instead of just the tail
+        self.read_size = read_size  # Max bytes parsed per poll, so catching up on a big file is spread out
+        self._file = None
+        self._offset = 0
+        self._partial = b""
+        self._need_header = True
+
+    def poll(self):
+        """Read new rows from the file. Returns the list of rows (dicts) added since the last poll."""
+        if not self._check_file():
+            return []
+
+        self._file.seek(self._offset)
+        data = self._file.read(self.read_size)
+        if not data:
+            return []
+        self._offset += len(data)
+
+        # Only complete lines are parsed; a trailing partial line waits for the next poll
+        data = self._partial + data
+        end = data.rfind(b"\n") + 1
+        self._partial = data[end:]
+        if end == 0:
+            return []
+        lines = data[:end].decode(self.encoding, errors="replace").splitlines()
+
+        rows = []
+        for values in csv.reader(lines):
+            if not values:
+                continue
+            if self.clean is not None:
+                values = [self.clean(value) for value in values]
+            if self._need_header:
+                self._set_columns(values)
+                continue
+            row = dict(zip(self.columns, values))
+            rows.append(row)
+            self.window.append(row)
+        return rows
+
+    def frame(self):
+        """Return the rolling window as a pandas DataFrame of strings."""
+        import pandas as pd
+        return pd.DataFrame(list(self.window), columns=self.columns)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _check_file(self):
+        """Open the file if needed and restart after truncation or rotation. False if missing."""
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return False
+
+        if self._file is not None:
+            current = os.fstat(self._file.fileno())
+            if (current.st_ino, current.st_dev) != (stat.st_ino, stat.st_dev) or stat.st_size < self._offset:
+                self.close()
+
+        if self._file is None:
+            self._file = open(self.filename, "rb")
+            if self.encoding is None:
+                self.encoding = detect_encoding(self.filename)
+            self._need_header = True
+            self._partial = b""
+            self._offset = 0
+            if not self.from_start:
+                self._skip_to_tail(stat.st_size)
+        return True
+
+    def _set_columns(self, columns):
+        # A rotated file with the same header continues the window; a new schema starts over
+        if columns != self.columns:
+            self.window.clear()
+        self.columns = columns
+        self._need_header = False
+
+    def _skip_to_tail(self, size):
+        """Parse the header, then jump close to the end so the first poll costs O(window)."""
+        header = self._file.readline()
+        if not header.endswith(b"\n"):
+            return  # Header incomplete; read from the start on the next poll
+        values = next(csv.reader([header.decode(self.encoding, errors="replace")]), None)
+        if not values:
+            return
+        if self.clean is not None:
+            values = [self.clean(value) for value in values]
+        self._set_columns(values)
+        self._offset = len(header)
+
+        tail_start = size - self.window.maxlen * 512  # Generous bytes-per-row estimate
+        if tail_start > self._offset:
+            self._file.seek(tail_start - 1)
+            self._file.readline()  # Skip the line we landed in
+            self._offset = self._file.tell()
@@ -3,22 +3,16 @@ import psutil
 import dash_daq as daq
 import plotly.graph_objs as go
 from dash.dependencies import Input, Output
-
-# Check if GPU monitoring is available
-try:
-    from pynvml import nvmlInit, nvmlDeviceGetHandleByIndex, nvmlDeviceGetUtilizationRates, nvmlDeviceGetTemperature, nvmlShutdown, NVML_TEMPERATURE_GPU
-    nvmlInit()
-    gpu_available = True
-    gpu_handle = nvmlDeviceGetHandleByIndex(0)  # First GPU
-except ImportError:
-    gpu_available = False
+from dash.exceptions import PreventUpdate
+from sampler import RingBuffer, Sampler, start_once
+from instrument import timed
+from metrics import get_gpu_usage_and_temp  # NVML is initialised on first use, shut down at exit
 
 # Initialize Dash app
 app = Dash(__name__)
 
-# Store historical data
-cpu_usage_history = []
-gpu_usage_history = []
+# Store historical data (filled by the background sampler, last 50 samples)
+history = RingBuffer(["cpu_usage", "cpu_temp", "gpu_usage", "gpu_temp"], capacity=50)
 
 # App Layout
 app.layout = html.Div([
@@ -64,6 +58,27 @@ app.layout = html.Div([
     dcc.Interval(id="interval-update", interval=2000, n_intervals=0)
 ], style={"padding": "20px"})
 
+# Take one sample of CPU & GPU data
+@timed("collect sample")
+def collect_sample():
+    # Get CPU Data
+    cpu_usage = psutil.cpu_percent()
+    try:
+        cpu_temp = psutil.sensors_temperatures().get("coretemp", [{}])[0].get("current", "N/A")
+    except:
+        cpu_temp = "N/A"
+
+    # Get GPU Data
+    gpu_usage, gpu_temp = get_gpu_usage_and_temp()
+    if gpu_temp is None:
+        gpu_temp = "N/A"
+
+    return {"cpu_usage": cpu_usage, "cpu_temp": cpu_temp, "gpu_usage": gpu_usage, "gpu_temp": gpu_temp}
+
+# One collector for all browser tabs: samples every 2 seconds, callbacks only read the buffer
+psutil.cpu_percent()  # Prime the counter so the first non-blocking reading is meaningful
+sampler = Sampler(collect_sample, history, interval=2.0)
+
 # Callback to update real-time data
 @app.callback(
     [Output("cpu-gauge", "value"),
@@ -74,28 +89,17 @@ app.layout = html.Div([
      Output("gpu-graph", "figure")],
     Input("interval-update", "n_intervals")
 )
+@timed("dashboard callback")
 def update_dashboard(n_intervals):
-    # Get CPU Data
-    cpu_usage = psutil.cpu_percent()
-    try:
-        cpu_temp = psutil.sensors_temperatures().get("coretemp", [{}])[0].get("current", "N/A")
-    except:
-        cpu_temp = "N/A"
-
-    # Get GPU Data
-    if gpu_available:
-        gpu_usage = nvmlDeviceGetUtilizationRates(gpu_handle).gpu
-        gpu_temp = nvmlDeviceGetTemperature(gpu_handle, NVML_TEMPERATURE_GPU)
-    else:
-        gpu_usage, gpu_temp = 0, "N/A"
-
-    # Store data history for graphing
-    cpu_usage_history.append(cpu_usage)
-    gpu_usage_history.append(gpu_usage)
-
-    # Keep only last 50 values for smooth updates
-    cpu_usage_history[:] = cpu_usage_history[-50:]
-    gpu_usage_history[:] = gpu_usage_history[-50:]
+    start_once(sampler)  # Started lazily so only the process serving requests samples
+
+    data = history.snapshot()
+    if not data["cpu_usage"]:
+        raise PreventUpdate  # Nothing collected yet
+    cpu_usage_history = data["cpu_usage"]
+    gpu_usage_history = data["gpu_usage"]
+    cpu_usage, cpu_temp = cpu_usage_history[-1], data["cpu_temp"][-1]
+    gpu_usage, gpu_temp = gpu_usage_history[-1], data["gpu_temp"][-1]
 
     # CPU Usage Graph
     cpu_graph = go.Figure(data=[go.Scatter(y=cpu_usage_history, mode="lines", name="CPU Usage")])
@@ -1,55 +1,62 @@
-import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+from csv_tail import CsvTail
+from rollup import MetricHistory
+from shm_ring import RingFollower
+from instrument import SelfMonitor, timed
+from live_plot import BlitRenderer, LivePanel
 
 # File path for the data
 csv_file = "system_monitor.csv"
 
-# Initialize the figure and subplots
+# Time range to show (seconds); the number of points drawn is limited to the axis width in pixels
+HISTORY_SECONDS = 60 * 60
+
+# Incremental reader (only newly appended lines are parsed) feeding 1 s / 1 min / 1 h rollups.
+# The whole file is read once at startup (in chunks) to fill the rollups with history.
+tail = CsvTail(csv_file, window=1, encoding="utf-8-sig", from_start=True)
+history = MetricHistory(["CPU Usage (%)", "CPU Temperature (°C)", "GPU Usage (%)", "GPU Temperature (°C)"],
+                        weight_column="Sample Interval (s)")
+self_monitor = SelfMonitor("data-analysis")  # This viewer's own CPU/RSS and stage timings, in monitor_self.csv
+while True:
+    rows = tail.poll()
+    if not rows:
+        break
+    for row in rows:
+        history.add_row(row)
+
+# While dd.py is running, new samples come from its shared-memory ring as NumPy views (no file
+# reads or parsing); otherwise from the CSV. The rollups skip samples they already have.
+live = RingFollower("system_monitor")
+
+# Initialize the figure and subplots; lines are created once and blitted on each frame
 fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+renderer = BlitRenderer(fig, [
+    LivePanel(ax1, "CPU Performance Over Time", "Usage / Temperature",
+              [("CPU Usage (%)", "CPU Usage (%)", "blue"), ("CPU Temperature (°C)", "CPU Temperature (°C)", "red")],
+              HISTORY_SECONDS),
+    LivePanel(ax2, "GPU Performance Over Time", "Usage / Temperature",
+              [("GPU Usage (%)", "GPU Usage (%)", "green"), ("GPU Temperature (°C)", "GPU Temperature (°C)", "orange")],
+              HISTORY_SECONDS, missing_title="GPU Not Available"),
+])
 
-def update(frame):
-    """Fetch and update the latest CPU & GPU usage and temperature data dynamically"""
-    df = pd.read_csv(csv_file, encoding='utf-8-sig')
-    
-    # Convert Timestamp to datetime
-    df["Timestamp"] = pd.to_datetime(df["Timestamp"])
-    
-    # Keep only the last 50 data points to prevent clutter
-    df = df.tail(50)
-    
-    # Clear previous plots
-    ax1.clear()
-    ax2.clear()
-    
-    # Plot CPU Data (Left Side)
-    ax1.plot(df["Timestamp"], df["CPU Usage (%)"], label="CPU Usage (%)", color="blue", linewidth=2)
-    if "CPU Temperature (°C)" in df.columns:
-        ax1.plot(df["Timestamp"], df["CPU Temperature (°C)"], label="CPU Temperature (°C)", color="red", linewidth=2)
-    
-    ax1.set_xlabel("Time")
-    ax1.set_ylabel("Usage / Temperature")
-    ax1.set_title("CPU Performance Over Time")
-    ax1.legend()
-    ax1.grid()
-    
-    # Plot GPU Data (Right Side) if available
-    if "GPU Usage (%)" in df.columns and "N/A" not in df["GPU Usage (%)"].values:
-        ax2.plot(df["Timestamp"], df["GPU Usage (%)"], label="GPU Usage (%)", color="green", linewidth=2)
-        if "GPU Temperature (°C)" in df.columns:
-            ax2.plot(df["Timestamp"], df["GPU Temperature (°C)"], label="GPU Temperature (°C)", color="orange", linewidth=2)
-        ax2.set_title("GPU Performance Over Time")
+@timed("viewer frame")
+def update():
+    """Fetch the latest CPU & GPU usage and temperature data and redraw the lines"""
+    self_monitor.read()
+    data = live.poll()
+    if data is None:
+        with timed("csv read"):
+            for row in tail.poll():
+                history.add_row(row)
     else:
-        ax2.set_title("GPU Not Available")
-    
-    ax2.set_xlabel("Time")
-    ax2.set_ylabel("Usage / Temperature")
-    ax2.legend()
-    ax2.grid()
-    
-    plt.xticks(rotation=45)
-
-# Animate the graph to update every second (1000ms interval)
-ani = animation.FuncAnimation(fig, update, interval=1000, blit=False)
+        with timed("ring read"):
+            history.add_columns(data)
+    if history.last_time is None:
+        return
+    renderer.frame(history)
+
+plt.tight_layout()
 
+# Update the graph every second (1000ms interval)
+timer = renderer.start(update, interval=1000)
 plt.show()
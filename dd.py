@@ -1,37 +1,113 @@
-import csv
 import datetime
-import os
-from dash import Dash, dcc, html
-import psutil
+import threading
+import time
+from flask import Response, request
+from dash import Dash, dcc, html, no_update
 import dash_daq as daq
 import plotly.graph_objs as go
-from dash.dependencies import Input, Output
-
-# GPU Monitoring Setup
-gpu_available = False
-try:
-    from pynvml import nvmlInit, nvmlDeviceGetHandleByIndex, nvmlDeviceGetUtilizationRates, nvmlDeviceGetTemperature, nvmlShutdown, NVML_TEMPERATURE_GPU
-    nvmlInit()
-    gpu_available = True
-    gpu_handle = nvmlDeviceGetHandleByIndex(0)  # First GPU
-except ImportError:
-    gpu_available = False
-
-# CSV File Setup
-csv_filename = "system_monitor.csv"
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+from sampler import RingBuffer, Sampler, start_once
+from scheduler import AdaptiveRate
+from metric_writer import MetricWriter
+from csv_tail import CsvTail
+from rollup import MetricHistory
+from hub import FanoutHub
+from collectors import CollectorSet
+from metrics import get_gpu_usage_and_temp  # NVML is initialised on first use
+import instrument
+from instrument import SelfMonitor, SELF_FIELDS, timed
+from anomaly import AnomalyDetector
+from segments import SegmentStore
+from shm_ring import SharedRing
 
-# Function to create CSV file only once
-if not os.path.exists(csv_filename) or os.stat(csv_filename).st_size == 0:
-    with open(csv_filename, mode="w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(["Timestamp", "CPU Usage (%)", "CPU Temperature (°C)", "GPU Usage (%)", "GPU Temperature (°C)"])
+# CSV File Setup (kept open, rows are written in batches; header only for a new file).
+# The file is rotated at 16 MB or daily and closed files are compacted into system_monitor.segments/
+# "Sample Interval (s)" is the period each row covers (it varies with MONITOR_ADAPTIVE=1)
+csv_filename = "system_monitor.csv"
+CSV_FIELDS = ["Timestamp", "CPU Usage (%)", "CPU Temperature (°C)", "GPU Usage (%)", "GPU Temperature (°C)",
+              "Sample Interval (s)"]
+segment_store = SegmentStore(csv_filename)
+csv_writer = MetricWriter(csv_filename, CSV_FIELDS,
+                          batch_size=10, flush_interval=10.0, max_bytes=16 << 20, max_age=24 * 3600,
+                          on_rotate=segment_store.compact_in_background)
 
 # Initialize Dash App
 app = Dash(__name__)
 
-# Data History for Graphs
-cpu_usage_history = []
-gpu_usage_history = []
+# Streaming anomaly detection on every live metric; a flagged sample's value is also
+# stored under "<metric> Anomaly" and drawn as a marker over the graphs
+ANOMALY_METRICS = ["CPU Usage (%)", "CPU Temperature (°C)", "GPU Usage (%)", "GPU Temperature (°C)"]
+detector = AnomalyDetector()
+
+# Data History for Graphs (filled by the background sampler, last 50 samples)
+MAX_POINTS = 50
+FIELDS = (CSV_FIELDS + SELF_FIELDS + [f"{metric} Anomaly" for metric in ANOMALY_METRICS])
+history = RingBuffer(FIELDS, capacity=MAX_POINTS)
+
+
+# Long-range history: 1 s / 1 min / 1 h rollups, filled from the segments and CSV by a background
+# thread started with the sampler, and by the sampler. Live rows that arrive during the backfill are
+# held and added after it, so the rollups still get every row in time order.
+HISTORY_POINTS = 1000  # Point budget for the history graph (about one per horizontal pixel)
+HISTORY_RANGES = {"Last hour": 3600, "Last 24 hours": 24 * 3600, "Last 7 days": 7 * 24 * 3600, "Last 30 days": 30 * 24 * 3600}
+long_history = MetricHistory(["CPU Usage (%)", "GPU Usage (%)"], weight_column="Sample Interval (s)")
+
+
+backfilled = threading.Event()
+held_rows = []
+held_lock = threading.Lock()
+
+
+def add_to_history(sample):
+    with held_lock:
+        if not backfilled.is_set():
+            held_rows.append(sample)
+            return
+    long_history.add_row(sample)
+
+
+def backfill_history():
+    try:
+        segment_store.compact_pending()  # Finish compaction a previous run didn't get to
+        now = time.time()
+        for column in long_history.rollups:
+            long_history.add_points(column, segment_store.weighted_points(column, now - max(HISTORY_RANGES.values()), now))
+        backfill = CsvTail(csv_filename, window=1, from_start=True)
+        while True:
+            rows = backfill.poll()
+            if not rows:
+                break
+            for row in rows:
+                long_history.add_row(row)
+        backfill.close()
+    finally:
+        with held_lock:  # Rows the CSV already had are skipped as not newer
+            for row in held_rows:
+                long_history.add_row(row)
+            held_rows.clear()
+            backfilled.set()
+
+
+def start_backfill():
+    threading.Thread(target=backfill_history, name="history backfill", daemon=True).start()
+
+
+# This process's own CPU and RSS are sampled with the machine's; stage timings go to monitor_self.csv
+self_monitor = SelfMonitor("dd")
+
+# The same samples in shared memory for local viewers (ddd.py, data-analysis.py), so they don't
+# re-read the CSV. Created with the first sample, so only the process that samples publishes.
+RING_NAME = "system_monitor"
+ring = None
+
+
+# Build an empty graph once; the callback only streams new points into it. The last trace marks anomalies.
+def make_graph(title, *names):
+    graph = go.Figure(data=[go.Scatter(x=[], y=[], mode="lines", name=name) for name in names])
+    graph.add_trace(go.Scatter(x=[], y=[], mode="markers", name="Anomaly", marker={"color": "red", "size": 10}))
+    graph.update_layout(title=title, xaxis_title="Time", yaxis_title="Usage (%)")
+    return graph
 
 # App Layout
 app.layout = html.Div([
@@ -69,85 +145,185 @@ app.layout = html.Div([
 
     # Live Graphs
     html.Div([
-        dcc.Graph(id="cpu-graph"),
-        dcc.Graph(id="gpu-graph")
+        dcc.Graph(id="cpu-graph", figure=make_graph("CPU Usage Over Time", "CPU Usage", "Monitor CPU")),
+        dcc.Graph(id="gpu-graph", figure=make_graph("GPU Usage Over Time", "GPU Usage"))
     ]),
+    html.P(id="monitor-overhead", style={"color": "gray"}),
+
+    # History Graph (time range picked by the user, drawn from the rollups)
+    html.Div([
+        html.H3("History"),
+        dcc.Dropdown(id="history-range", options=[{"label": label, "value": seconds} for label, seconds in HISTORY_RANGES.items()],
+                     value=3600, clearable=False),
+        dcc.Graph(id="history-graph"),
+    ]),
+    dcc.Interval(id="history-update", interval=30000, n_intervals=0),
+
+    # What this browser tab has already been sent (sample sequence number and displayed values)
+    dcc.Store(id="client-state", data={"seq": 0}),
 
     # Interval Component (Triggers update every 2 seconds)
     dcc.Interval(id="interval-update", interval=2000, n_intervals=0)
 ], style={"padding": "20px"})
 
 
-# Function to get CPU Temperature
-def get_cpu_temperature():
-    try:
-        temps = psutil.sensors_temperatures()
-        if "coretemp" in temps:
-            return temps['coretemp'][0].current
-        elif "cpu-thermal" in temps:  # Raspberry Pi
-            return temps['cpu-thermal'][0].current
-        else:
-            return None
-    except:
-        return None
-
-
-# Function to get GPU Usage and Temperature
-def get_gpu_usage_and_temp():
-    if gpu_available:
+# Take one sample and queue it for the CSV file
+@timed("collect sample")
+def collect_sample():
+    global ring
+    record = sensors.collect()  # CPU usage since the previous sample and temperature, in one pass
+    cpu_usage, cpu_temp = record.cpu, record.cpu_temp
+    gpu_usage, gpu_temp = get_gpu_usage_and_temp()
+    timestamp = datetime.datetime.now()
+    interval = sampler.interval
+
+    # **Append data to CSV File**
+    csv_writer.write([timestamp, cpu_usage, cpu_temp if cpu_temp else "N/A", gpu_usage, gpu_temp if gpu_temp else "N/A",
+                      interval])
+
+    sample = {
+        "Timestamp": timestamp,
+        "CPU Usage (%)": cpu_usage,
+        "CPU Temperature (°C)": cpu_temp,
+        "GPU Usage (%)": gpu_usage,
+        "GPU Temperature (°C)": gpu_temp,
+        "Sample Interval (s)": interval,
+    }
+    sample.update(self_monitor.read())
+    anomalies = detector.observe("local", {metric: sample[metric] for metric in ANOMALY_METRICS}, timestamp.timestamp())
+    for metric in ANOMALY_METRICS:
+        sample[f"{metric} Anomaly"] = sample[metric] if metric in anomalies else None
+    add_to_history(sample)
+    if ring is None:
+        ring = SharedRing.create(RING_NAME, CSV_FIELDS)
+    ring.append(sample)
+    hub.publish(sample)
+    return sample
+
+
+# Live samples are pushed once to every /stream subscriber (React app, CLI tails: python hub.py)
+hub = FanoutHub(capacity=256)
+
+# One collector for all browser tabs: samples every 2 seconds, callbacks only read the buffer.
+# With MONITOR_ADAPTIVE=1 it samples every second while usage moves or nears 80% (temperatures 85 °C)
+# and backs off to every 10 seconds while the machine is steady.
+sensors = CollectorSet(["cpu", "temperature"])  # Takes the first CPU reading, so the first sample covers a full period
+adaptive_rate = AdaptiveRate.from_env({"CPU Usage (%)": 80, "CPU Temperature (°C)": 85,
+                                       "GPU Usage (%)": 80, "GPU Temperature (°C)": 85})
+sampler = Sampler(collect_sample, history, interval=2.0, rate=adaptive_rate, setup=start_backfill)
+
+
+# Server-Sent Events stream of live samples
+@app.server.route("/stream")
+def stream():
+    start_once(sampler)
+    subscriber = hub.subscribe()
+
+    def events():
         try:
-            gpu_usage = nvmlDeviceGetUtilizationRates(gpu_handle).gpu
-            gpu_temp = nvmlDeviceGetTemperature(gpu_handle, NVML_TEMPERATURE_GPU)
-            return gpu_usage, gpu_temp
-        except:
-            return 0, None
-    return 0, None
+            while True:
+                frames = subscriber.next_batch(timeout=15)
+                yield b"".join(frames) if frames else b": keep-alive\n\n"
+        finally:
+            subscriber.close()
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "Access-Control-Allow-Origin": "*"})
+
+
+# Sampling profiler for a fixed window: /debug/profile?seconds=10 returns folded stacks (flamegraph.pl, speedscope).
+# One profile at a time, at most 60 s, since each one holds a request thread for its whole window.
+profile_lock = threading.Lock()
+
+
+@app.server.route("/debug/profile")
+def debug_profile():
+    try:
+        seconds = float(request.args.get("seconds", 10))
+    except ValueError:
+        return Response("seconds must be a number\n", status=400, mimetype="text/plain")
+    if not seconds > 0:  # Also rejects nan
+        return Response("seconds must be positive\n", status=400, mimetype="text/plain")
+    seconds = min(seconds, 60.0)
+    if not profile_lock.acquire(blocking=False):
+        return Response("a profile is already running\n", status=409, mimetype="text/plain")
+    try:
+        counts = instrument.profile(seconds)
+    finally:
+        profile_lock.release()
+    return Response(instrument.format_folded(counts), mimetype="text/plain")
 
 
 # Callback: Update Dashboard Data
+# Only samples the tab hasn't seen are sent (extendData, capped at MAX_POINTS), and gauges
+# and temperature text are left untouched (no_update) when their value hasn't changed.
 @app.callback(
     [Output("cpu-gauge", "value"),
      Output("cpu-temp", "children"),
-     Output("cpu-graph", "figure"),
+     Output("cpu-graph", "extendData"),
      Output("gpu-gauge", "value"),
      Output("gpu-temp", "children"),
-     Output("gpu-graph", "figure")],
-    Input("interval-update", "n_intervals")
+     Output("gpu-graph", "extendData"),
+     Output("monitor-overhead", "children"),
+     Output("client-state", "data")],
+    Input("interval-update", "n_intervals"),
+    State("client-state", "data")
 )
-def update_dashboard(n_intervals):
-    # Get CPU Data
-    cpu_usage = psutil.cpu_percent()
-    cpu_temp = get_cpu_temperature()
+@timed("dashboard callback")
+def update_dashboard(n_intervals, client_state):
+    start_once(sampler)  # Started lazily so only the process serving requests samples
 
-    # Get GPU Data
-    gpu_usage, gpu_temp = get_gpu_usage_and_temp()
+    # Read the samples collected by the background thread since this tab's last update
+    seq, data = history.since(client_state["seq"])
+    if not data["Timestamp"]:
+        raise PreventUpdate  # Nothing new collected
+    cpu_usage, cpu_temp = data["CPU Usage (%)"][-1], data["CPU Temperature (°C)"][-1]
+    gpu_usage, gpu_temp = data["GPU Usage (%)"][-1], data["GPU Temperature (°C)"][-1]
 
     # Format temperature values
     cpu_temp_text = f"CPU Temperature: {cpu_temp}°C" if cpu_temp is not None else "CPU Temperature: Not Available"
     gpu_temp_text = f"GPU Temperature: {gpu_temp}°C" if gpu_temp is not None else "GPU Temperature: Not Available"
+    if data["CPU Temperature (°C) Anomaly"][-1] is not None:
+        cpu_temp_text += " ⚠️ unusual"
+    if data["GPU Temperature (°C) Anomaly"][-1] is not None:
+        gpu_temp_text += " ⚠️ unusual"
 
-    # Store data history for graphing
-    cpu_usage_history.append(cpu_usage)
-    gpu_usage_history.append(gpu_usage)
+    # New points for the CPU and GPU graphs
+    cpu_points = ({"x": [data["Timestamp"]] * 3,
+                   "y": [data["CPU Usage (%)"], data["Monitor CPU (%)"], data["CPU Usage (%) Anomaly"]]}, [0, 1, 2], MAX_POINTS)
+    gpu_points = ({"x": [data["Timestamp"]] * 2, "y": [data["GPU Usage (%)"], data["GPU Usage (%) Anomaly"]]}, [0, 1], MAX_POINTS)
 
-    # Keep last 50 values for smooth updates
-    cpu_usage_history[:] = cpu_usage_history[-50:]
-    gpu_usage_history[:] = gpu_usage_history[-50:]
+    # The monitor's own cost: process CPU and RSS, and the slowest stages (p99)
+    stages = instrument.summary()
+    overhead_text = f"Monitor overhead: {data['Monitor CPU (%)'][-1]:.1f}% CPU, {data['Monitor RSS (MB)'][-1]:.0f} MB RSS"
+    for stage in ("collect sample", "dashboard callback", "figure build"):
+        if stage in stages:
+            overhead_text += f" | {stage} p99 {stages[stage]['p99_ms']:.2f} ms"
 
-    # **Append data to CSV File**
-    with open(csv_filename, mode="a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow([datetime.datetime.now(), cpu_usage, cpu_temp if cpu_temp else "N/A", gpu_usage, gpu_temp if gpu_temp else "N/A"])
+    shown = {"seq": seq, "cpu": cpu_usage, "cpu_temp": cpu_temp_text, "gpu": gpu_usage, "gpu_temp": gpu_temp_text,
+             "overhead": overhead_text}
+
+    def changed(key):
+        return shown[key] if client_state.get(key) != shown[key] else no_update
 
-    # CPU Graph
-    cpu_graph = go.Figure(data=[go.Scatter(y=cpu_usage_history, mode="lines", name="CPU Usage")])
-    cpu_graph.update_layout(title="CPU Usage Over Time", xaxis_title="Time", yaxis_title="Usage (%)")
+    return (changed("cpu"), changed("cpu_temp"), cpu_points,
+            changed("gpu"), changed("gpu_temp"), gpu_points, changed("overhead"), shown)
 
-    # GPU Graph
-    gpu_graph = go.Figure(data=[go.Scatter(y=gpu_usage_history, mode="lines", name="GPU Usage")])
-    gpu_graph.update_layout(title="GPU Usage Over Time", xaxis_title="Time", yaxis_title="Usage (%)")
 
-    return cpu_usage, cpu_temp_text, cpu_graph, gpu_usage, gpu_temp_text, gpu_graph
+# Callback: Redraw the History Graph for the selected time range
+@app.callback(
+    Output("history-graph", "figure"),
+    [Input("history-range", "value"),
+     Input("history-update", "n_intervals")]
+)
+def update_history(seconds, n_intervals):
+    with timed("figure build"):
+        history_graph = go.Figure()
+        for column, name in [("CPU Usage (%)", "CPU Usage"), ("GPU Usage (%)", "GPU Usage")]:
+            times, values = long_history.query(column, seconds, max_points=HISTORY_POINTS)
+            history_graph.add_trace(go.Scatter(x=[datetime.datetime.fromtimestamp(t) for t in times], y=values, mode="lines", name=name))
+        history_graph.update_layout(title="Usage History", xaxis_title="Time", yaxis_title="Usage (%)")
+    return history_graph
 
 
 # Run the Dash app
@@ -1,66 +1,75 @@
-import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-import chardet
+from csv_tail import CsvTail
+from rollup import MetricHistory
+from shm_ring import RingFollower
+from instrument import SelfMonitor, timed
+from live_plot import BlitRenderer, LivePanel
 
 # CSV File
 csv_file = "system_monitor.csv"
 
-# Detect CSV Encoding
-def detect_encoding(file):
-    with open(file, "rb") as f:
-        result = chardet.detect(f.read(10000))  # Check first 10,000 bytes
-    return result["encoding"]
+# Time range to show (seconds); the number of points drawn is limited to the axis width in pixels
+HISTORY_SECONDS = 60 * 60
 
-# Read CSV with proper encoding
-def read_csv_file(file):
-    encoding = detect_encoding(file)
+# Incremental reader: the encoding is detected once, degree symbols are removed once per
+# new row, and only lines appended since the previous frame are parsed. The whole file is
+# read once at startup (in chunks) to fill the rollups with history.
+tail = CsvTail(csv_file, window=1, clean=lambda value: value.replace("°", ""), from_start=True)
+history = MetricHistory(["CPU Usage (%)", "GPU Usage (%)"], weight_column="Sample Interval (s)")
+self_monitor = SelfMonitor("ddd")  # This viewer's own CPU/RSS and stage timings, in monitor_self.csv
+
+# While dd.py is running, new samples are read from its shared-memory ring (NumPy views, no
+# file reads or parsing); otherwise from the CSV. The rollups skip samples they already have.
+live = RingFollower("system_monitor")
+
+# Read new samples into the rollups; False if there is no data yet
+def read_new_samples():
     try:
-        df = pd.read_csv(file, encoding=encoding, errors="replace")
-        df.columns = df.columns.str.replace("°", "")  # Remove degree symbols
-        df = df.applymap(lambda x: str(x).replace("°", "") if isinstance(x, str) else x)
-        return df
+        data = live.poll()
+        if data is None:
+            with timed("csv read"):
+                for row in tail.poll():
+                    history.add_row(row)
+        else:
+            with timed("ring read"):
+                history.add_columns(data)
+        return history.last_time is not None
     except Exception as e:
-        print("Error reading CSV:", e)
-        return pd.DataFrame()  # Return empty DataFrame if error occurs
+        print("Error reading samples:", e)
+        return False
 
-# Initialize Figure
+# History: the whole CSV file once, in chunks (the ring only holds the latest samples)
+while True:
+    rows = tail.poll()
+    if not rows:
+        break
+    for row in rows:
+        history.add_row(row)
+
+# Figure with one panel per metric; lines are created once and blitted on each frame
 fig, axes = plt.subplots(1, 2, figsize=(12, 5))
 cpu_ax, gpu_ax = axes  # Assign subplots
+renderer = BlitRenderer(fig, [
+    LivePanel(cpu_ax, "CPU Usage Over Time", "CPU Usage (%)", [("CPU Usage (%)", "CPU Usage (%)", "blue")], HISTORY_SECONDS),
+    LivePanel(gpu_ax, "GPU Usage Over Time", "GPU Usage (%)", [("GPU Usage (%)", "GPU Usage (%)", "red")], HISTORY_SECONDS,
+              missing_title="GPU Not Available"),
+])
 
-# Update Function for Animation
-def update(frame):
-    df = read_csv_file(csv_file)
-    
-    if df.empty:
-        print("CSV file is empty or not readable. Skipping update.")
+# Update Function (called by the timer)
+@timed("viewer frame")
+def update():
+    self_monitor.read()
+    if not read_new_samples():
+        print("No samples yet (CSV file is empty or not readable). Skipping update.")
         return
 
     try:
-        df["Timestamp"] = pd.to_datetime(df["Timestamp"])  # Convert timestamp
-        df = df.tail(50)  # Keep last 50 records for smooth updates
-
-        cpu_ax.clear()
-        cpu_ax.plot(df["Timestamp"], df["CPU Usage (%)"], color="blue", label="CPU Usage (%)")
-        cpu_ax.set_title("CPU Usage Over Time")
-        cpu_ax.set_xlabel("Time")
-        cpu_ax.set_ylabel("CPU Usage (%)")
-        cpu_ax.legend()
-        cpu_ax.tick_params(axis="x", rotation=45)
-
-        gpu_ax.clear()
-        gpu_ax.plot(df["Timestamp"], df["GPU Usage (%)"], color="red", label="GPU Usage (%)")
-        gpu_ax.set_title("GPU Usage Over Time")
-        gpu_ax.set_xlabel("Time")
-        gpu_ax.set_ylabel("GPU Usage (%)")
-        gpu_ax.legend()
-        gpu_ax.tick_params(axis="x", rotation=45)
-
+        renderer.frame(history)
     except Exception as e:
         print("Error updating graph:", e)
 
-# Animate Graph Every 2 Seconds
-ani = animation.FuncAnimation(fig, update, interval=2000)
-
 plt.tight_layout()
+
+# Update the graph every 2 seconds
+timer = renderer.start(update, interval=2000)
 plt.show()
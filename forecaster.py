@@ -0,0 +1,146 @@
+import multiprocessing as mp
+import queue
+import time
+import warnings
+
+import instrument
+from instrument import timed
+
+
+@timed("arima fit")
+def fit_arima(data, order=(2, 1, 2), start_params=None):
+    """Fit an ARIMA model to ``data``, optionally warm-started from a previous fit's parameters."""
+    from statsmodels.tsa.arima.model import ARIMA  # Only loaded where fitting happens
+
+    model = ARIMA(list(data), order=order)
+    return model.fit(start_params=start_params)
+
+
+def predict_future_cpu(data, steps=5, order=(2, 1, 2)):
+    """Train ARIMA model and predict next CPU usage (blocking, fits from scratch)."""
+    if len(data) < 10:
+        return None
+    return fit_arima(data, order).forecast(steps=steps)
+
+
+def _forecast_worker(requests, results, order, steps, refit_every, max_error, min_points):
+    """Worker process loop: keep one fitted model up to date and publish forecasts.
+
+    Each request is ``(seq, values)`` where ``values`` is the current window and ``seq``
+    counts all observations ever produced. New observations are appended to the
+    existing state-space results; a full refit (warm-started from the last parameters)
+    runs every ``refit_every`` seconds or when the mean one-step error exceeds ``max_error``.
+    """
+    model_fit = None
+    last_seq = 0
+    last_refit = 0.0
+    next_prediction = None
+    errors = []
+
+    while True:
+        request = requests.get()
+        # Only the newest window matters; drop anything older that queued up
+        while True:
+            try:
+                request = requests.get_nowait()
+            except queue.Empty:
+                break
+        if request is None:
+            return
+
+        seq, values = request
+        values = [float(value) for value in values]
+        if len(values) < min_points:
+            continue
+        new_count = seq - last_seq
+        if new_count <= 0:
+            continue  # Nothing new since the last forecast
+        new_values = values[-new_count:]
+
+        # Track one-step-ahead error to notice when the fit degrades
+        if next_prediction is not None and new_values:
+            errors = (errors + [abs(new_values[0] - next_prediction)])[-10:]
+        degraded = len(errors) >= 3 and sum(errors) / len(errors) > max_error
+
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # statsmodels convergence chatter
+                if (model_fit is None or degraded or new_count >= len(values)
+                        or time.monotonic() - last_refit >= refit_every):
+                    start_params = model_fit.params if model_fit is not None else None
+                    model_fit = fit_arima(values, order, start_params)
+                    last_refit = time.monotonic()
+                    errors = []
+                    kind = "refit"
+                else:
+                    with timed("arima append"):
+                        model_fit = model_fit.append(new_values)
+                    kind = "append"
+                forecast = [float(value) for value in model_fit.forecast(steps=steps)]
+        except Exception as e:
+            print("Forecast error:", e)
+            model_fit = None
+            continue
+
+        last_seq = seq
+        next_prediction = forecast[0]
+        # Fit timings travel with the result and are merged into the UI process's histograms
+        result = {"forecast": forecast, "seq": seq, "kind": kind, "fitted_at": time.time(),
+                  "timings": instrument.drain()}
+        try:
+            results.put_nowait(result)
+        except queue.Full:
+            # The UI hasn't read the previous result yet; it will pick up the next one
+            instrument.merge(result["timings"])
+
+
+class Forecaster:
+    """Run ARIMA forecasting in a worker process so the UI loop never waits on a fit.
+
+    Call submit() with the latest window every tick and latest() to get the most
+    recent cached forecast and its age in seconds.
+    """
+
+    def __init__(self, order=(2, 1, 2), steps=5, refit_every=60.0, max_error=10.0, min_points=10):
+        ctx = mp.get_context("spawn")  # Don't fork the (multi-threaded) UI server
+        self._requests = ctx.Queue(maxsize=5)
+        self._results = ctx.Queue(maxsize=5)
+        self._process = ctx.Process(
+            target=_forecast_worker,
+            args=(self._requests, self._results, order, steps, refit_every, max_error, min_points),
+            daemon=True,
+        )
+        self._latest = None
+
+    def start(self):
+        self._process.start()
+        return self
+
+    def submit(self, values, seq):
+        """Queue the current window for forecasting. Never blocks; skipped if the worker is busy."""
+        try:
+            self._requests.put_nowait((seq, list(values)))
+        except queue.Full:
+            pass
+
+    def latest(self):
+        """Return ``(forecast, age_seconds)`` for the newest result, or None if there is none yet."""
+        while True:
+            try:
+                self._latest = self._results.get_nowait()
+            except queue.Empty:
+                break
+            instrument.merge(self._latest.pop("timings", {}))
+        if self._latest is None:
+            return None
+        return self._latest["forecast"], time.time() - self._latest["fitted_at"]
+
+    def stop(self):
+        if self._process.is_alive():
+            try:
+                self._requests.put(None, timeout=1)
+            except queue.Full:
+                pass
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._process.terminate()
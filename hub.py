@@ -0,0 +1,83 @@
+import datetime
+import json
+import sys
+import threading
+import urllib.request
+
+
+def encode_event(seq, sample):
+    """Encode a sample once as a Server-Sent Events frame (bytes)."""
+    sample = {key: value.timestamp() if isinstance(value, datetime.datetime) else value
+              for key, value in sample.items()}
+    return f"id: {seq}\ndata: {json.dumps(sample, separators=(',', ':'))}\n\n".encode()
+
+
+class FanoutHub:
+    """Publish each sample once to any number of subscribers.
+
+    Published events are encoded once and stored in a shared ring of ``capacity``
+    frames; every subscriber only keeps a cursor into it. Publishing therefore costs
+    the same whatever the number of viewers, and each subscriber effectively has its
+    own bounded queue: one that falls more than ``capacity`` events behind skips the
+    oldest ones (drop-oldest) and its ``dropped`` counter says how many.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._frames = [None] * capacity
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.subscribers = 0
+
+    def publish(self, sample):
+        with self._cond:
+            self._frames[self._seq % self.capacity] = encode_event(self._seq, sample)
+            self._seq += 1
+            self._cond.notify_all()
+
+    def subscribe(self):
+        return Subscriber(self)
+
+
+class Subscriber:
+    """A reader's position in a FanoutHub. Starts at the next published event."""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.dropped = 0
+        with hub._cond:
+            self.cursor = hub._seq
+            hub.subscribers += 1
+
+    def next_batch(self, timeout=None):
+        """Wait for new events and return their frames (empty list on timeout)."""
+        hub = self.hub
+        with hub._cond:
+            if not hub._cond.wait_for(lambda: hub._seq > self.cursor, timeout):
+                return []
+            if hub._seq - self.cursor > hub.capacity:
+                self.dropped += hub._seq - self.cursor - hub.capacity
+                self.cursor = hub._seq - hub.capacity
+            frames = [hub._frames[seq % hub.capacity] for seq in range(self.cursor, hub._seq)]
+            self.cursor = hub._seq
+            return frames
+
+    def close(self):
+        with self.hub._cond:
+            self.hub.subscribers -= 1
+
+    def __iter__(self):
+        while True:
+            yield from self.next_batch()
+
+
+def tail(url):
+    """Print the samples of an SSE stream (e.g. http://localhost:8050/stream) as they arrive."""
+    with urllib.request.urlopen(url) as response:
+        for line in response:
+            if line.startswith(b"data:"):
+                print(line[5:].decode().strip(), flush=True)
+
+
+if __name__ == "__main__":
+    tail(sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8050/stream")
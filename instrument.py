@@ -0,0 +1,267 @@
+import collections
+import datetime
+import functools
+import math
+import os
+import sys
+import threading
+import time
+
+import psutil
+
+# Stage timings are recorded into log-bucketed histograms: recording is one log() and a
+# dict increment, memory stays bounded however many samples are taken, and histograms
+# from different threads or processes can be merged. Set MONITOR_INSTRUMENT=0 to disable.
+ENABLED = os.environ.get("MONITOR_INSTRUMENT", "1") != "0"
+GROWTH = 1.04  # Bucket width ratio: quantiles are within about 2% of the true value
+MIN_VALUE = 1e-7  # Values below this (seconds) share the lowest bucket
+_LOG_GROWTH = math.log(GROWTH)
+
+
+class Histogram:
+    """Mergeable histogram of positive values with logarithmic buckets."""
+
+    __slots__ = ("buckets", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.buckets = {}  # bucket index -> count
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        index = math.floor(math.log(max(value, MIN_VALUE)) / _LOG_GROWTH)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add the counts of ``other`` to this histogram."""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Approximate value at quantile ``q`` (0..1), or None if empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Geometric middle of the bucket, kept inside the observed range
+                value = GROWTH ** (index + 0.5)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def to_dict(self):
+        return {"buckets": {str(k): v for k, v in self.buckets.items()}, "count": self.count,
+                "total": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.buckets = {int(k): v for k, v in data["buckets"].items()}
+        histogram.count, histogram.total = data["count"], data["total"]
+        histogram.min, histogram.max = data["min"], data["max"]
+        return histogram
+
+
+# Per-process registry: stage name -> Histogram of durations in seconds
+_lock = threading.Lock()
+_interval = {}  # Since the last drain()
+_totals = {}  # Since start-up (updated on drain())
+
+
+def record(stage, seconds):
+    """Record one duration for ``stage``."""
+    with _lock:
+        histogram = _interval.get(stage)
+        if histogram is None:
+            histogram = _interval[stage] = Histogram()
+        histogram.add(seconds)
+
+
+class timed:
+    """Time a block (``with timed("csv write"):``) or every call of a function (``@timed("nvml call")``)."""
+
+    __slots__ = ("stage", "_start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if ENABLED:
+            record(self.stage, time.perf_counter() - self._start)
+
+    def __call__(self, func):
+        stage = self.stage
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - start)
+        return wrapper
+
+
+def drain():
+    """Return the histograms recorded since the last drain() and start new ones."""
+    global _interval
+    with _lock:
+        interval, _interval = _interval, {}
+        for stage, histogram in interval.items():
+            _totals.setdefault(stage, Histogram()).merge(histogram)
+    return interval
+
+
+def merge(histograms):
+    """Add histograms recorded elsewhere (e.g. a worker process's drain()) to this process's."""
+    with _lock:
+        for stage, histogram in histograms.items():
+            _interval.setdefault(stage, Histogram()).merge(histogram)
+
+
+def totals():
+    """Histograms of everything recorded since start-up, including the current interval."""
+    with _lock:
+        result = {stage: Histogram().merge(histogram) for stage, histogram in _totals.items()}
+        for stage, histogram in _interval.items():
+            result.setdefault(stage, Histogram()).merge(histogram)
+    return result
+
+
+def summary(histograms=None):
+    """``{stage: {"count", "p50_ms", "p99_ms", "max_ms"}}`` for ``histograms`` (default: totals())."""
+    histograms = totals() if histograms is None else histograms
+    return {stage: {"count": h.count, "p50_ms": h.quantile(0.5) * 1000,
+                    "p99_ms": h.quantile(0.99) * 1000, "max_ms": h.max * 1000}
+            for stage, h in sorted(histograms.items()) if h.count}
+
+
+SELF_FIELDS = ["Monitor CPU (%)", "Monitor RSS (MB)"]
+
+
+class SelfMonitor:
+    """The monitor's own overhead: process CPU and RSS plus stage timing quantiles.
+
+    read() is cheap enough to call every sample and returns the process's CPU (%) and
+    RSS (MB) under SELF_FIELDS, to be stored next to "CPU Usage (%)". Every
+    ``export_every`` seconds it also drains the stage histograms and appends everything
+    to ``filename`` in long format (Timestamp, Process, Metric, Value), the layout
+    collector.py writes. Use one per process, since exporting drains the shared registry.
+    """
+
+    def __init__(self, name, filename="monitor_self.csv", export_every=30.0):
+        from metric_writer import MetricWriter
+
+        self.name = name
+        self.export_every = export_every
+        self.process = psutil.Process()
+        self.process.cpu_percent(interval=None)  # Prime: the first reading covers up to the next call
+        self.writer = None
+        if filename:
+            self.writer = MetricWriter(filename, ["Timestamp", "Process", "Metric", "Value"],
+                                       batch_size=200, flush_interval=export_every)
+        self._last_export = time.monotonic()
+        profile_from_env(name)
+
+    def read(self):
+        with self.process.oneshot():
+            sample = {"Monitor CPU (%)": self.process.cpu_percent(interval=None),
+                      "Monitor RSS (MB)": self.process.memory_info().rss / 2 ** 20}
+        if time.monotonic() - self._last_export >= self.export_every:
+            self.export(sample)
+        return sample
+
+    def export(self, sample=None):
+        """Write process usage and the stage quantiles since the last export."""
+        self._last_export = time.monotonic()
+        sample = sample or self.read()
+        histograms = drain()
+        if self.writer is None:
+            return
+        timestamp = datetime.datetime.now()
+        for metric, value in sample.items():
+            self.writer.write([timestamp, self.name, metric, round(value, 3)])
+        for stage, h in sorted(histograms.items()):
+            self.writer.write([timestamp, self.name, f"{stage} count", h.count])
+            self.writer.write([timestamp, self.name, f"{stage} p50 (ms)", round(h.quantile(0.5) * 1000, 4)])
+            self.writer.write([timestamp, self.name, f"{stage} p99 (ms)", round(h.quantile(0.99) * 1000, 4)])
+
+
+# Sampling profiler: snapshots every thread's stack at a fixed rate for a fixed window
+
+def profile(seconds=10.0, interval=0.005):
+    """Sample all other threads' stacks for ``seconds``; returns a Counter of folded stacks."""
+    counts = collections.Counter()
+    own_thread = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def format_folded(counts):
+    """Folded-stack text ("a;b;c count" per line), readable by flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def top_functions(counts, n=15):
+    """The ``n`` functions most often on top of a stack, as ``(function, share)`` pairs."""
+    leaves = collections.Counter()
+    for stack, count in counts.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    total = sum(leaves.values()) or 1
+    return [(function, count / total) for function, count in leaves.most_common(n)]
+
+
+def start_profile(seconds, filename, interval=0.005):
+    """Profile in a background thread and write the folded stacks to ``filename`` when done."""
+    def run():
+        counts = profile(seconds, interval)
+        with open(filename, "w") as f:
+            f.write(format_folded(counts))
+        print(f"Profile written to {filename}; hottest: " +
+              ", ".join(f"{function} {share:.0%}" for function, share in top_functions(counts, 5)))
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def profile_from_env(name):
+    """Profile the first MONITOR_PROFILE seconds of this process, if that variable is set."""
+    seconds = float(os.environ.get("MONITOR_PROFILE") or 0)
+    if seconds > 0:
+        return start_profile(seconds, f"profile_{name}.folded")
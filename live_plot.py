@@ -0,0 +1,130 @@
+import datetime
+
+import matplotlib.dates as mdates
+import numpy as np
+
+
+class LivePanel:
+    """One axes of a live viewer: line artists, title and labels are created once.
+
+    Each frame only calls ``set_data`` on the lines. The x range is kept a little
+    ahead of the newest sample and the y range only grows (in ``y_step`` steps), so
+    limits change rarely; ``update`` reports when they did and a full redraw is needed.
+    When none of the panel's columns has data the title switches to ``missing_title``
+    (e.g. "GPU Not Available" for N/A GPU readings).
+    """
+
+    def __init__(self, ax, title, ylabel, lines, seconds, missing_title=None, ylim=(0, 100), y_step=10):
+        self.ax = ax
+        self.title = title
+        self.missing_title = missing_title or title
+        self.seconds = seconds
+        self.y_step = y_step
+        self.lines = {}
+        for column, label, color in lines:
+            (line,) = ax.plot([], [], label=label, color=color, linewidth=2, animated=True)
+            self.lines[column] = line
+        ax.set_title(title)
+        ax.set_xlabel("Time")
+        ax.set_ylabel(ylabel)
+        ax.xaxis_date()
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+        ax.tick_params(axis="x", rotation=45)
+        ax.set_ylim(*ylim)
+        ax.grid()
+        ax.legend(loc="upper left")
+        self._available = True
+
+    def update(self, history):
+        """Point the lines at the latest data. Returns True if limits or the title changed."""
+        changed = False
+        newest, low, high = None, None, None
+        for column, line in self.lines.items():
+            times, values = series(history, column, self.seconds, int(self.ax.get_window_extent().width))
+            line.set_data(times, values)
+            if len(times):
+                newest = times[-1] if newest is None else max(newest, times[-1])
+                finite = values[~np.isnan(values)]
+                if len(finite):
+                    low = finite.min() if low is None else min(low, finite.min())
+                    high = finite.max() if high is None else max(high, finite.max())
+
+        available = high is not None
+        if available != self._available:
+            self._available = available
+            self.ax.set_title(self.title if available else self.missing_title)
+            changed = True
+        if newest is None:
+            return changed
+
+        # Move the x range only once the data reaches its right edge (one redraw per 5% of the window)
+        left, right = self.ax.get_xlim()
+        if newest > right or newest < left:
+            span = self.seconds / 86400
+            self.ax.set_xlim(newest - span, newest + span * 0.05)
+            changed = True
+        if high is not None:
+            bottom, top = self.ax.get_ylim()
+            if high > top or low < bottom:
+                self.ax.set_ylim(min(bottom, np.floor(low / self.y_step) * self.y_step),
+                                 max(top, np.ceil(high / self.y_step) * self.y_step))
+                changed = True
+        return changed
+
+
+def series(history, column, seconds, max_points):
+    """Points of ``column`` over the last ``seconds`` as arrays of matplotlib date numbers and values."""
+    times, values = history.query(column, seconds, max_points=max_points)
+    if not times:
+        return np.empty(0), np.empty(0)
+    # Local wall-clock time, like datetime.fromtimestamp(); one conversion for the whole series
+    times = np.asarray(times, dtype=float)
+    base = mdates.date2num(datetime.datetime.fromtimestamp(times[0]))
+    return base + (times - times[0]) / 86400, np.asarray(values, dtype=float)
+
+
+class BlitRenderer:
+    """Redraw a figure of LivePanels with blitting.
+
+    A full draw (axes, ticks, legends) happens only when a panel's limits or title
+    change, or the window is resized; its pixels are kept as the background. Other frames
+    restore the background, draw just the line artists and blit them to the screen.
+    """
+
+    def __init__(self, fig, panels):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.panels = panels
+        self._background = None
+        self._needs_draw = True
+        self.full_draws = 0
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _artists(self):
+        return [line for panel in self.panels for line in panel.lines.values()]
+
+    def _on_draw(self, event):
+        # Any full draw (ours, a resize, the toolbar) refreshes the background and redraws the lines on it
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self._artists():
+            self.fig.draw_artist(artist)
+
+    def frame(self, history):
+        changed = [panel.update(history) for panel in self.panels]
+        if any(changed) or self._needs_draw or self._background is None or not self.canvas.supports_blit:
+            self._needs_draw = False
+            self.full_draws += 1
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self._background)
+            for artist in self._artists():
+                self.fig.draw_artist(artist)
+            self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+
+    def start(self, callback, interval):
+        """Call ``callback`` every ``interval`` milliseconds on the GUI event loop. Keep the returned timer."""
+        timer = self.canvas.new_timer(interval=interval)
+        timer.add_callback(callback)
+        timer.start()
+        return timer
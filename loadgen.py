@@ -0,0 +1,460 @@
+import argparse
+import datetime
+import http.server
+import math
+import re
+import socket
+import threading
+import time
+
+import numpy as np
+
+from agent import HEADER, MAX_DATAGRAM, encode_batch
+from metric_writer import MetricWriter
+
+# Canonical metric names (as in analytics.py); NaN means "N/A"
+METRICS = ["cpu", "cpu_mem", "cpu_temp", "gpu", "gpu_mem", "gpu_temp"]
+
+# The CSV headers written by dd.py, Analysis.py and another.py (the Streamlit app)
+SCHEMAS = {
+    "dd": ["Timestamp", "CPU Usage (%)", "CPU Temperature (°C)", "GPU Usage (%)", "GPU Temperature (°C)",
+           "Sample Interval (s)"],
+    "analysis": ["Timestamp", "CPU_Usage", "CPU_Memory_Usage", "GPU_Usage", "GPU_Memory_Usage", "Sample_Interval"],
+    "streamlit": ["Time", "CPU Usage", "GPU Usage"],
+}
+AGENT_NAMES = {"cpu": "cpu", "cpu_mem": "memory", "cpu_temp": "cpu_temp", "gpu": "gpu", "gpu_mem": "gpu_memory"}
+
+
+class SyntheticFleet:
+    """Realistic-looking metrics for ``hosts`` machines, generated a block of ticks at a time.
+
+    CPU load follows a daily cycle (peak in the afternoon) around a per-host base level,
+    with AR(1) noise and occasional spikes lasting a few samples. GPU load is correlated
+    with CPU load; only ``gpu_fraction`` of the hosts have a GPU (the rest report N/A).
+    Temperatures lag behind load. Sensors drop out for a while now and then (N/A gaps),
+    and hosts occasionally go silent (no sample at all). State carries over between blocks.
+    """
+
+    def __init__(self, hosts=1, seed=0, gpu_fraction=0.5, spike_rate=1 / 600, dropout_rate=1 / 3600,
+                 offline_rate=1 / 7200):
+        self.hosts = hosts
+        self.names = [f"sim-{i:05d}" for i in range(hosts)]
+        self.rng = rng = np.random.default_rng(seed)
+        self.spike_rate = spike_rate
+        self.dropout_rate = dropout_rate
+        self.offline_rate = offline_rate
+        self.base = rng.uniform(5, 40, hosts)
+        self.amplitude = rng.uniform(5, 35, hosts)
+        self.has_gpu = rng.random(hosts) < gpu_fraction
+        self.has_gpu[0] = True  # The host written to single-host sinks always has a GPU
+        self.memory = rng.uniform(30, 70, hosts)
+        self.noise = np.zeros(hosts)
+        self.cpu_temp = np.full(hosts, 45.0)
+        self.gpu_temp = np.full(hosts, 40.0)
+        # Events still running at the end of the last block: remaining samples (and spike size)
+        self.spike, self.spike_size = np.zeros(hosts, dtype=int), np.zeros(hosts)
+        self.dropout = {"cpu_temp": np.zeros(hosts, dtype=int), "gpu_temp": np.zeros(hosts, dtype=int)}
+        self.offline = np.zeros(hosts, dtype=int)
+
+    def block(self, timestamps, interval):
+        """Samples at ``timestamps`` (epoch seconds, ``interval`` apart) for every host.
+
+        Returns ``(present, {metric: values})``, arrays of shape (ticks, hosts); NaN is N/A.
+        """
+        rng, n, k = self.rng, self.hosts, len(timestamps)
+        hours = (timestamps + time.localtime(float(timestamps[0])).tm_gmtoff) % 86400 / 3600
+        daily = np.maximum(0.0, np.sin(2 * np.pi * (hours - 8) / 24))[:, None]  # 0 at night, 1 at 14:00
+
+        noise = _decay_filter(0.9, rng.normal(0, 4, (k, n)), self.noise)
+        self.noise = noise[-1]
+        spikes = self._events(self.spike, self.spike_rate * interval, 0.2, k, self.spike_size, lambda count: rng.uniform(30, 60, count))
+        cpu = np.round(np.clip(self.base + self.amplitude * daily + noise + spikes, 0, 100), 1)
+        gpu = np.where(self.has_gpu, np.round(np.clip(0.8 * cpu + rng.normal(0, 8, (k, n)), 0, 100), 1), np.nan)
+        memory = np.clip(self.memory + np.cumsum(rng.normal(0, 0.3, (k, n)), axis=0), 10, 95)
+        self.memory = memory[-1]
+        gpu_mem = np.where(self.has_gpu, np.round(np.clip(0.5 * np.nan_to_num(gpu) + 10, 0, 100), 1), np.nan)
+
+        # Temperatures approach a load-dependent target with a 30 s time constant
+        lag = 1 - math.exp(-interval / 30)
+        cpu_temp = _decay_filter(1 - lag, lag * (35 + 0.5 * cpu), self.cpu_temp)
+        gpu_temp = _decay_filter(1 - lag, lag * (30 + 0.55 * np.nan_to_num(gpu)), self.gpu_temp)
+        self.cpu_temp, self.gpu_temp = cpu_temp[-1], gpu_temp[-1]
+
+        # Sensor dropouts (N/A gaps) and silent hosts, each lasting a random number of samples
+        values = {"cpu": cpu, "cpu_mem": np.round(memory, 1), "cpu_temp": np.round(cpu_temp, 1),
+                  "gpu": gpu, "gpu_mem": gpu_mem, "gpu_temp": np.where(self.has_gpu, np.round(gpu_temp, 1), np.nan)}
+        for metric, remaining in self.dropout.items():
+            missing = self._events(remaining, self.dropout_rate * interval, 1 / 30, k)
+            values[metric][missing > 0] = np.nan
+        present = self._events(self.offline, self.offline_rate * interval, 1 / 60, k) == 0
+        return present, values
+
+    def _events(self, remaining, rate, end_probability, k, sizes=None, new_sizes=None):
+        """(ticks, hosts) array that is an event's size (1 without ``sizes``) while it lasts, else 0.
+
+        Events start with probability ``rate`` per tick and last a geometric number of
+        ticks; ``remaining`` (and ``sizes``) carry running events into the next block.
+        """
+        active = np.zeros((k, self.hosts))
+        for host in np.flatnonzero(remaining > 0):  # Carried over from the last block
+            active[:remaining[host], host] = sizes[host] if sizes is not None else 1
+        carry = np.maximum(remaining - k, 0)
+        starts = np.argwhere(self.rng.random((k, self.hosts)) < rate)
+        lengths = self.rng.geometric(end_probability, len(starts))
+        values = new_sizes(len(starts)) if new_sizes is not None else np.ones(len(starts))
+        for (tick, host), length, value in zip(starts.tolist(), lengths.tolist(), values.tolist()):
+            active[tick:tick + length, host] = np.maximum(active[tick:tick + length, host], value)
+            if tick + length - k > carry[host]:
+                carry[host] = tick + length - k
+                if sizes is not None:
+                    sizes[host] = value
+        remaining[:] = carry
+        return active
+
+
+# log of the smallest decay power used by _decay_filter (1e-150 leaves headroom for the division)
+MIN_POWER_LOG = math.log(1e-150)
+
+
+def _decay_filter(decay, inputs, initial):
+    """y[t] = decay * y[t - 1] + inputs[t] along axis 0, starting from y[-1] = ``initial``.
+
+    Closed form (powers of ``decay`` and one cumulative sum) instead of a Python loop, over
+    runs of ticks short enough that ``decay ** length`` stays far from underflow (a few
+    hundred ticks for a strong decay such as exp(-1) at 30 s intervals).
+    """
+    if decay <= 0:
+        return np.array(inputs, dtype=float)
+    run = len(inputs) if decay >= 1 else max(1, int(MIN_POWER_LOG / math.log(decay)))
+    outputs = np.empty(np.shape(inputs))
+    for start in range(0, len(inputs), run):
+        chunk = inputs[start:start + run]
+        powers = decay ** np.arange(1, len(chunk) + 1)[:, None]
+        outputs[start:start + len(chunk)] = powers * (initial + np.cumsum(chunk / powers, axis=0))
+        initial = outputs[start + len(chunk) - 1]
+    return outputs
+
+
+def replay(path, hosts=1):
+    """Yield ``(timestamp, present, values)`` from a recorded CSV in any of the three schemas.
+
+    The recording is sent as ``hosts`` identical hosts (named like the synthetic ones).
+    """
+    from analytics import csv_chunks, plan
+
+    tasks, skipped = plan([path], split_bytes=1 << 62, with_segments=False)
+    if skipped or not tasks:
+        raise ValueError(f"{path}: not a recognised metrics CSV")
+    present = np.ones(hosts, dtype=bool)
+    for times, columns in csv_chunks(tasks[0]):
+        valid = ~np.isnat(times)  # Rows with a bad timestamp are dropped from every column
+        times = times[valid]
+        columns = {metric: np.asarray(values)[valid] for metric, values in columns.items()}
+        if not len(times):
+            continue
+        # Wall-clock times back to epoch seconds (one UTC offset per chunk)
+        wall = times.astype("datetime64[ms]").astype(np.int64) / 1000
+        epoch = wall - time.localtime(float(wall[0])).tm_gmtoff
+        for i, timestamp in enumerate(epoch.tolist()):
+            values = {metric: np.full(hosts, columns[metric][i]) if metric in columns else np.full(hosts, np.nan)
+                      for metric in METRICS}
+            yield timestamp, present, values
+
+
+# Sinks: each gets every tick as (timestamp, host names, present mask, {metric: array})
+
+def _text(value, missing="N/A"):
+    return missing if value != value else value
+
+
+class CsvSink:
+    """Write the first host in one of the scripts' CSV schemas, optionally rotating into segments."""
+
+    def __init__(self, path, schema="dd", rotate_bytes=None):
+        self.schema = schema
+        self.store = None
+        on_rotate = None
+        if rotate_bytes:
+            from segments import SegmentStore
+            self.store = SegmentStore(path)
+            on_rotate = self.store.compact_in_background
+        self.writer = MetricWriter(path, SCHEMAS[schema], batch_size=1000, flush_interval=1.0,
+                                   max_bytes=rotate_bytes, on_rotate=on_rotate)
+        self.last = None
+
+    def write(self, timestamp, names, present, values):
+        if not present[0]:
+            return
+        row = {metric: array[0] for metric, array in values.items()}
+        stamp = datetime.datetime.fromtimestamp(timestamp)
+        interval = "" if self.last is None else round(timestamp - self.last, 3)  # Seconds since the previous row
+        self.last = timestamp
+        if self.schema == "dd":
+            self.writer.write([stamp, _text(row["cpu"]), _text(row["cpu_temp"]), _text(row["gpu"], 0), _text(row["gpu_temp"]),
+                               interval])
+        elif self.schema == "analysis":
+            self.writer.write([stamp.strftime("%Y-%m-%d %H:%M:%S"), _text(row["cpu"]), _text(row["cpu_mem"]),
+                               _text(row["gpu"]), _text(row["gpu_mem"]), interval])
+        else:
+            self.writer.write([stamp.strftime("%H:%M:%S"), _text(row["cpu"]), _text(row["gpu"], 0)])
+
+    def close(self):
+        self.writer.close()
+        if self.store is not None:
+            self.store.compact_pending()
+
+
+class RingSink:
+    """Publish the first host into dd.py's shared-memory ring, so the viewers can be driven without dd.py."""
+
+    def __init__(self, name="system_monitor"):
+        from shm_ring import SharedRing
+        self.ring = SharedRing.create(name, SCHEMAS["dd"])
+        self.last = None
+
+    def write(self, timestamp, names, present, values):
+        if present[0]:
+            self.ring.append({"Timestamp": timestamp, "CPU Usage (%)": values["cpu"][0],
+                              "CPU Temperature (°C)": values["cpu_temp"][0], "GPU Usage (%)": values["gpu"][0],
+                              "GPU Temperature (°C)": values["gpu_temp"][0],
+                              "Sample Interval (s)": None if self.last is None else timestamp - self.last})
+            self.last = timestamp
+
+    def close(self):
+        self.ring.close()
+
+
+class CollectorSink:
+    """Push every host's samples to collector.py in the agent wire format, ``batch_size`` samples per batch."""
+
+    def __init__(self, server, transport="tcp", batch_size=10):
+        self.server = server
+        self.transport = transport
+        self.batch_size = batch_size
+        self.boot = time.time()
+        self.pending = {}  # host -> samples
+        self.seq = {}
+        self.sent = 0
+        if transport == "udp":
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            self.socket = socket.create_connection(server)
+
+    def write(self, timestamp, names, present, values):
+        timestamp = round(timestamp, 3)
+        columns = {AGENT_NAMES[metric]: values[metric].tolist() for metric in AGENT_NAMES}
+        for i in np.flatnonzero(present).tolist():
+            sample = {name: (None if column[i] != column[i] else column[i]) for name, column in columns.items()}
+            if sample["gpu"] is None:
+                del sample["gpu"], sample["gpu_memory"]  # Like agent.py on a machine without a GPU
+            host = names[i]
+            samples = self.pending.setdefault(host, [])
+            samples.append([timestamp, sample])
+            if len(samples) >= self.batch_size:
+                self._send(host)
+
+    def _send(self, host):
+        samples = self.pending.pop(host, None)
+        if not samples:
+            return
+        seq = self.seq.get(host, 0)
+        self.seq[host] = seq + 1
+        payload = encode_batch(host, self.boot, seq, samples)
+        if self.transport == "udp":
+            if len(payload) <= MAX_DATAGRAM:
+                self.socket.sendto(payload, self.server)
+        else:
+            self.socket.sendall(HEADER.pack(len(payload)) + payload)
+        self.sent += 1
+
+    def close(self):
+        for host in list(self.pending):
+            self._send(host)
+        self.socket.close()
+
+
+class StreamSink:
+    """Serve the first host as dd.py's /stream (Server-Sent Events), for load-testing the React app and hub."""
+
+    def __init__(self, port=8050, host="127.0.0.1"):
+        from hub import FanoutHub
+        self.hub = hub = FanoutHub(capacity=256)
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/stream":
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                subscriber = hub.subscribe()
+                try:
+                    while True:
+                        frames = subscriber.next_batch(timeout=15)
+                        self.wfile.write(b"".join(frames) if frames else b": keep-alive\n\n")
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    subscriber.close()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def write(self, timestamp, names, present, values):
+        if present[0]:
+            self.hub.publish({"Timestamp": timestamp, "CPU Usage (%)": values["cpu"][0],
+                              "CPU Temperature (°C)": _none(values["cpu_temp"][0]), "GPU Usage (%)": _none(values["gpu"][0]),
+                              "GPU Temperature (°C)": _none(values["gpu_temp"][0])})
+
+    def close(self):
+        self.server.shutdown()
+
+
+def _none(value):
+    return None if value != value else float(value)
+
+
+# Driving the sinks
+
+def run(ticks, sinks, names, speed=1.0, report_every=5.0):
+    """Feed ``(timestamp, present, values)`` ticks to ``sinks`` at ``speed`` times real time (0: as fast as possible).
+
+    Returns the number of ticks sent. Reports the achieved rate and how far behind schedule it fell.
+    """
+    started = last_report = time.monotonic()
+    first = None
+    count = behind = 0
+    for timestamp, present, values in ticks:
+        if first is None:
+            first = timestamp
+        if speed:
+            delay = started + (timestamp - first) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                behind = max(behind, -delay)
+        for sink in sinks:
+            sink.write(timestamp, names, present, values)
+        count += 1
+        now = time.monotonic()
+        if now - last_report >= report_every:
+            print(f"{count} ticks ({count * len(names) / (now - started):.0f} samples/s) | "
+                  f"at {datetime.datetime.fromtimestamp(timestamp):%Y-%m-%d %H:%M:%S} | max lag {behind:.2f}s")
+            last_report = now
+    for sink in sinks:
+        sink.close()
+    return count
+
+
+def generated(fleet, start, interval, duration=None, block=1000):
+    """Ticks from a SyntheticFleet every ``interval`` seconds from ``start`` (forever without ``duration``)."""
+    block = max(1, min(block, 100_000 // fleet.hosts))  # Bounds the arrays for large fleets
+    first = 0
+    while True:
+        timestamps = start + interval * np.arange(first, first + block)
+        if duration is not None:
+            timestamps = timestamps[timestamps < start + duration]
+            if not len(timestamps):
+                return
+        present, values = fleet.block(timestamps, interval)
+        for i, timestamp in enumerate(timestamps.tolist()):
+            yield timestamp, present[i], {metric: array[i] for metric, array in values.items()}
+        first += block
+
+
+def limited(ticks, duration):
+    """Stop after ``duration`` seconds of data time."""
+    first = None
+    for tick in ticks:
+        first = tick[0] if first is None else first
+        if tick[0] >= first + duration:
+            return
+        yield tick
+
+
+def retimed(ticks, speed):
+    """Shift replayed timestamps so the recording starts now and its spacing is divided by ``speed``."""
+    first = now = None
+    for timestamp, present, values in ticks:
+        if first is None:
+            first, now = timestamp, time.time()
+        yield now + (timestamp - first) / speed, present, values
+
+
+def parse_duration(text):
+    """"30d", "12h", "90m", "45s" or plain seconds."""
+    match = re.fullmatch(r"([\d.]+)([smhd]?)", text.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"bad duration: {text}")
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic metrics and accelerated replay for load-testing the monitor.")
+    parser.add_argument("--replay", metavar="CSV", help="replay a recorded system_monitor.csv / performance_data.csv / "
+                                                       "system_usage.csv instead of generating data")
+    parser.add_argument("--hosts", type=int, default=1, help="number of hosts (sinks other than --collector use the first)")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between generated samples")
+    parser.add_argument("--start", help="generated data starts this long ago (e.g. 30d) instead of now")
+    parser.add_argument("--duration", type=parse_duration, help="stop after this much data time (e.g. 30d)")
+    parser.add_argument("--speed", type=float, default=1.0, help="N times real time; 0 = as fast as possible")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-times", action="store_true", help="replay with the recorded timestamps instead of from now")
+    parser.add_argument("--csv", help="write the first host to this CSV file")
+    parser.add_argument("--schema", choices=SCHEMAS, default="dd", help="CSV layout: dd.py, Analysis.py or another.py")
+    parser.add_argument("--rotate-mb", type=float, help="rotate the CSV at this size and compact it into segments")
+    parser.add_argument("--ring", nargs="?", const="system_monitor", help="publish to a shared-memory ring (viewers)")
+    parser.add_argument("--collector", metavar="HOST:PORT", help="push every host to collector.py")
+    parser.add_argument("--udp", action="store_true", help="send to the collector over UDP")
+    parser.add_argument("--batch", type=int, default=10, help="samples per collector batch")
+    parser.add_argument("--stream", type=int, metavar="PORT", help="serve the first host as an SSE /stream on this port")
+    args = parser.parse_args()
+
+    sinks = []
+    if args.csv:
+        sinks.append(CsvSink(args.csv, args.schema, int(args.rotate_mb * (1 << 20)) if args.rotate_mb else None))
+    if args.ring:
+        sinks.append(RingSink(args.ring))
+    if args.collector:
+        address, port = args.collector.rsplit(":", 1)
+        sinks.append(CollectorSink((address, int(port)), "udp" if args.udp else "tcp", args.batch))
+    if args.stream:
+        sinks.append(StreamSink(args.stream))
+    if not sinks:
+        parser.error("give at least one of --csv, --ring, --collector, --stream")
+
+    speed = args.speed
+    if args.replay:
+        fleet_names = SyntheticFleet(args.hosts).names
+        ticks = replay(args.replay, args.hosts)
+        if args.duration:
+            ticks = limited(ticks, args.duration)
+        if not args.keep_times and args.speed:
+            ticks, speed = retimed(ticks, args.speed), 1.0  # The new timestamps already run at N x
+    else:
+        fleet = SyntheticFleet(args.hosts, args.seed)
+        fleet_names = fleet.names
+        start = time.time() - (parse_duration(args.start) if args.start else 0)
+        ticks = generated(fleet, start, args.interval, args.duration)
+
+    started = time.monotonic()
+    try:
+        count = run(ticks, sinks, fleet_names, speed)
+    except KeyboardInterrupt:
+        for sink in sinks:
+            sink.close()
+        return
+    elapsed = time.monotonic() - started
+    print(f"Done: {count} ticks x {args.hosts} hosts in {elapsed:.1f}s ({count * args.hosts / max(elapsed, 1e-9):.0f} samples/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import atexit
+import csv
+import itertools
+import os
+import threading
+import time
+
+from instrument import timed
+
+# Durability policies
+FLUSH_ONLY = "flush"            # Hand each batch to the OS, never fsync
+FSYNC_EVERY_N = "fsync_every_n"  # fsync after every ``fsync_every`` batches
+FSYNC_BATCH = "fsync_batch"      # fsync after every batch
+
+
+def reserve_path(stem, suffix):
+    """Create and return a new empty file ``<stem>-<n><suffix>`` that didn't exist before.
+
+    The file is created with O_EXCL, so two callers (even in the same second, or in two
+    processes) never get the same name; the caller then replaces it with the real file.
+    """
+    for n in itertools.count():
+        path = f"{stem}-{n:03d}{suffix}"
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        return path
+
+
+def rotate_file(filename):
+    """Move ``filename`` aside as ``<filename>.<time>-<n>.rotated`` (a name not used before) and return it.
+
+    The file is hard-linked to the new name, which fails if the name exists, so a rotated file
+    waiting for compaction is never overwritten and never appears empty to the compactor.
+    """
+    stem = f"{filename}.{time.strftime('%Y%m%d-%H%M%S')}"
+    for n in itertools.count():
+        rotated = f"{stem}-{n:03d}.rotated"
+        try:
+            os.link(filename, rotated)
+        except FileExistsError:
+            continue
+        except OSError:  # No hard links on this file system
+            if os.path.exists(rotated):
+                continue
+            os.replace(filename, rotated)
+            return rotated
+        os.remove(filename)
+        return rotated
+
+
+class MetricWriter:
+    """Append rows to a CSV file that stays open, writing them in batches.
+
+    A batch is written when ``batch_size`` rows are pending or ``flush_interval``
+    seconds have passed since the last write. Pending rows are flushed on close()
+    and at interpreter exit, so a crash loses at most one batch.
+
+    With ``max_bytes`` and/or ``max_age`` (seconds since the file was opened) the file
+    is rotated after the batch that crosses the limit: it is renamed to
+    ``<filename>.<time>-<n>.rotated`` (see rotate_file), a new file with the header is started, and
+    ``on_rotate(rotated_path)`` is called (e.g. SegmentStore.compact_in_background).
+    An existing file with a different header (written before columns were added) is
+    rotated the same way on open, so a file never mixes two schemas.
+    """
+
+    def __init__(self, filename, header, batch_size=50, flush_interval=5.0,
+                 durability=FLUSH_ONLY, fsync_every=10, max_bytes=None, max_age=None, on_rotate=None):
+        if durability not in (FLUSH_ONLY, FSYNC_EVERY_N, FSYNC_BATCH):
+            raise ValueError(f"Unknown durability policy: {durability}")
+        self.filename = filename
+        self.header = list(header)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.fsync_every = fsync_every
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.on_rotate = on_rotate
+
+        self._rows = []
+        self._batches = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        stale = self._set_aside_stale()
+        self._open()
+        if stale is not None and self.on_rotate is not None:
+            self.on_rotate(stale)
+
+        atexit.register(self.close)
+
+    def _set_aside_stale(self):
+        try:
+            with open(self.filename, newline="", encoding="utf-8-sig") as f:
+                header = next(csv.reader(f), None)
+        except (FileNotFoundError, UnicodeDecodeError):
+            return None
+        if not header or header == self.header:
+            return None
+        return rotate_file(self.filename)
+
+    def _open(self):
+        # Write the header only when the file is new or empty
+        is_new = not os.path.exists(self.filename) or os.stat(self.filename).st_size == 0
+        self._file = open(self.filename, "a", newline="")
+        self._writer = csv.writer(self._file)
+        self._opened = time.monotonic()
+        if is_new:
+            self._writer.writerow(self.header)
+            self._file.flush()
+
+    def write(self, row):
+        """Queue one row; writes the batch if a size or time threshold is reached."""
+        with self._lock:
+            if self._file is None:
+                raise ValueError(f"MetricWriter for {self.filename} is closed")
+            self._rows.append(row)
+            if (len(self._rows) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._write_batch()
+
+    def flush(self):
+        """Write pending rows now."""
+        with self._lock:
+            if self._file is not None:
+                self._write_batch()
+
+    def close(self):
+        """Flush pending rows (fsync'ing unless the policy is flush only) and close the file."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._write_batch()
+            if self.durability != FLUSH_ONLY:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_batch(self):
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return
+        with timed("csv write"):
+            self._writer.writerows(self._rows)
+            self._rows = []
+            self._file.flush()
+        self._batches += 1
+        if self.durability == FSYNC_BATCH or (
+                self.durability == FSYNC_EVERY_N and self._batches % self.fsync_every == 0):
+            os.fsync(self._file.fileno())
+        if ((self.max_bytes is not None and self._file.tell() >= self.max_bytes)
+                or (self.max_age is not None and time.monotonic() - self._opened >= self.max_age)):
+            self._rotate()
+
+    def _rotate(self):
+        if self.durability != FLUSH_ONLY:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        rotated = rotate_file(self.filename)
+        self._open()
+        if self.on_rotate is not None:
+            self.on_rotate(rotated)
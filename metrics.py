@@ -0,0 +1,45 @@
+import collectors
+
+# The scripts' original sensor functions, now thin wrappers over collectors.py. Each function
+# has its own CollectorSet, created on first call (so NVML is only initialised once a GPU
+# reading is asked for). New code should build one CollectorSet and collect() once per tick.
+_sets = {}
+
+
+def _collect(*names):
+    if names not in _sets:
+        _sets[names] = collectors.CollectorSet(names)
+    return _sets[names].collect()
+
+
+def gpu_status():
+    """Return ``(available, error_message)``, initialising NVML if that hasn't happened yet."""
+    nvml, handles = collectors.nvml_devices()
+    return nvml is not None, collectors.nvml_error
+
+
+def get_cpu_info():
+    """Fetch CPU usage (average since the previous call, non-blocking) and memory usage."""
+    record = _collect("cpu", "memory")
+    return record.cpu, record.memory
+
+
+def get_gpu_info():
+    """Fetch GPU usage and memory usage (over all GPUs), or ``("N/A", "N/A")`` without a GPU."""
+    record = _collect("gpu")
+    if record.gpu is None:
+        return "N/A", "N/A"
+    return record.gpu, record.gpu_memory
+
+
+def get_gpu_usage_and_temp():
+    """Fetch GPU usage (%) and the hottest GPU's temperature (°C); ``(0, None)`` without a GPU."""
+    record = _collect("gpu")
+    if record.gpu is None:
+        return 0, None
+    return record.gpu, record.gpu_temp
+
+
+def get_cpu_temperature():
+    """Fetch the CPU temperature in °C, or None if no known sensor is present."""
+    return _collect("temperature").cpu_temp
@@ -1,7 +1,82 @@
-import React from "react";
+import React, { useEffect, useState } from "react";
 import "./App.css"
 
+// Local query service (query_server.py) and live sample stream (dd.py's /stream)
+const API_URL = process.env.REACT_APP_API_URL || "http://localhost:8060";
+const STREAM_URL = process.env.REACT_APP_STREAM_URL || "http://localhost:8050/stream";
+
+// Fetch a metric's points for the last `seconds`, averaged per `step` seconds.
+// Errors (e.g. 404 before the CSV exists) throw, so pollers keep their previous data
+const fetchRange = async (metric, seconds, step) => {
+  const to = Date.now() / 1000;
+  const params = new URLSearchParams({ metric, from: to - seconds, to, step });
+  const response = await fetch(`${API_URL}/query?${params}`);
+  if (!response.ok) {
+    throw new Error(`query failed: ${response.status}`);
+  }
+  return (await response.json()).points || [];
+};
+
+// Poll `load` every `interval` ms and return its latest result
+const usePolling = (load, interval, initial) => {
+  const [data, setData] = useState(initial);
+  useEffect(() => {
+    let active = true;
+    const update = () => load().then((result) => active && setData(result)).catch(() => {});
+    update();
+    const timer = setInterval(update, interval);
+    return () => {
+      active = false;
+      clearInterval(timer);
+    };
+  }, [load, interval]);
+  return data;
+};
+
+// Latest sample: fetched once from the query service, then pushed by the collector
+const useLiveSample = () => {
+  const [sample, setSample] = useState({});
+  useEffect(() => {
+    let active = true;
+    fetch(`${API_URL}/latest`)
+      .then((response) => (response.ok ? response.json() : Promise.reject(response.status)))
+      .then((latest) => active && setSample((current) => (current.Timestamp ? current : latest)))
+      .catch(() => {});
+    const source = new EventSource(STREAM_URL);
+    source.onmessage = (event) => setSample(JSON.parse(event.data));
+    return () => {
+      active = false;
+      source.close();
+    };
+  }, []);
+  return sample;
+};
+
+const loadTrends = () => fetchRange("CPU Usage (%)", 3600, 30);
+const loadHistory = () => fetchRange("CPU Usage (%)", 24 * 3600, 600);
+
+const formatValue = (value, unit) => (value === null || value === undefined ? "N/A" : `${Math.round(value)}${unit}`);
+
+// Simple SVG line chart for [timestamp, value] points (0-100 scale)
+const Sparkline = ({ points = [] }) => {
+  if (!points.length) {
+    return <p className="text-gray-400 text-sm">No data</p>;
+  }
+  const start = points[0][0];
+  const span = points[points.length - 1][0] - start || 1;
+  const path = points.map(([t, v]) => `${((t - start) / span) * 100},${100 - v}`).join(" ");
+  return (
+    <svg viewBox="0 0 100 100" preserveAspectRatio="none" className="w-full h-32">
+      <polyline points={path} fill="none" stroke="#4ade80" strokeWidth="1" vectorEffect="non-scaling-stroke" />
+    </svg>
+  );
+};
+
 const Dashboard = () => {
+  const latest = useLiveSample();
+  const trends = usePolling(loadTrends, 30000, []);
+  const history = usePolling(loadHistory, 300000, []);
+
   return (
     <div className="flex h-screen bg-gray-900 text-white">
       {/* Sidebar */}
@@ -29,23 +104,34 @@ const Dashboard = () => {
         <div className="p-4 grid grid-cols-3 gap-4">
           <div className="bg-gray-700 p-4 rounded text-center">
             <h2 className="text-lg">CPU Usage</h2>
-            <p className="text-xl font-bold">45%</p>
+            <p className="text-xl font-bold">{formatValue(latest["CPU Usage (%)"], "%")}</p>
           </div>
           <div className="bg-gray-700 p-4 rounded text-center">
             <h2 className="text-lg">GPU Usage</h2>
-            <p className="text-xl font-bold">60%</p>
+            <p className="text-xl font-bold">{formatValue(latest["GPU Usage (%)"], "%")}</p>
           </div>
           <div className="bg-gray-700 p-4 rounded text-center">
             <h2 className="text-lg">Temperature</h2>
-            <p className="text-xl font-bold text-red-500">65°C</p>
+            <p className="text-xl font-bold text-red-500">{formatValue(latest["CPU Temperature (°C)"], "°C")}</p>
           </div>
         </div>
 
         {/* Graphs Section */}
         <div className="p-4 grid grid-cols-2 gap-4">
-          <div className="bg-gray-700 p-10 rounded">Performance Trends</div>
+          <div className="bg-gray-700 p-10 rounded">
+            <h2 className="text-lg mb-2">Performance Trends (CPU, last hour)</h2>
+            <Sparkline points={trends} />
+          </div>
           <div className="bg-gray-700 p-10 rounded">Power Usage</div>
         </div>
+
+        {/* History Section */}
+        <div className="p-4">
+          <div className="bg-gray-700 p-10 rounded">
+            <h2 className="text-lg mb-2">History (CPU, last 24 hours)</h2>
+            <Sparkline points={history} />
+          </div>
+        </div>
         
         {/* Footer */}
         <div className="text-center text-gray-400 p-4 text-sm border-t border-gray-700">
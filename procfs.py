@@ -0,0 +1,178 @@
+import glob
+import os
+import re
+import sys
+import threading
+
+# Linux fast path for the per-tick readings. Sensor paths are discovered once, and
+# /proc/stat, /proc/meminfo and the chosen temperature file stay open: every read is one
+# preadv() at offset 0 into a buffer kept from the previous read (procfs and sysfs files
+# regenerate their contents on a read from offset 0). Elsewhere, or with MONITOR_PROCFS=0,
+# backend() returns None and collectors.py uses psutil. MONITOR_FS_ROOT points it at another
+# root, e.g. the host's /proc and /sys mounted into a container, or a fixture directory.
+ENABLED = os.environ.get("MONITOR_PROCFS", "1") != "0" and sys.platform.startswith("linux")
+ROOT = os.environ.get("MONITOR_FS_ROOT", "/")
+
+# Temperature sensors that stand for the CPU, in order of preference: hwmon driver names
+# (Intel, AMD, Raspberry Pi) and thermal zone types
+HWMON_NAMES = ["coretemp", "k10temp", "cpu_thermal"]
+THERMAL_TYPES = ["cpu-thermal", "x86_pkg_temp"]
+
+_NUMBER = re.compile(rb"-?\d+")
+
+
+class PinnedFile:
+    """A file kept open and re-read from the start into a reusable buffer."""
+
+    def __init__(self, path, size=4096):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        self.buffer = bytearray(size)
+        self.lock = threading.Lock()  # The buffer is shared; hold the lock while parsing it
+
+    def read(self):
+        """Re-read the file; returns the number of bytes now at the start of ``buffer``."""
+        while True:
+            n = os.preadv(self.fd, [self.buffer], 0)
+            if n < len(self.buffer):
+                return n
+            self.buffer = bytearray(2 * len(self.buffer))  # Didn't fit (many cores): grow and read again
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _first_input(directory):
+    """The lowest-numbered ``temp<N>_input`` in a hwmon directory (the package sensor for coretemp)."""
+    inputs = glob.glob(os.path.join(glob.escape(directory), "temp*_input"))
+    return min(inputs, key=lambda path: int(re.search(r"temp(\d+)_input$", path).group(1)), default=None)
+
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def find_cpu_temperature(sys_root):
+    """Path of the file holding the CPU temperature (millidegrees °C), or None if there is no known sensor."""
+    found = {}
+    for directory in sorted(glob.glob(os.path.join(glob.escape(sys_root), "class", "hwmon", "hwmon*")),
+                            key=lambda path: int(re.sub(r"\D", "", os.path.basename(path)) or 0)):
+        # Older kernels keep the attributes under device/
+        for base in (directory, os.path.join(directory, "device")):
+            name = _read_text(os.path.join(base, "name"))
+            if name in HWMON_NAMES and name not in found:
+                path = _first_input(base)
+                if path is not None:
+                    found[name] = path
+    for name in HWMON_NAMES:
+        if name in found:
+            return found[name]
+    zones = glob.glob(os.path.join(glob.escape(sys_root), "class", "thermal", "thermal_zone*"))
+    for kind in THERMAL_TYPES:
+        for zone in sorted(zones):
+            if _read_text(os.path.join(zone, "type")) == kind and os.path.exists(os.path.join(zone, "temp")):
+                return os.path.join(zone, "temp")
+    return None
+
+
+class ProcFS:
+    """CPU times, memory usage and CPU temperature read straight from procfs/sysfs under ``root``."""
+
+    def __init__(self, root="/"):
+        self.root = root
+        self._stat = PinnedFile(os.path.join(root, "proc", "stat"))
+        self._meminfo = PinnedFile(os.path.join(root, "proc", "meminfo"))
+        path = find_cpu_temperature(os.path.join(root, "sys"))
+        self._temperature = None if path is None else PinnedFile(path, size=64)
+
+    @property
+    def temperature_path(self):
+        return None if self._temperature is None else self._temperature.path
+
+    def cpu_times(self):
+        """``[(busy, total), ...]`` cumulative clock ticks per core, counted the way psutil does.
+
+        Total leaves out guest time (already included in user/nice); busy is total minus idle and iowait.
+        """
+        stat = self._stat
+        with stat.lock:
+            n = stat.read()
+            buffer = stat.buffer
+            # Only the per-core lines are copied out: they sit between the first line (all cores
+            # together) and "intr", which alone can be tens of kB on a large machine. A scan over
+            # a memoryview that copies nothing was tried and is about 3x slower in pure Python
+            # than splitting, so the lines are split here.
+            end = buffer.find(b"\nintr", 0, n)
+            lines = buffer[buffer.find(b"\n", 0, n) + 1:n if end == -1 else end].split(b"\n")
+        cores = []
+        for line in lines:
+            if not line.startswith(b"cpu"):
+                break
+            # cpuN user nice system idle iowait irq softirq steal guest guest_nice
+            user, nice, system, idle, iowait, irq, softirq, steal = map(int, line.split(None, 9)[1:9])
+            busy = user + nice + system + irq + softirq + steal
+            cores.append((busy, busy + idle + iowait))
+        return cores
+
+    def memory_percent(self):
+        """Used memory (%) as psutil.virtual_memory().percent: (MemTotal - MemAvailable) / MemTotal."""
+        meminfo = self._meminfo
+        with meminfo.lock:
+            n = meminfo.read()
+            total = _meminfo_value(meminfo.buffer, b"MemTotal:", n)
+            available = _meminfo_value(meminfo.buffer, b"MemAvailable:", n)
+        if not total or available is None:
+            return None  # Kernel without MemAvailable (before 3.14)
+        return round((total - available) / total * 100, 1)
+
+    def cpu_temperature(self):
+        """CPU temperature in °C, or None without a known sensor (or if the read fails)."""
+        sensor = self._temperature
+        if sensor is None:
+            return None
+        with sensor.lock:
+            try:
+                n = sensor.read()
+            except OSError:
+                return None  # Sensor gone or not ready
+            value = _NUMBER.search(sensor.buffer, 0, n)
+        return None if value is None else int(value.group()) / 1000
+
+    def close(self):
+        for pinned in (self._stat, self._meminfo, self._temperature):
+            if pinned is not None:
+                pinned.close()
+
+
+def _meminfo_value(buffer, key, n):
+    start = buffer.find(key, 0, n)
+    if start == -1:
+        return None
+    value = _NUMBER.search(buffer, start + len(key), n)
+    return None if value is None else int(value.group())
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend():
+    """The process-wide ProcFS under ``ROOT``, opened on first use; None if disabled or unavailable."""
+    global _backend, ENABLED
+    with _backend_lock:
+        if _backend is None and ENABLED:
+            try:
+                _backend = ProcFS(ROOT)
+                _backend.cpu_times()
+            except (OSError, AttributeError, ValueError, IndexError):  # No procfs, no os.preadv, unexpected format
+                if _backend is not None:
+                    _backend.close()
+                _backend = None
+                ENABLED = False
+        return _backend
@@ -0,0 +1,253 @@
+import bisect
+import csv
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from rollup import to_epoch, to_float
+from segments import SegmentStore
+
+# CSV file served and where the service listens
+CSV_FILE = "system_monitor.csv"
+HOST, PORT = "127.0.0.1", 8060
+
+INDEX_EVERY = 256   # One index entry per this many rows
+CHUNK_POINTS = 1000  # Points per streamed chunk
+
+
+class TimeIndex:
+    """Sparse timestamp -> byte offset index over a time-ordered CSV file.
+
+    Every ``every``-th row's timestamp and line offset are recorded, so a range query
+    seeks to the nearest entry before ``from`` instead of scanning from the start.
+    The index is extended incrementally as the file grows and rebuilt if the file is
+    truncated or replaced.
+    """
+
+    def __init__(self, filename, every=INDEX_EVERY):
+        self.filename = filename
+        self.every = every
+        self.times = []
+        self.offsets = []
+        self.columns = None
+        self.last_row = None
+        self._lock = threading.RLock()
+        self._reset(None)
+
+    def _reset(self, file_id):
+        self.times, self.offsets = [], []
+        self.columns, self.last_row = None, None
+        self._file_id = file_id
+        self._scanned = 0  # Offset up to which complete lines have been indexed
+        self._rows = 0
+
+    def refresh(self):
+        """Index rows appended since the last call. Returns False if the file doesn't exist."""
+        with self._lock:
+            try:
+                stat = os.stat(self.filename)
+            except FileNotFoundError:
+                self._reset(None)
+                return False
+            file_id = (stat.st_dev, stat.st_ino)
+            if file_id != self._file_id or stat.st_size < self._scanned:
+                self._reset(file_id)
+
+            with open(self.filename, "rb") as f:
+                f.seek(self._scanned)
+                offset = self._scanned
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Partial last line; index it once it's complete
+                    values = next(csv.reader([line.decode("utf-8-sig", errors="replace")]), None)
+                    if values:
+                        if self.columns is None:
+                            self.columns = values
+                        else:
+                            if self._rows % self.every == 0:
+                                try:
+                                    self.times.append(to_epoch(values[0]))
+                                    self.offsets.append(offset)
+                                except ValueError:
+                                    pass
+                            self._rows += 1
+                            self.last_row = values
+                    offset += len(line)
+                self._scanned = offset
+            return True
+
+    def start_offset(self, start):
+        """Offset of the last indexed row at or before ``start`` (or of the first row)."""
+        with self._lock:
+            i = bisect.bisect_right(self.times, start) - 1
+            if i >= 0:
+                return self.offsets[i]
+            return self.offsets[0] if self.offsets else None
+
+    def first_time(self):
+        """Timestamp of the first indexed row, or None before anything is indexed."""
+        with self._lock:
+            return self.times[0] if self.times else None
+
+    def rows(self, start, end):
+        """Yield ``(timestamp, values)`` for rows with ``start <= timestamp <= end``."""
+        with self._lock:  # Start and end offsets from the same refresh
+            offset = self.start_offset(start)
+            scanned = self._scanned
+        if offset is None:
+            return
+        with open(self.filename, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                if offset > scanned or not line.endswith(b"\n"):
+                    break  # Don't read past what has been indexed
+                values = next(csv.reader([line.decode("utf-8-sig", errors="replace")]), None)
+                if not values:
+                    continue
+                try:
+                    timestamp = to_epoch(values[0])
+                except ValueError:
+                    continue
+                if timestamp > end:
+                    break
+                if timestamp >= start:
+                    yield timestamp, values
+
+
+def raw_points(index, metric, start, end, store=None, above=None):
+    """Yield ``(timestamp, value)`` for ``metric`` from the compacted segments, then the live CSV.
+
+    Only segments overlapping the range (and, with ``above``, holding a larger value) are read.
+    """
+    live_start = index.first_time()
+    if store is not None and metric in (store.columns or []):
+        segment_end = end if live_start is None else min(end, live_start - 0.001)
+        for timestamp, value in store.points(metric, start, segment_end, above=above):
+            if above is None or value > above:
+                yield timestamp, value
+    if index.columns and metric in index.columns:
+        column = index.columns.index(metric)
+        for timestamp, values in index.rows(start, end):
+            value = to_float(values[column]) if column < len(values) else None
+            if value is not None and (above is None or value > above):
+                yield timestamp, value
+
+
+def query_points(index, metric, start, end, step=None, store=None, above=None):
+    """Yield ``[timestamp, value]`` points for ``metric``; averaged per ``step`` seconds if given."""
+    bucket, total, count = None, 0.0, 0
+    for timestamp, value in raw_points(index, metric, start, end, store, above):
+        if not step:
+            yield [round(timestamp, 3), value]
+            continue
+        key = timestamp - timestamp % step
+        if key != bucket and count:
+            yield [bucket, round(total / count, 3)]
+            total, count = 0.0, 0
+        bucket = key
+        total += value
+        count += 1
+    if step and count:
+        yield [bucket, round(total / count, 3)]
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """GET /metrics, /latest, /segments and /query?metric=...&from=...&to=...&step=...&above=..."""
+
+    protocol_version = "HTTP/1.1"
+    index = None  # Set by serve()
+    store = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if self.store is not None:
+            self.store.reload()
+        if not self.index.refresh() and not self._stored_columns():
+            return self._send_json(404, {"error": f"{self.index.filename} not found"})
+
+        if url.path == "/metrics":
+            return self._send_json(200, {"metrics": self._columns()[1:]})
+        if url.path == "/segments":
+            return self._send_json(200, self.store.summary() if self.store is not None else {})
+        if url.path == "/latest":
+            row = self.index.last_row
+            if row is None:
+                return self._send_json(200, {})
+            latest = {column: to_float(value) for column, value in zip(self.index.columns[1:], row[1:])}
+            latest["Timestamp"] = to_epoch(row[0])
+            return self._send_json(200, latest)
+        if url.path == "/query":
+            return self._query(params)
+        return self._send_json(404, {"error": "unknown endpoint"})
+
+    def _stored_columns(self):
+        return (self.store.columns or []) if self.store is not None else []
+
+    def _columns(self):
+        return self.index.columns or self._stored_columns()
+
+    def _query(self, params):
+        metric = params.get("metric")
+        if metric not in self._columns()[1:]:
+            return self._send_json(400, {"error": f"unknown metric: {metric}"})
+        try:
+            end = float(params.get("to", time.time()))
+            start = float(params.get("from", end - 3600))
+            step = float(params.get("step", 0)) or None
+            above = float(params["above"]) if "above" in params else None
+        except ValueError:
+            return self._send_json(400, {"error": "from, to, step and above must be numbers (epoch seconds for times)"})
+
+        # Stream the points in chunks, so a long range never has to be built in memory
+        self.send_response(200)
+        self._send_common_headers("application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._write_chunk(json.dumps({"metric": metric, "from": start, "to": end, "step": step})[:-1] + ',"points":[')
+        chunk, first = [], True
+        for point in query_points(self.index, metric, start, end, step, self.store, above):
+            chunk.append(point)
+            if len(chunk) >= CHUNK_POINTS:
+                self._write_chunk(("" if first else ",") + json.dumps(chunk, separators=(",", ":"))[1:-1])
+                chunk, first = [], False
+        if chunk:
+            self._write_chunk(("" if first else ",") + json.dumps(chunk, separators=(",", ":"))[1:-1])
+        self._write_chunk("]}")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self._send_common_headers("application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_common_headers(self, content_type):
+        self.send_header("Content-Type", content_type)
+        self.send_header("Access-Control-Allow-Origin", "*")  # The React dev server runs on another port
+
+    def log_message(self, format, *args):
+        pass  # Keep the console quiet; one line per request is too noisy at dashboard poll rates
+
+
+def serve(csv_file=CSV_FILE, host=HOST, port=PORT):
+    QueryHandler.index = TimeIndex(csv_file)
+    QueryHandler.index.refresh()
+    QueryHandler.store = SegmentStore(csv_file)  # Older history, rotated out of the CSV by the writer
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    print(f"Serving {csv_file} on http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,210 @@
+import bisect
+import collections
+import datetime
+import math
+import threading
+
+# Rollup resolutions in seconds and how many buckets of each are kept
+RESOLUTIONS = {1: 3600, 60: 7 * 24 * 60, 3600: 90 * 24}  # 1 hour, 1 week, 90 days
+
+
+class Bucket:
+    """Running min/max/mean/last of the samples falling in one time bucket.
+
+    The mean is weighted by each sample's ``weight`` (the seconds it covers), so it
+    stays a time average when the sampling rate varies.
+    """
+
+    __slots__ = ("start", "count", "total", "weight", "min", "max", "last")
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.total = 0.0
+        self.weight = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.last = None
+
+    def add(self, value, weight=1.0):
+        self.count += 1
+        self.total += value * weight
+        self.weight += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.last = value
+
+    @property
+    def mean(self):
+        return self.total / self.weight if self.weight else None
+
+
+class Rollup:
+    """Maintain 1 s / 1 min / 1 h aggregates of one metric, updated as samples arrive.
+
+    Samples must arrive in time order (epoch seconds). Each resolution keeps a bounded
+    number of buckets, so memory is fixed no matter how long the collector runs.
+    """
+
+    def __init__(self, resolutions=None):
+        self.resolutions = dict(resolutions or RESOLUTIONS)
+        self.buckets = {step: collections.deque(maxlen=size) for step, size in self.resolutions.items()}
+        self.last_time = None  # Timestamp of the newest sample
+
+    def add(self, timestamp, value, weight=1.0):
+        if value is None or value != value:  # Skip missing readings (None / NaN)
+            return
+        self.last_time = timestamp if self.last_time is None else max(self.last_time, timestamp)
+        for step, buckets in self.buckets.items():
+            start = timestamp - timestamp % step
+            if not buckets or buckets[-1].start < start:
+                buckets.append(Bucket(start))
+            elif buckets[-1].start > start:
+                continue  # Out-of-order sample older than the current bucket
+            buckets[-1].add(value, weight)
+
+    def query(self, start, end, max_points=500, agg="mean"):
+        """Return ``(times, values)`` for ``start <= t <= end`` in at most ``max_points`` points.
+
+        The finest resolution that still covers the whole range is used, and LTTB
+        downsampling brings it down to the point budget while keeping spikes. For
+        ``agg="max"``/``"min"`` the bucket extremes are returned instead of the mean.
+        """
+        times, values = self.window(start, end, agg)
+        return lttb(times, values, max_points)
+
+    def window(self, start, end, agg="mean"):
+        """Return ``(times, values)`` of every bucket in ``start <= t <= end`` at the chosen resolution."""
+        buckets = list(self._buckets_for(start, end))
+        # Buckets are sorted by start time; include the one that contains ``start``
+        starts = [bucket.start for bucket in buckets]
+        lo = max(bisect.bisect_right(starts, start) - 1, 0)
+        hi = bisect.bisect_right(starts, end)
+        return starts[lo:hi], [getattr(bucket, agg) for bucket in buckets[lo:hi]]
+
+    def _buckets_for(self, start, end):
+        steps = sorted(self.buckets)
+        for step in steps:
+            buckets = self.buckets[step]
+            # Usable if it reaches back to ``start`` or has never dropped a bucket
+            if len(buckets) < buckets.maxlen or buckets[0].start <= start:
+                return buckets
+        return self.buckets[steps[-1]]  # Nothing reaches back far enough; use the coarsest
+
+
+class MetricHistory:
+    """Rollups for several CSV columns, fed one row (dict) at a time.
+
+    Rows not newer than the last one added are skipped, so the same samples can arrive
+    from both the CSV file and the shared-memory ring without being counted twice.
+    With ``weight_column`` (the sample interval written by adaptive sampling) means are
+    time-weighted; rows without it have weight 1.
+
+    Safe to share between a sampler thread adding rows and request threads querying.
+    """
+
+    def __init__(self, columns, time_column="Timestamp", resolutions=None, weight_column=None):
+        self.time_column = time_column
+        self.weight_column = weight_column
+        self.rollups = {column: Rollup(resolutions) for column in columns}
+        self.last_time = None
+        self._lock = threading.Lock()
+
+    def add_row(self, row):
+        try:
+            timestamp = to_epoch(row[self.time_column])
+        except (KeyError, TypeError, ValueError):
+            return  # Unparseable timestamp; skip the row
+        weight = to_float(row.get(self.weight_column)) or 1.0
+        values = [(rollup, to_float(row.get(column))) for column, rollup in self.rollups.items()]
+        with self._lock:
+            if self.last_time is not None and timestamp <= self.last_time:
+                return
+            self.last_time = timestamp
+            for rollup, value in values:
+                rollup.add(timestamp, value, weight)
+
+    def add_points(self, column, points):
+        """Add ``(timestamp, value, weight)`` to one column's rollup (e.g. SegmentStore.weighted_points)."""
+        rollup = self.rollups[column]
+        for timestamp, value, weight in points:
+            with self._lock:
+                rollup.add(timestamp, value, weight)
+
+    def add_columns(self, data):
+        """Add samples given as one array per column (e.g. SharedRing views, epoch-second timestamps)."""
+        times = data[self.time_column]
+        with self._lock:
+            first = 0 if self.last_time is None else bisect.bisect_right(times, self.last_time)
+            if first == len(times):
+                return
+            columns = [(rollup, data[column][first:].tolist()) for column, rollup in self.rollups.items() if column in data]
+            if self.weight_column in data:
+                weights = [weight if weight > 0 else 1.0 for weight in data[self.weight_column][first:].tolist()]
+            else:
+                weights = [1.0] * (len(times) - first)
+            for i, timestamp in enumerate(times[first:].tolist()):
+                for rollup, values in columns:
+                    rollup.add(timestamp, values[i], weights[i])
+            self.last_time = float(times[-1])
+
+    def query(self, column, seconds, max_points=500, agg="mean"):
+        """Return ``(times, values)`` for the last ``seconds`` of ``column`` (ending at its newest sample)."""
+        rollup = self.rollups[column]
+        # Copy the buckets under the lock; downsampling happens outside it
+        with self._lock:
+            if rollup.last_time is None:
+                return [], []
+            times, values = rollup.window(rollup.last_time - seconds, rollup.last_time, agg)
+        return lttb(times, values, max_points)
+
+
+def to_epoch(value):
+    """Parse a CSV timestamp ("2025-01-31 12:00:00[.ffffff]") or datetime into epoch seconds."""
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def to_float(value):
+    """Parse a CSV reading; "N/A", empty or missing values become None."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def lttb(xs, ys, threshold):
+    """Largest-Triangle-Three-Buckets downsampling of ``(xs, ys)`` to ``threshold`` points.
+
+    The first and last points are always kept; from each bucket in between, the point
+    forming the largest triangle with its neighbours is chosen, so peaks survive.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(xs), list(ys)
+
+    out_x, out_y = [xs[0]], [ys[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        out_x.append(xs[best])
+        out_y.append(ys[best])
+        a = best
+
+    out_x.append(xs[-1])
+    out_y.append(ys[-1])
+    return out_x, out_y
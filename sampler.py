@@ -0,0 +1,129 @@
+import datetime
+import threading
+import time
+
+
+class RingBuffer:
+    """Fixed-size, preallocated store of samples. The oldest sample is overwritten when full."""
+
+    def __init__(self, fields, capacity=50):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._columns = {name: [None] * capacity for name in self.fields}
+        self._count = 0  # Total samples ever written (also used as a sequence number)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    @property
+    def count(self):
+        return self._count
+
+    def append(self, sample):
+        """Store one sample (a dict keyed by field name)."""
+        with self._lock:
+            index = self._count % self.capacity
+            for name in self.fields:
+                self._columns[name][index] = sample.get(name)
+            self._count += 1
+
+    def snapshot(self, n=None):
+        """Return the last ``n`` samples (default: all) as a dict of lists, oldest first."""
+        with self._lock:
+            return self._last(n)
+
+    def since(self, seq):
+        """Return ``(count, data)`` with the samples written after sequence number ``seq``.
+
+        ``count`` is the sequence number to pass next time. Samples that were already
+        overwritten are skipped, so at most ``capacity`` samples are returned.
+        """
+        with self._lock:
+            count = self._count
+            # A sequence number from the future means the buffer was recreated: resend everything
+            return count, self._last(count - seq if seq <= count else count)
+
+    def _last(self, n):
+        size = min(self._count, self.capacity)
+        n = size if n is None else min(n, size)
+        start = (self._count - n) % self.capacity
+        data = {}
+        for name, column in self._columns.items():
+            if start + n <= self.capacity:
+                data[name] = column[start:start + n]
+            else:
+                data[name] = column[start:] + column[:start + n - self.capacity]
+        return data
+
+    def latest(self):
+        """Return the most recent sample as a dict, or None if nothing was collected yet."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            index = (self._count - 1) % self.capacity
+            return {name: column[index] for name, column in self._columns.items()}
+
+
+class Sampler(threading.Thread):
+    """Background thread calling ``sample_fn`` on a fixed schedule and storing results in a RingBuffer.
+
+    ``sample_fn`` returns a dict of field values; a "Timestamp" is added if missing.
+    With a scheduler.AdaptiveRate each sample sets the interval until the next one;
+    while ``sample_fn`` runs, ``interval`` is the period the sample covers.
+    ``setup`` (e.g. starting a history backfill) runs on the thread before the first sample.
+    """
+
+    def __init__(self, sample_fn, buffer, interval=2.0, rate=None, setup=None):
+        super().__init__(daemon=True)
+        self.sample_fn = sample_fn
+        self.setup = setup
+        self.buffer = buffer
+        self.rate = rate
+        self.interval = interval if rate is None else rate.interval
+        self.missed_ticks = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        if self.setup is not None:
+            try:
+                self.setup()
+            except Exception as e:
+                print("Error in sampler setup:", e)
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                sample = self.sample_fn()
+            except Exception as e:
+                print("Error collecting sample:", e)
+            else:
+                sample.setdefault("Timestamp", datetime.datetime.now())
+                self.buffer.append(sample)
+                if self.rate is not None:
+                    self.interval = self.rate.observe(sample)
+
+            # Schedule against the original deadline so slow reads don't shift later samples
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                skipped = int(-delay // self.interval) + 1
+                self.missed_ticks += skipped
+                next_tick += skipped * self.interval
+                delay = next_tick - time.monotonic()
+            self._stop_event.wait(delay)
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+_start_lock = threading.Lock()
+
+
+def start_once(sampler):
+    """Start ``sampler`` unless it is already running. Safe to call from concurrent callbacks."""
+    with _start_lock:
+        if not sampler.is_alive() and not sampler._stop_event.is_set():
+            sampler.start()
+    return sampler
@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+
+ADAPTIVE = os.environ.get("MONITOR_ADAPTIVE", "0") == "1"
+
+
+class AdaptiveRate:
+    """Sampling interval that follows signal activity.
+
+    ``metrics`` maps the watched sample fields to their alert threshold (or None).
+    While any of them moved by ``change`` or more since the previous sample, or is
+    within ``margin`` of its threshold, the interval is ``fast``. After ``settle``
+    quiet samples in a row it doubles on each further quiet sample, up to ``slow``.
+    Missing readings ("N/A", None, NaN) are ignored.
+    """
+
+    def __init__(self, metrics, fast=1.0, slow=10.0, change=5.0, margin=10.0, settle=3):
+        self.metrics = dict(metrics)
+        self.fast = fast
+        self.slow = slow
+        self.change = change
+        self.margin = margin
+        self.settle = settle
+        self.interval = fast
+        self.quiet = 0
+        self._last = {}
+
+    @classmethod
+    def from_env(cls, metrics, **kwargs):
+        """An AdaptiveRate if MONITOR_ADAPTIVE=1 is set, otherwise None (fixed-rate sampling)."""
+        return cls(metrics, **kwargs) if ADAPTIVE else None
+
+    def active(self, values):
+        """True if any watched metric changed quickly or is close to its threshold."""
+        active = False
+        for name, threshold in self.metrics.items():
+            try:
+                value = float(values.get(name))
+            except (TypeError, ValueError):
+                continue
+            if value != value:
+                continue
+            previous = self._last.get(name)
+            self._last[name] = value
+            if previous is not None and abs(value - previous) >= self.change:
+                active = True
+            if threshold is not None and value >= threshold - self.margin:
+                active = True
+        return active
+
+    def observe(self, values):
+        """Update from one sample (dict of field values); returns the interval until the next sample."""
+        if self.active(values):
+            self.quiet = 0
+            self.interval = self.fast
+        else:
+            self.quiet += 1
+            if self.quiet >= self.settle:
+                self.interval = min(self.interval * 2, self.slow)
+        return self.interval
+
+
+class Job:
+    """A function run every ``period`` seconds by a Scheduler, with tick statistics."""
+
+    def __init__(self, func, period, count=None, name=None, start_after=0.0, late_after=0.1, rate=None):
+        self.func = func
+        self.period = period
+        self.rate = rate  # AdaptiveRate: ``period`` follows its interval after each run
+        self.start_after = start_after  # Delay of the first run after the scheduler starts
+        self.count = count  # Stop after this many runs (None = forever)
+        self.name = name or getattr(func, "__name__", "job")
+        self.late_after = late_after  # Fraction of the period after which a tick counts as late
+        self.next_deadline = None
+        self.runs = 0
+        self.late_ticks = 0
+        self.missed_ticks = 0
+        self.max_lateness = 0.0
+
+    @property
+    def done(self):
+        return self.count is not None and self.runs >= self.count
+
+    def stats(self):
+        return {"name": self.name, "period": self.period, "runs": self.runs,
+                "late_ticks": self.late_ticks, "missed_ticks": self.missed_ticks,
+                "max_lateness": self.max_lateness}
+
+
+class Scheduler:
+    """Run several jobs at fixed rates from one loop.
+
+    Deadlines are kept on a monotonic clock and advanced by exactly one period per
+    run, so time spent inside a job doesn't accumulate as drift. Each job is called
+    with the wall-clock time of its scheduled tick, to be used as the sample timestamp.
+    A job with an AdaptiveRate gets its next period from the rate after each run.
+    Ticks that start late are counted; ticks that are passed over entirely (because
+    a job overran) are skipped and counted as missed instead of being run in a burst.
+    """
+
+    def __init__(self):
+        self.jobs = []
+        self._stop_event = threading.Event()
+        self._mono_start = None
+        self._wall_start = None
+
+    def every(self, period, func, count=None, name=None, start_after=0.0, rate=None):
+        """Schedule ``func(timestamp)`` every ``period`` seconds (or as ``rate`` decides). Returns the Job."""
+        job = Job(func, period, count, name, start_after, rate=rate)
+        self.jobs.append(job)
+        return job
+
+    def run(self):
+        """Run until stop() is called or, if any job has a ``count``, until those jobs have finished."""
+        self._mono_start = time.monotonic()
+        self._wall_start = time.time()
+        for job in self.jobs:
+            job.next_deadline = self._mono_start + job.start_after
+        bounded = [job for job in self.jobs if job.count is not None]
+
+        while not self._stop_event.is_set():
+            pending = [job for job in self.jobs if not job.done]
+            if not pending or (bounded and all(job.done for job in bounded)):
+                break
+            job = min(pending, key=lambda j: j.next_deadline)
+
+            delay = job.next_deadline - time.monotonic()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+
+            lateness = time.monotonic() - job.next_deadline
+            job.max_lateness = max(job.max_lateness, lateness)
+            if lateness > job.period * job.late_after:
+                job.late_ticks += 1
+
+            try:
+                job.func(self._wall_start + (job.next_deadline - self._mono_start))
+            except Exception as e:
+                print(f"Error in scheduled job {job.name}:", e)
+            job.runs += 1
+
+            if job.rate is not None:
+                job.period = job.rate.interval
+            job.next_deadline += job.period
+            behind = time.monotonic() - job.next_deadline
+            if behind > 0:
+                skipped = int(behind // job.period) + 1
+                job.missed_ticks += skipped
+                job.next_deadline += skipped * job.period
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self):
+        return [job.stats() for job in self.jobs]
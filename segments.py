@@ -0,0 +1,367 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from metric_writer import reserve_path, rotate_file
+from rollup import to_epoch
+
+# Closed CSV files are compacted into one segment file each: a small JSON header followed
+# by one zlib-compressed block per column. Timestamps are stored as delta-encoded integer
+# milliseconds, numeric columns as float64 (NaN for N/A), anything else as a JSON list.
+# NumPy is imported inside the functions that need it, so a collector that only rotates its
+# CSV doesn't load it until there is something to compact or query.
+MAGIC = b"MSEG1\n"
+LENGTH = struct.Struct("<I")
+MISSING = {"", "N/A", "None", "nan", "NaN"}
+# Seconds covered by each row (dd.py, Analysis.py); averages over rows are weighted by it
+INTERVAL_COLUMNS = ("Sample Interval (s)", "Sample_Interval")
+
+
+def write_segment(path, timestamps, columns):
+    """Write ``timestamps`` (epoch seconds) and ``columns`` ({name: values}) to a segment file."""
+    import numpy as np
+
+    blobs = []
+    header = {"rows": len(timestamps), "columns": []}
+    millis = np.round(np.asarray(timestamps, dtype=float) * 1000).astype("<i8")
+    parts = [("Timestamp", "time", np.diff(millis, prepend=0).tobytes())]
+    for name, values in columns.items():
+        if isinstance(values, np.ndarray):
+            parts.append((name, "f8", values.astype("<f8").tobytes()))
+        else:
+            parts.append((name, "json", json.dumps(values, separators=(",", ":")).encode()))
+
+    offset = 0
+    for name, kind, raw in parts:
+        blob = zlib.compress(raw, 6)
+        header["columns"].append({"name": name, "type": kind, "offset": offset, "length": len(blob)})
+        blobs.append(blob)
+        offset += len(blob)
+
+    header_bytes = json.dumps(header).encode()
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC + LENGTH.pack(len(header_bytes)) + header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(path + ".tmp", path)
+
+
+def read_segment(path, columns=None):
+    """Read a segment file; returns ``{name: array or list}`` for ``columns`` (default: all) plus "Timestamp"."""
+    import numpy as np
+
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a segment file")
+        (header_length,) = LENGTH.unpack(f.read(LENGTH.size))
+        header = json.loads(f.read(header_length))
+        base = f.tell()
+        data = {}
+        for column in header["columns"]:
+            name, kind = column["name"], column["type"]
+            if columns is not None and name != "Timestamp" and name not in columns:
+                continue  # Only the requested columns are read and decompressed
+            f.seek(base + column["offset"])
+            raw = zlib.decompress(f.read(column["length"]))
+            if kind == "time":
+                data[name] = np.cumsum(np.frombuffer(raw, dtype="<i8")) / 1000.0
+            elif kind == "f8":
+                data[name] = np.frombuffer(raw, dtype="<f8")
+            else:
+                data[name] = json.loads(raw)
+    return data
+
+
+def read_csv_columns(path):
+    """Parse a time-ordered CSV (first column = timestamp) into timestamps and per-column values.
+
+    Columns whose values are all numbers or missing become float arrays (NaN for
+    missing); others are kept as lists of strings. Rows with a bad timestamp are dropped.
+    """
+    import numpy as np
+
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return None, [], {}
+        timestamps = []
+        raw = [[] for _ in header[1:]]
+        for values in reader:
+            if not values:
+                continue
+            try:
+                timestamp = to_epoch(values[0])
+            except ValueError:
+                continue
+            timestamps.append(timestamp)
+            for i, column in enumerate(raw, start=1):
+                column.append(values[i] if i < len(values) else "")
+
+    columns = {}
+    for name, values in zip(header[1:], raw):
+        try:
+            columns[name] = np.array([np.nan if value in MISSING else float(value) for value in values])
+        except ValueError:
+            columns[name] = values
+    return header, timestamps, columns
+
+
+class SegmentStore:
+    """Time-bounded, compressed history of one metrics CSV.
+
+    The live CSV is the open segment. When MetricWriter rotates it (see ``max_bytes`` /
+    ``max_age``), the closed file is compacted into ``<name>.segments/`` and recorded in
+    ``manifest.json`` with its time range, row count and per-column min/max, so queries
+    open only the segments that can match.
+
+    Retention: segments older than ``raw_for`` seconds are downsampled to ``downsample_to``
+    second means (numeric-only segments; time-weighted when rows record their sample interval,
+    which becomes the seconds covered by each bucket), and segments older than ``keep_for`` are deleted.
+    """
+
+    def __init__(self, csv_file, directory=None, raw_for=7 * 86400, downsample_to=60, keep_for=90 * 86400):
+        self.csv_file = csv_file
+        self.directory = directory or os.path.splitext(csv_file)[0] + ".segments"
+        self.raw_for = raw_for
+        self.downsample_to = downsample_to
+        self.keep_for = keep_for
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self.manifest = self._load_manifest()
+        self._manifest_mtime = None
+
+    # Manifest
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"source": os.path.basename(self.csv_file), "columns": None, "segments": []}
+
+    def _save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.manifest["segments"].sort(key=lambda entry: entry["start"])
+        path = self._manifest_path()
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def reload(self):
+        """Re-read the manifest if another process (the writer's) has changed it."""
+        try:
+            mtime = os.stat(self._manifest_path()).st_mtime_ns
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if mtime != self._manifest_mtime:
+                self.manifest = self._load_manifest()
+                self._manifest_mtime = mtime
+
+    @property
+    def columns(self):
+        """Every column seen in any segment (each entry's ``columns`` is the header of its own CSV)."""
+        return self.manifest["columns"]
+
+    def entries(self):
+        """A snapshot of the manifest's segment entries, safe to iterate while compaction runs."""
+        with self._lock:
+            return list(self.manifest["segments"])
+
+    # Compaction
+
+    def pending(self):
+        """Rotated CSV files waiting to be compacted, oldest first."""
+        return sorted(glob.glob(glob.escape(self.csv_file) + ".*.rotated"))
+
+    def compact(self, path):
+        """Turn one closed CSV file into a segment and delete the CSV."""
+        if not os.path.exists(path):
+            return  # Already compacted
+        header, timestamps, columns = read_csv_columns(path)
+        with self._lock:
+            if timestamps:
+                self._add_segment(timestamps, columns, resolution=0, header=header)
+                known = self.manifest["columns"] or []
+                self.manifest["columns"] = known + [column for column in header if column not in known]
+                self._save_manifest()
+            os.remove(path)
+
+    def compact_pending(self):
+        """Compact every rotated file, then apply retention. Safe to call at start-up to finish interrupted work."""
+        with self._compact_lock:
+            for path in self.pending():
+                self.compact(path)
+            self.apply_retention()
+
+    def compact_in_background(self, rotated_path=None):
+        """MetricWriter ``on_rotate`` hook: compact off the writer's thread."""
+        thread = threading.Thread(target=self.compact_pending, daemon=True)
+        thread.start()
+        return thread
+
+    def _add_segment(self, timestamps, columns, resolution, header=None):
+        import numpy as np
+
+        order = np.argsort(timestamps, kind="stable")
+        timestamps = np.asarray(timestamps)[order]
+        columns = {name: values[order] if isinstance(values, np.ndarray) else [values[i] for i in order]
+                   for name, values in columns.items()}
+        start, end = float(timestamps[0]), float(timestamps[-1])
+        os.makedirs(self.directory, exist_ok=True)
+        # Named by start time plus a counter: downsampled segments share minute-aligned starts
+        stem = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(start))}-{int(start * 1000) % 1000:03d}-r{resolution}"
+        path = reserve_path(os.path.join(self.directory, stem), ".seg")
+        try:
+            write_segment(path, timestamps, columns)
+        except BaseException:
+            os.remove(path)
+            raise
+        name = os.path.basename(path)
+
+        stats = {}
+        for column, values in columns.items():
+            if isinstance(values, np.ndarray) and not np.all(np.isnan(values)):
+                stats[column] = {"min": float(np.nanmin(values)), "max": float(np.nanmax(values))}
+        entry = {"file": name, "start": start, "end": end, "rows": len(timestamps), "resolution": resolution,
+                 "bytes": os.path.getsize(os.path.join(self.directory, name)), "stats": stats,
+                 "columns": header or ["Timestamp", *columns]}
+        self.manifest["segments"].append(entry)
+        return entry
+
+    # Retention
+
+    def apply_retention(self, now=None):
+        """Downsample segments older than ``raw_for`` and delete those older than ``keep_for``."""
+        now = time.time() if now is None else now
+        with self._lock:
+            changed = False
+            for entry in list(self.manifest["segments"]):
+                age = now - entry["end"]
+                if self.keep_for is not None and age > self.keep_for:
+                    self._remove(entry)
+                    changed = True
+                elif (self.raw_for is not None and self.downsample_to and age > self.raw_for
+                      and entry["resolution"] < self.downsample_to):
+                    changed |= self._downsample(entry)
+            if changed:
+                self._save_manifest()
+
+    def _downsample(self, entry):
+        import numpy as np
+
+        data = read_segment(os.path.join(self.directory, entry["file"]))
+        timestamps = data.pop("Timestamp")
+        if not all(isinstance(values, np.ndarray) for values in data.values()):
+            return False  # Text columns (e.g. host/metric in long format) can't be averaged
+        step = self.downsample_to
+        buckets, inverse = np.unique(timestamps // step, return_inverse=True)
+        interval = next((name for name in INTERVAL_COLUMNS if name in data), None)
+        weights = np.ones(len(timestamps)) if interval is None else data[interval]
+        weights = np.where(weights > 0, weights, 1.0)  # NaN / missing intervals count as one sample
+        columns = {}
+        for name, values in data.items():
+            valid = ~np.isnan(values)
+            if name == interval:
+                columns[name] = np.bincount(inverse, weights=np.where(valid, values, 0.0), minlength=len(buckets))
+                continue
+            sums = np.bincount(inverse, weights=np.where(valid, values * weights, 0.0), minlength=len(buckets))
+            counts = np.bincount(inverse, weights=valid * weights, minlength=len(buckets))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                columns[name] = np.where(counts > 0, sums / counts, np.nan)
+        self._remove(entry)
+        self._add_segment(buckets * step, columns, resolution=step, header=entry.get("columns"))
+        return True
+
+    def _remove(self, entry):
+        self.manifest["segments"].remove(entry)
+        try:
+            os.remove(os.path.join(self.directory, entry["file"]))
+        except FileNotFoundError:
+            pass
+
+    # Queries
+
+    def segments(self, start, end, column=None, above=None, below=None):
+        """Manifest entries overlapping ``[start, end]``; with ``column``, also skip segments
+        whose min/max show no value above ``above`` / below ``below``."""
+        selected = []
+        for entry in self.entries():
+            if entry["end"] < start or entry["start"] > end:
+                continue
+            if column is not None:
+                stats = entry["stats"].get(column)
+                if stats is None and (above is not None or below is not None):
+                    continue
+                if above is not None and stats["max"] <= above:
+                    continue
+                if below is not None and stats["min"] >= below:
+                    continue
+            selected.append(entry)
+        return selected
+
+    def points(self, column, start, end, above=None, below=None):
+        """Yield ``(timestamp, value)`` for a numeric ``column`` in time order, skipping missing values."""
+        import numpy as np
+
+        for entry in self.segments(start, end, column, above, below):
+            try:
+                data = read_segment(os.path.join(self.directory, entry["file"]), [column])
+            except FileNotFoundError:
+                continue  # Removed by retention since the snapshot
+            timestamps, values = data["Timestamp"], data.get(column)
+            if not isinstance(values, np.ndarray):
+                continue
+            keep = (timestamps >= start) & (timestamps <= end) & ~np.isnan(values)
+            yield from zip(timestamps[keep].tolist(), values[keep].tolist())
+
+    def weighted_points(self, column, start, end):
+        """Yield ``(timestamp, value, weight)`` like points(); the weight is the row's sample interval
+        (seconds covered, summed per bucket in downsampled segments), 1 where none was recorded."""
+        import numpy as np
+
+        for entry in self.segments(start, end, column):
+            try:
+                data = read_segment(os.path.join(self.directory, entry["file"]), [column, *INTERVAL_COLUMNS])
+            except FileNotFoundError:
+                continue  # Removed by retention since the snapshot
+            timestamps, values = data["Timestamp"], data.get(column)
+            if not isinstance(values, np.ndarray):
+                continue
+            interval = next((data[name] for name in INTERVAL_COLUMNS if isinstance(data.get(name), np.ndarray)), None)
+            weights = np.ones(len(timestamps)) if interval is None else np.where(interval > 0, interval, 1.0)
+            keep = (timestamps >= start) & (timestamps <= end) & ~np.isnan(values)
+            yield from zip(timestamps[keep].tolist(), values[keep].tolist(), weights[keep].tolist())
+
+    def summary(self):
+        segments = self.entries()
+        return {"segments": len(segments), "rows": sum(entry["rows"] for entry in segments),
+                "bytes": sum(entry["bytes"] for entry in segments),
+                "start": segments[0]["start"] if segments else None, "end": segments[-1]["end"] if segments else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact rotated metric CSVs into segments and apply retention.")
+    parser.add_argument("csv_file", nargs="?", default="system_monitor.csv")
+    parser.add_argument("--rotate", action="store_true", help="also rotate the live CSV now (stop its writer first)")
+    args = parser.parse_args()
+
+    store = SegmentStore(args.csv_file)
+    if args.rotate and os.path.exists(args.csv_file):
+        rotate_file(args.csv_file)
+    store.compact_pending()
+    print(json.dumps(store.summary(), indent=1))
+
+
+if __name__ == "__main__":
+    main()
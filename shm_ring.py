@@ -0,0 +1,187 @@
+import atexit
+import datetime
+import json
+import math
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import psutil
+
+# Header words (uint64): magic, capacity, column count, sequence, closed flag, writer pid,
+# length of the JSON column names. The names follow in a fixed-size block, then the data.
+MAGIC = 0x31474E49524D  # "MRING1"
+HEADER_WORDS = 8
+NAMES_SIZE = 4096
+DATA_OFFSET = HEADER_WORDS * 8 + NAMES_SIZE
+SEQ, CLOSED, PID, NAMES = 3, 4, 5, 6
+
+_created = set()  # Rings this process writes (its resource tracker already knows them)
+
+
+def _number(value):
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan  # "N/A", None
+
+
+def _attach(name):
+    """Open an existing segment without letting this process's resource tracker unlink it at exit."""
+    try:
+        return shared_memory.SharedMemory(name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        if name not in _created:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedRing:
+    """Fixed-layout ring of float64 columns in shared memory: one writer process, any number of local readers.
+
+    Every sample is written to slot ``i`` and ``i + capacity`` of each column, so the last
+    ``n`` samples are always one contiguous slice and readers get NumPy views, not copies.
+    Timestamps are stored as epoch seconds and missing readings as NaN.
+
+    The sequence word is a seqlock: odd while the writer is storing a sample, otherwise
+    twice the number of samples written. A reader's window never includes the slot being
+    written; a view of ``n`` samples stays intact until ``capacity - n`` more samples are
+    written, which ``intact()`` checks (``snapshot()`` copies and retries if needed).
+    Ordering relies on stores becoming visible in program order, as on x86.
+    """
+
+    def __init__(self, shm, owner=False):
+        self._shm = shm
+        self.owner = owner
+        self.name = shm.name
+        self._header = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+        if self._header[0] != MAGIC:
+            raise ValueError(f"{shm.name} is not a metrics ring")
+        self.capacity = int(self._header[1])
+        names = bytes(shm.buf[HEADER_WORDS * 8:HEADER_WORDS * 8 + int(self._header[NAMES])])
+        self.fields = tuple(json.loads(names))
+        self._data = np.ndarray((len(self.fields), 2 * self.capacity), dtype=np.float64,
+                                buffer=shm.buf, offset=DATA_OFFSET)
+        self._columns = dict(zip(self.fields, self._data))
+
+    @classmethod
+    def create(cls, name, fields, capacity=3600):
+        """Create the ring as its writer; a segment left behind by a crashed writer is replaced."""
+        names = json.dumps(list(fields)).encode()
+        if len(names) > NAMES_SIZE:
+            raise ValueError("too many or too long field names for the ring header")
+        size = DATA_OFFSET + len(fields) * 2 * capacity * 8
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        header = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+        header[1:] = [capacity, len(fields), 0, 0, os.getpid(), len(names), 0]
+        shm.buf[HEADER_WORDS * 8:HEADER_WORDS * 8 + len(names)] = names
+        header[0] = MAGIC  # Last, so a reader never sees a half-initialised ring
+        del header
+        _created.add(name)
+        ring = cls(shm, owner=True)
+        atexit.register(ring.close)
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """Open a ring for reading. Returns None if no writer has created it."""
+        try:
+            shm = _attach(name)
+        except FileNotFoundError:
+            return None
+        try:
+            return cls(shm)
+        except ValueError:
+            shm.close()
+            return None
+
+    @property
+    def count(self):
+        """Samples written so far (the sequence number to pass to ``since``)."""
+        return int(self._header[SEQ]) // 2
+
+    @property
+    def alive(self):
+        """False once the writer has closed the ring or its process is gone."""
+        return not self._header[CLOSED] and psutil.pid_exists(int(self._header[PID]))
+
+    def append(self, sample):
+        """Write one sample (dict keyed by field name). Writer only."""
+        seq = int(self._header[SEQ])
+        slot = (seq // 2) % self.capacity
+        self._header[SEQ] = seq + 1
+        for name, column in self._columns.items():
+            column[slot] = column[slot + self.capacity] = _number(sample.get(name))
+        self._header[SEQ] = seq + 2
+
+    def window(self, n=None):
+        """Return ``(count, {field: view})`` with the last ``n`` samples (at most ``capacity - 1``), oldest first."""
+        count = self.count
+        n = min(count, self.capacity - 1, self.capacity - 1 if n is None else n)
+        end = (count - 1) % self.capacity + 1 + self.capacity
+        return count, {name: column[end - n:end] for name, column in self._columns.items()}
+
+    def since(self, seq):
+        """Return ``(count, {field: view})`` with the samples written after sequence number ``seq``."""
+        count = self.count
+        return self.window(count - seq if seq <= count else count)
+
+    def intact(self, count, n):
+        """True if a window of ``n`` samples read at ``count`` hasn't been overwritten since."""
+        return int(self._header[SEQ]) <= 2 * (count - n + self.capacity)
+
+    def snapshot(self, n=None):
+        """Like ``window`` but returns copies, retrying if the writer overwrote them while copying."""
+        while True:
+            count, views = self.window(n)
+            data = {name: view.copy() for name, view in views.items()}
+            if self.intact(count, len(data[self.fields[0]])):
+                return count, data
+
+    def close(self):
+        """Detach; the writer also marks the ring closed and removes it."""
+        if self._shm is None:
+            return
+        if self.owner:
+            self._header[CLOSED] = 1
+        self._header = self._data = self._columns = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # A caller still holds views; the mapping goes away with the process
+        if self.owner:
+            self._shm.unlink()
+            _created.discard(self.name)
+        self._shm = None
+
+
+class RingFollower:
+    """Viewer side of a SharedRing: new samples on each poll, re-attaching after the writer restarts."""
+
+    def __init__(self, name):
+        self.name = name
+        self.ring = None
+        self.seq = 0
+
+    def poll(self):
+        """Return ``{field: view}`` of the samples written since the last poll, or None if no writer is publishing."""
+        if self.ring is not None and not self.ring.alive:
+            self.ring.close()
+            self.ring = None
+        if self.ring is None:
+            self.ring = SharedRing.attach(self.name)
+            self.seq = 0
+            if self.ring is None:
+                return None
+        self.seq, data = self.ring.since(self.seq)
+        return data
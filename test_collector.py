@@ -0,0 +1,118 @@
+import asyncio
+import csv
+import json
+import zlib
+
+from agent import HEADER, Agent, decode_batch, encode_batch
+from collector import MAX_FRAME, Collector
+
+# The agent -> collector wire format and the collector's per-host bookkeeping (run with: python -m pytest)
+
+SAMPLES = [[1700000000.0, {"cpu": 12.5, "memory": 40.0}], [1700000001.0, {"cpu": 13.0, "memory": None}]]
+
+
+def raw_batch(batch):
+    return zlib.compress(json.dumps(batch).encode())
+
+
+def test_batch_round_trip():
+    assert decode_batch(encode_batch("web-1", 1.5, 7, SAMPLES)) == {"host": "web-1", "boot": 1.5, "seq": 7,
+                                                                      "samples": SAMPLES}
+
+
+def test_ingest_keeps_samples_per_host():
+    received = []
+    collector = Collector(on_samples=lambda host, samples: received.append((host, samples)))
+    assert collector.ingest(encode_batch("web-1", 1, 0, SAMPLES))
+    state = collector.hosts["web-1"]
+    assert list(state.samples) == [tuple(sample) for sample in SAMPLES]
+    assert state.received == 2
+    assert (collector.batches, collector.samples) == (1, 2)
+    assert received == [("web-1", [tuple(sample) for sample in SAMPLES])]
+
+
+def test_sequence_gaps_duplicates_and_restarts():
+    collector = Collector()
+    assert collector.ingest(encode_batch("web-1", 1, 0, SAMPLES[:1]))
+    assert collector.ingest(encode_batch("web-1", 1, 3, SAMPLES[:1]))  # 1 and 2 were lost
+    assert not collector.ingest(encode_batch("web-1", 1, 3, SAMPLES[:1]))  # Resent
+    state = collector.hosts["web-1"]
+    assert (state.lost_batches, state.duplicate_batches, state.last_seq) == (2, 1, 3)
+    assert collector.ingest(encode_batch("web-1", 2, 0, SAMPLES[:1]))  # Restarted agent starts over at 0
+    assert (state.boot, state.last_seq, state.lost_batches) == (2, 0, 2)
+
+
+def test_bad_batches_leave_host_state_alone():
+    collector = Collector()
+    collector.ingest(encode_batch("web-1", 1, 0, SAMPLES))
+    bad = [b"not zlib",
+           zlib.compress(b"not json"),
+           raw_batch({"host": "web-1", "boot": 1}),  # No seq / samples
+           raw_batch({"host": "web-1", "boot": 1, "seq": 5, "samples": [1, 2]}),
+           raw_batch({"host": "web-1", "boot": 1, "seq": 5, "samples": [[1.0, [1, 2]]]}),
+           raw_batch({"host": "web-1", "boot": 1, "seq": "5", "samples": []}),
+           raw_batch({"host": ["web-1"], "boot": 1, "seq": 5, "samples": []})]
+    for payload in bad:
+        assert not collector.ingest(payload)
+    state = collector.hosts["web-1"]
+    assert collector.bad_batches == len(bad)
+    assert (state.last_seq, state.lost_batches, state.received) == (0, 0, 2)
+
+
+def test_long_format_csv(tmp_path):
+    path = str(tmp_path / "fleet.csv")
+    collector = Collector(csv_file=path)
+    collector.ingest(encode_batch("web-1", 1, 0, SAMPLES))
+    collector.writer.close()
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["Timestamp", "Host", "Metric", "Value"]
+    assert [row[1:] for row in rows[1:]] == [["web-1", "cpu", "12.5"], ["web-1", "memory", "40.0"],
+                                             ["web-1", "cpu", "13.0"], ["web-1", "memory", "N/A"]]
+
+
+async def _serve(collector):
+    return await asyncio.start_server(collector.handle_tcp, "127.0.0.1", 0)
+
+
+def test_agent_to_collector_over_tcp():
+    async def main():
+        collector = Collector()
+        server = await _serve(collector)
+        port = server.sockets[0].getsockname()[1]
+        readings = iter(range(100))
+        agent = Agent("web-1", ("127.0.0.1", port), lambda: {"cpu": float(next(readings))}, interval=0.001,
+                      batch_size=4)
+        await agent.run(count=10)  # Batches of 4, 4 and 2
+        for _ in range(100):
+            if collector.samples == 10:
+                break
+            await asyncio.sleep(0.01)
+        server.close()
+        await server.wait_closed()
+        return collector
+
+    collector = asyncio.run(main())
+    state = collector.hosts["web-1"]
+    assert [sample["cpu"] for timestamp, sample in state.samples] == [float(i) for i in range(10)]
+    assert (collector.batches, state.last_seq, state.lost_batches) == (3, 2, 0)
+
+
+def test_oversized_frame_closes_the_connection():
+    async def main():
+        collector = Collector()
+        server = await _serve(collector)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(HEADER.pack(MAX_FRAME + 1))
+        await writer.drain()
+        closed = await asyncio.wait_for(reader.read(), timeout=5)  # EOF once the collector hangs up
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return collector, closed
+
+    collector, closed = asyncio.run(main())
+    assert closed == b""
+    assert collector.bad_batches == 1
+    assert not collector.hosts
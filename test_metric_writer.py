@@ -0,0 +1,106 @@
+import csv
+import glob
+import os
+
+import pytest
+
+from metric_writer import FSYNC_BATCH, MetricWriter, reserve_path, rotate_file
+
+# MetricWriter batching, rotation and schema changes (run with: python -m pytest)
+
+HEADER = ["Timestamp", "CPU Usage (%)"]
+
+
+def rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.reader(f))
+
+
+def rotated(path):
+    return sorted(glob.glob(glob.escape(path) + ".*.rotated"))
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    path = str(tmp_path / "m.csv")
+    writer = MetricWriter(path, HEADER, batch_size=3, flush_interval=3600)
+    writer.write(["t1", 1])
+    writer.write(["t2", 2])
+    assert rows(path) == [HEADER]  # Pending until the batch is full
+    writer.write(["t3", 3])
+    assert rows(path) == [HEADER, ["t1", "1"], ["t2", "2"], ["t3", "3"]]
+    writer.write(["t4", 4])
+    writer.close()  # Flushes what is pending
+    assert rows(path)[-1] == ["t4", "4"]
+
+
+def test_flush_interval_writes_a_partial_batch(tmp_path):
+    path = str(tmp_path / "m.csv")
+    with MetricWriter(path, HEADER, batch_size=100, flush_interval=0) as writer:
+        writer.write(["t1", 1])
+        assert rows(path) == [HEADER, ["t1", "1"]]
+
+
+def test_existing_file_is_appended_without_a_second_header(tmp_path):
+    path = str(tmp_path / "m.csv")
+    with MetricWriter(path, HEADER, durability=FSYNC_BATCH) as writer:
+        writer.write(["t1", 1])
+    with MetricWriter(path, HEADER) as writer:
+        writer.write(["t2", 2])
+    assert rows(path) == [HEADER, ["t1", "1"], ["t2", "2"]]
+    assert rotated(path) == []
+
+
+def test_closed_writer_rejects_rows(tmp_path):
+    writer = MetricWriter(str(tmp_path / "m.csv"), HEADER)
+    writer.close()
+    writer.close()  # Idempotent
+    with pytest.raises(ValueError):
+        writer.write(["t1", 1])
+
+
+def test_unknown_durability_policy(tmp_path):
+    with pytest.raises(ValueError):
+        MetricWriter(str(tmp_path / "m.csv"), HEADER, durability="sometimes")
+
+
+def test_size_rotation_hands_every_file_over(tmp_path):
+    path = str(tmp_path / "m.csv")
+    handed = []
+    with MetricWriter(path, HEADER, batch_size=1, max_bytes=1, on_rotate=handed.append) as writer:
+        for i in range(3):
+            writer.write([f"t{i}", i])
+    # Three rotations within the same second still get three distinct files
+    assert handed == rotated(path)
+    assert [rows(file)[1:] for file in handed] == [[["t0", "0"]], [["t1", "1"]], [["t2", "2"]]]
+    assert rows(path) == [HEADER]  # The live file starts over with the header
+
+
+def test_stale_header_is_rotated_on_open(tmp_path):
+    path = str(tmp_path / "m.csv")
+    with open(path, "w") as f:
+        f.write("Timestamp,Old\nt0,0\n")
+    handed = []
+    with MetricWriter(path, HEADER + ["Sample Interval (s)"], batch_size=1, on_rotate=handed.append) as writer:
+        writer.write(["t1", 1, 2.0])
+    assert len(handed) == 1
+    assert rows(handed[0]) == [["Timestamp", "Old"], ["t0", "0"]]
+    assert rows(path) == [HEADER + ["Sample Interval (s)"], ["t1", "1", "2.0"]]
+
+
+def test_rotate_file_never_overwrites(tmp_path):
+    path = str(tmp_path / "m.csv")
+    names = []
+    for content in ("a", "b"):
+        with open(path, "w") as f:
+            f.write(content)
+        names.append(rotate_file(path))
+    assert len(set(names)) == 2
+    assert [open(name).read() for name in names] == ["a", "b"]
+    assert not os.path.exists(path)
+
+
+def test_reserve_path_is_unique(tmp_path):
+    stem = str(tmp_path / "segment")
+    first, second = reserve_path(stem, ".seg"), reserve_path(stem, ".seg")
+    assert first != second
+    assert os.path.exists(first) and os.path.exists(second)
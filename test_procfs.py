@@ -0,0 +1,190 @@
+import collections
+import os
+import types
+
+import psutil
+import pytest
+
+import collectors
+import procfs
+
+# procfs.py parsing and sensor discovery against small fixture trees (run with: python -m pytest)
+
+STAT = """cpu  300 15 150 3000 60 9 6 21 0 0
+cpu0 100 5 50 1000 20 3 2 7 9 9
+cpu1 200 10 100 2000 40 6 4 14 0 0
+intr 123456 0 0 0
+ctxt 987654
+"""
+MEMINFO = "MemTotal:        8000000 kB\nMemFree:         1000000 kB\nMemAvailable:    6000000 kB\n"
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def hwmon(root, index, name, temps, device=False):
+    """Add ``/sys/class/hwmon/hwmon<index>`` (attributes under device/ like older kernels with ``device``)."""
+    base = os.path.join(root, "sys", "class", "hwmon", f"hwmon{index}")
+    if device:
+        base = os.path.join(base, "device")
+    write(os.path.join(base, "name"), name + "\n")
+    for sensor, millidegrees in temps.items():
+        write(os.path.join(base, f"temp{sensor}_input"), f"{millidegrees}\n")
+
+
+def thermal_zone(root, index, kind, millidegrees):
+    base = os.path.join(root, "sys", "class", "thermal", f"thermal_zone{index}")
+    write(os.path.join(base, "type"), kind + "\n")
+    write(os.path.join(base, "temp"), f"{millidegrees}\n")
+
+
+@pytest.fixture
+def root(tmp_path):
+    write(os.path.join(tmp_path, "proc", "stat"), STAT)
+    write(os.path.join(tmp_path, "proc", "meminfo"), MEMINFO)
+    return str(tmp_path)
+
+
+@pytest.fixture
+def opened():
+    """ProcFS instances opened by a test, closed afterwards."""
+    instances = []
+
+    def open_root(path):
+        instances.append(procfs.ProcFS(path))
+        return instances[-1]
+
+    yield open_root
+    for instance in instances:
+        instance.close()
+
+
+def test_cpu_times_per_core(root, opened):
+    # busy = user + nice + system + irq + softirq + steal; total adds idle and iowait (guest is in user/nice)
+    assert opened(root).cpu_times() == [(167, 1187), (334, 2374)]
+
+
+def test_cpu_times_rereads_and_grows_buffer(root, opened):
+    fs = opened(root)
+    fs._stat.buffer = bytearray(16)  # Smaller than the file: read() has to grow it
+    assert fs.cpu_times() == [(167, 1187), (334, 2374)]
+    lines = ["cpu  0 0 0 0 0 0 0 0 0 0\n"] + [f"cpu{i} {i} 0 0 10 0 0 0 0 0 0\n" for i in range(100)]
+    with open(os.path.join(root, "proc", "stat"), "w") as f:
+        f.write("".join(lines) + "intr 1\n")
+    cores = fs.cpu_times()
+    assert len(cores) == 100
+    assert cores[42] == (42, 52)
+
+
+def test_memory_percent(root, opened):
+    assert opened(root).memory_percent() == 25.0
+
+
+def test_memory_percent_without_memavailable(root, opened):
+    write(os.path.join(root, "proc", "meminfo"), "MemTotal:        8000000 kB\nMemFree:         1000000 kB\n")
+    assert opened(root).memory_percent() is None
+
+
+def test_no_temperature_sensor(root, opened):
+    hwmon(root, 0, "nvme", {1: 45000})
+    fs = opened(root)
+    assert fs.temperature_path is None
+    assert fs.cpu_temperature() is None
+
+
+def test_coretemp_preferred_over_k10temp_and_thermal_zones(root, opened):
+    thermal_zone(root, 0, "x86_pkg_temp", 70000)
+    hwmon(root, 0, "k10temp", {1: 60000})
+    hwmon(root, 1, "nvme", {1: 45000})
+    hwmon(root, 2, "coretemp", {1: 52500, 2: 50000})
+    assert opened(root).cpu_temperature() == 52.5
+
+
+def test_k10temp_preferred_over_thermal_zones(root, opened):
+    thermal_zone(root, 0, "x86_pkg_temp", 70000)
+    hwmon(root, 0, "k10temp", {1: 61000})
+    assert opened(root).cpu_temperature() == 61.0
+
+
+def test_lowest_numbered_input_is_used(root, opened):
+    hwmon(root, 0, "coretemp", {10: 90000, 2: 55000, 3: 60000})
+    assert opened(root).temperature_path.endswith("temp2_input")
+
+
+def test_hwmon_device_layout(root, opened):
+    hwmon(root, 0, "coretemp", {1: 48000}, device=True)
+    fs = opened(root)
+    assert fs.temperature_path.endswith(os.path.join("device", "temp1_input"))
+    assert fs.cpu_temperature() == 48.0
+
+
+def test_thermal_zone_types_in_preference_order(root, opened):
+    thermal_zone(root, 0, "acpitz", 30000)
+    thermal_zone(root, 1, "x86_pkg_temp", 65000)
+    thermal_zone(root, 2, "cpu-thermal", 47000)
+    assert opened(root).cpu_temperature() == 47.0
+
+
+def test_negative_temperature(root, opened):
+    thermal_zone(root, 0, "cpu-thermal", -5500)
+    assert opened(root).cpu_temperature() == -5.5
+
+
+def test_temperature_is_reread(root, opened):
+    hwmon(root, 0, "coretemp", {1: 40000})
+    fs = opened(root)
+    assert fs.cpu_temperature() == 40.0
+    hwmon(root, 0, "coretemp", {1: 75000})
+    assert fs.cpu_temperature() == 75.0
+
+
+@pytest.fixture
+def backend_root(monkeypatch):
+    """Point procfs.backend() at a chosen root; the cached backend is dropped before and after."""
+    def use(path):
+        monkeypatch.setattr(procfs, "ROOT", path)
+        monkeypatch.setattr(procfs, "ENABLED", True)
+        monkeypatch.setattr(procfs, "_backend", None)
+
+    yield use
+    if procfs._backend is not None:
+        procfs._backend.close()
+    procfs._backend = None
+
+
+def test_collectors_use_procfs_backend(root, backend_root):
+    backend_root(root)
+    hwmon(root, 0, "coretemp", {1: 44000})
+    sensors = collectors.CollectorSet(["cpu", "memory", "temperature"])
+    write(os.path.join(root, "proc", "stat"), STAT.replace("cpu0 100 ", "cpu0 1287 ").replace("cpu1 200 10 100 2000", "cpu1 200 10 100 3187"))
+    record = sensors.collect()
+    assert (record.cpu0, record.cpu1) == (100.0, 0.0)  # cpu0 only busy, cpu1 only idle
+    assert record.cpu == 50.0
+    assert record.memory == 25.0
+    assert record.cpu_temp == 44.0
+
+
+def test_backend_disabled_without_procfs(tmp_path, backend_root):
+    backend_root(str(tmp_path))
+    assert procfs.backend() is None
+    assert procfs.ENABLED is False
+
+
+def test_collectors_fall_back_to_psutil(tmp_path, backend_root, monkeypatch):
+    backend_root(str(tmp_path))
+    # user nice system idle iowait irq softirq steal guest guest_nice, as psutil returns on Linux
+    cputimes = collections.namedtuple("scputimes", "user nice system idle iowait irq softirq steal guest guest_nice")
+    reads = iter([[cputimes(100, 0, 0, 1000, 0, 0, 0, 0, 0, 0)], [cputimes(150, 0, 0, 1050, 0, 0, 0, 0, 0, 0)]])
+    monkeypatch.setattr(psutil, "cpu_times", lambda percpu=False: next(reads))
+    monkeypatch.setattr(psutil, "virtual_memory", lambda: types.SimpleNamespace(percent=33.3))
+    monkeypatch.setattr(psutil, "sensors_temperatures",
+                        lambda: {"nvme": [types.SimpleNamespace(current=40.0)], "k10temp": [types.SimpleNamespace(current=58.0)]})
+    sensors = collectors.CollectorSet(["cpu", "memory", "temperature"])
+    record = sensors.collect()
+    assert procfs.backend() is None
+    assert (record.cpu, record.cpu0) == (50.0, 50.0)
+    assert record.memory == 33.3
+    assert record.cpu_temp == 58.0
@@ -0,0 +1,90 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from rollup import MetricHistory, Rollup, lttb
+
+# Rollup aggregation, resolution choice and LTTB downsampling (run with: python -m pytest)
+
+T0 = 1_800_000_000.0  # A multiple of 3600
+
+
+def stamp(epoch):
+    return datetime.datetime.fromtimestamp(epoch).isoformat(sep=" ")
+
+
+def test_lttb_keeps_ends_and_spikes():
+    xs = list(range(1000))
+    ys = [0.0] * 1000
+    ys[417] = 100.0
+    out_x, out_y = lttb(xs, ys, 50)
+    assert len(out_x) == len(out_y) == 50
+    assert (out_x[0], out_x[-1]) == (0, 999)
+    assert (417, 100.0) in zip(out_x, out_y)
+    assert out_x == sorted(out_x)
+
+
+def test_lttb_returns_short_series_unchanged():
+    assert lttb([1, 2, 3], [4, 5, 6], 10) == ([1, 2, 3], [4, 5, 6])
+    assert lttb([1, 2, 3, 4], [4, 5, 6, 7], 2) == ([1, 2, 3, 4], [4, 5, 6, 7])  # Below 3 there is nothing to pick
+
+
+def test_buckets_aggregate_per_resolution():
+    rollup = Rollup({1: 100, 60: 10})
+    for i, value in enumerate([10, 30, 20]):
+        rollup.add(T0 + i * 0.6, value)  # Two in the first second, one in the second
+    rollup.add(T0 + 2, None)  # Missing readings are skipped
+    rollup.add(T0 + 2, float("nan"))
+    assert rollup.window(T0, T0 + 1) == ([T0, T0 + 1], [20.0, 20.0])
+    assert rollup.window(T0, T0 + 1, agg="max") == ([T0, T0 + 1], [30, 20])
+    assert [bucket.count for bucket in rollup.buckets[60]] == [3]
+
+
+def test_weighted_mean():
+    rollup = Rollup({60: 10})
+    rollup.add(T0, 100, weight=1.0)
+    rollup.add(T0 + 1, 0, weight=3.0)
+    assert rollup.window(T0, T0 + 59) == ([T0], [25.0])
+
+
+def test_out_of_order_sample_is_not_added_to_a_newer_bucket():
+    rollup = Rollup({1: 100})
+    rollup.add(T0 + 5, 10)
+    rollup.add(T0 + 1, 99)
+    assert rollup.window(T0, T0 + 10) == ([T0 + 5], [10.0])
+    assert rollup.last_time == T0 + 5
+
+
+def test_finest_resolution_covering_the_range_is_used():
+    rollup = Rollup({1: 60, 60: 100})
+    for i in range(120):
+        rollup.add(T0 + i, float(i))
+    times, values = rollup.window(T0 + 100, T0 + 119)  # Still within the last 60 one-second buckets
+    assert times == [T0 + i for i in range(100, 120)]
+    times, values = rollup.window(T0, T0 + 119)  # One-second buckets have dropped the start
+    assert times == [T0, T0 + 60]
+    assert values == [pytest.approx(29.5), pytest.approx(89.5)]
+
+
+def test_history_skips_rows_that_are_not_newer():
+    history = MetricHistory(["cpu"], resolutions={1: 100}, weight_column="Sample Interval (s)")
+    history.add_row({"Timestamp": stamp(T0), "cpu": "10"})
+    history.add_row({"Timestamp": stamp(T0), "cpu": "90"})  # Same row seen again, e.g. via the ring
+    history.add_row({"Timestamp": "garbage", "cpu": "90"})
+    history.add_row({"Timestamp": stamp(T0 + 1), "cpu": "N/A"})
+    history.add_row({"Timestamp": stamp(T0 + 2), "cpu": "30", "Sample Interval (s)": "2.0"})
+    assert history.query("cpu", 10) == ([T0, T0 + 2], [10.0, 30.0])
+    assert history.rollups["cpu"].buckets[1][-1].weight == 2.0
+
+
+def test_history_add_columns_continues_after_rows():
+    history = MetricHistory(["cpu"], resolutions={1: 100})
+    history.add_row({"Timestamp": stamp(T0), "cpu": "10"})
+    history.add_columns({"Timestamp": np.array([T0, T0 + 1, T0 + 2]), "cpu": np.array([99.0, 20.0, 30.0])})
+    assert history.query("cpu", 10) == ([T0, T0 + 1, T0 + 2], [10.0, 20.0, 30.0])
+    assert history.last_time == T0 + 2
+
+
+def test_empty_history_query():
+    assert MetricHistory(["cpu"]).query("cpu", 60) == ([], [])
@@ -0,0 +1,163 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from metric_writer import MetricWriter
+from segments import SegmentStore, read_segment, write_segment
+
+# Segment files, compaction, retention and the manifest (run with: python -m pytest)
+
+NOW = 1_800_000_000.0
+HOUR, DAY = 3600, 86400
+
+
+def stamp(epoch):
+    return datetime.datetime.fromtimestamp(epoch).isoformat(sep=" ")
+
+
+def rotated_csv(path, header, rows, n=0):
+    """Write a rotated file for ``path`` (rows start with an epoch time) and return its name."""
+    name = f"{path}.20250101-000000-{n:03d}.rotated"
+    with open(name, "w") as f:
+        f.write(",".join(header) + "\n")
+        for row in rows:
+            f.write(",".join([stamp(row[0])] + [str(value) for value in row[1:]]) + "\n")
+    return name
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SegmentStore(str(tmp_path / "m.csv"), keep_for=None, raw_for=None)
+
+
+def test_segment_round_trip(tmp_path):
+    path = str(tmp_path / "one.seg")
+    write_segment(path, [NOW, NOW + 1.5], {"cpu": np.array([1.0, np.nan]), "host": ["a", "b"]})
+    data = read_segment(path)
+    assert data["Timestamp"].tolist() == [NOW, NOW + 1.5]
+    assert data["cpu"][0] == 1.0 and np.isnan(data["cpu"][1])
+    assert data["host"] == ["a", "b"]
+    assert set(read_segment(path, ["cpu"])) == {"Timestamp", "cpu"}  # Only what was asked for
+
+
+def test_compaction_records_range_and_stats(store):
+    path = rotated_csv(store.csv_file, ["Timestamp", "cpu", "gpu"], [(NOW, 10, "N/A"), (NOW + 2, 30, 5)])
+    store.compact_pending()
+    assert not os.path.exists(path)
+    (entry,) = store.entries()
+    assert (entry["start"], entry["end"], entry["rows"], entry["resolution"]) == (NOW, NOW + 2, 2, 0)
+    assert entry["stats"] == {"cpu": {"min": 10.0, "max": 30.0}, "gpu": {"min": 5.0, "max": 5.0}}
+    assert list(store.points("cpu", NOW, NOW + 10)) == [(NOW, 10.0), (NOW + 2, 30.0)]
+    assert list(store.points("gpu", 0, NOW + 10)) == [(NOW + 2, 5.0)]  # N/A skipped
+
+
+def test_queries_skip_segments_by_range_and_stats(store):
+    rotated_csv(store.csv_file, ["Timestamp", "cpu"], [(NOW, 10), (NOW + 1, 20)], 0)
+    rotated_csv(store.csv_file, ["Timestamp", "cpu"], [(NOW + HOUR, 90), (NOW + HOUR + 1, 95)], 1)
+    store.compact_pending()
+    assert len(store.segments(NOW + HOUR, NOW + 2 * HOUR)) == 1
+    assert [entry["stats"]["cpu"]["max"] for entry in store.segments(0, NOW + DAY, "cpu", above=50)] == [95.0]
+    assert list(store.points("cpu", 0, NOW + DAY, above=50)) == [(NOW + HOUR, 90.0), (NOW + HOUR + 1, 95.0)]
+
+
+def test_columns_of_every_schema_are_kept(store):
+    rotated_csv(store.csv_file, ["Timestamp", "cpu"], [(NOW, 10)], 0)
+    rotated_csv(store.csv_file, ["Timestamp", "cpu", "Sample Interval (s)"], [(NOW + 10, 20, 2.0)], 1)
+    store.compact_pending()
+    assert store.columns == ["Timestamp", "cpu", "Sample Interval (s)"]
+    assert [entry["columns"] for entry in store.entries()] == [["Timestamp", "cpu"],
+                                                             ["Timestamp", "cpu", "Sample Interval (s)"]]
+
+
+def test_weighted_points_use_the_sample_interval(store):
+    rotated_csv(store.csv_file, ["Timestamp", "cpu", "Sample Interval (s)"], [(NOW, 100, 1.0), (NOW + 1, 0, 9.0)], 0)
+    rotated_csv(store.csv_file, ["Timestamp", "cpu"], [(NOW + 60, 50)], 1)
+    store.compact_pending()
+    assert list(store.weighted_points("cpu", 0, NOW + DAY)) == [(NOW, 100.0, 1.0), (NOW + 1, 0.0, 9.0),
+                                                                (NOW + 60, 50.0, 1.0)]
+
+
+def test_vanished_segment_is_skipped(store):
+    rotated_csv(store.csv_file, ["Timestamp", "cpu"], [(NOW, 10)], 0)
+    rotated_csv(store.csv_file, ["Timestamp", "cpu"], [(NOW + HOUR, 20)], 1)
+    store.compact_pending()
+    os.remove(os.path.join(store.directory, store.entries()[0]["file"]))
+    assert list(store.points("cpu", 0, NOW + DAY)) == [(NOW + HOUR, 20.0)]
+
+
+def test_retention_downsamples_then_deletes(tmp_path):
+    store = SegmentStore(str(tmp_path / "m.csv"), raw_for=DAY, downsample_to=60, keep_for=30 * DAY)
+    start = NOW - NOW % 60
+    # 57 rows at 100% covering 1 s each, then 3 rows at 0% covering 19 s each: time-weighted mean 50%
+    rows = [(start + i, 100, 1.0) for i in range(57)] + [(start + 57 + i, 0, 19.0) for i in range(3)]
+    rotated_csv(store.csv_file, ["Timestamp", "cpu", "Sample Interval (s)"], rows, 0)
+    rotated_csv(store.csv_file, ["Timestamp", "cpu", "Sample Interval (s)"], [(start + 120, 10, 1.0)], 1)
+    store.compact_pending()
+    assert [entry["resolution"] for entry in store.entries()] == [0, 0]
+
+    store.apply_retention(now=start + 2 * DAY)
+    entries = store.entries()
+    assert [entry["resolution"] for entry in entries] == [60, 60]
+    assert len({entry["file"] for entry in entries}) == 2  # Same first minute would not overwrite a file
+    data = read_segment(os.path.join(store.directory, entries[0]["file"]))
+    assert data["Timestamp"].tolist() == [start]
+    assert data["cpu"].tolist() == [pytest.approx(57 / 114 * 100)]
+    assert data["Sample Interval (s)"].tolist() == [114.0]  # Seconds covered by the bucket
+
+    store.apply_retention(now=start + 31 * DAY)
+    assert store.entries() == []
+    assert sorted(os.listdir(store.directory)) == ["manifest.json"]
+
+
+def test_text_segments_are_not_downsampled(tmp_path):
+    store = SegmentStore(str(tmp_path / "fleet.csv"), raw_for=DAY, keep_for=None)
+    rotated_csv(store.csv_file, ["Timestamp", "Host", "Metric", "Value"], [(NOW, "a", "cpu", 1)])
+    store.compact_pending()
+    store.apply_retention(now=NOW + 2 * DAY)
+    assert [entry["resolution"] for entry in store.entries()] == [0]
+
+
+def test_manifest_survives_a_restart(store):
+    rotated_csv(store.csv_file, ["Timestamp", "cpu"], [(NOW, 10)], 0)
+    store.compact_pending()
+    reopened = SegmentStore(store.csv_file, keep_for=None, raw_for=None)
+    assert reopened.entries() == store.entries()
+    assert reopened.columns == ["Timestamp", "cpu"]
+
+
+def test_reload_picks_up_another_writer(store):
+    reader = SegmentStore(store.csv_file, keep_for=None, raw_for=None)
+    assert reader.entries() == []
+    rotated_csv(store.csv_file, ["Timestamp", "cpu"], [(NOW, 10)], 0)
+    store.compact_pending()
+    reader.reload()
+    assert len(reader.entries()) == 1
+
+
+def test_leftover_rotated_files_are_compacted_at_start(tmp_path):
+    path = str(tmp_path / "m.csv")
+    rotated_csv(path, ["Timestamp", "cpu"], [(NOW, 10)], 0)  # A run that stopped before compacting
+    store = SegmentStore(path, keep_for=None, raw_for=None)
+    assert store.pending()
+    store.compact_pending()
+    assert store.pending() == []
+    assert store.summary()["rows"] == 1
+
+
+def test_writer_rotation_hands_over_to_compaction(tmp_path):
+    path = str(tmp_path / "m.csv")
+    store = SegmentStore(path, keep_for=None, raw_for=None)
+    threads = []
+    writer = MetricWriter(path, ["Timestamp", "cpu"], batch_size=2, max_bytes=1,
+                          on_rotate=lambda rotated: threads.append(store.compact_in_background(rotated)))
+    for i in range(6):
+        writer.write([stamp(NOW + i), i])
+    writer.close()
+    for thread in threads:
+        thread.join()
+    store.compact_pending()  # Anything a background pass started before the last rotation missed
+    assert store.pending() == []
+    assert [value for timestamp, value in store.points("cpu", 0, NOW + DAY)] == [0, 1, 2, 3, 4, 5]
+    assert store.summary()["segments"] == 3